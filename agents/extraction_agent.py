@@ -1,10 +1,23 @@
 import os
+import re
+import copy
 import json
+import time
+import asyncio
+import sqlite3
 import logging
-from typing import List, Dict, Any, Optional, Literal
+from typing import List, Dict, Any, Optional, Literal, Tuple
 from pydantic import BaseModel, Field
-from openai import OpenAI
-from utils.pdf_utils import extract_tables_pdfplumber
+from utils.llm_client import AsyncLLMClient, make_llm_client
+from utils.cache import ExtractionCache
+from utils.context_builder import ContextBuilder
+from utils.keyword_scanner import KeywordScanner
+from utils.fingerprint_index import FingerprintIndex, page_fingerprint
+from utils.page_cache import file_sha256
+from agents.layout_agent import ESG_SCANNER, KEYWORD_WEIGHTS
+from agents.table_agent import TableExtractionAgent
+from agents.normalization_agent import NormalizationAgent
+from agents.verification_agent import VerificationAgent, PERIODS, parse_year
 
 logger = logging.getLogger(__name__)
 
@@ -32,65 +45,623 @@ class ESGExtraction(BaseModel):
     co2_scope_3: Metric
     scope_3_reporting_categories_y0: Optional[int] = Field(description="The number of Scope 3 reporting categories (from 0 to 15) for Y0.")
 
+# Smaller schemas for targeted per-metric calls; merged back into ESGExtraction
+
+class FinancialExtraction(BaseModel):
+    reporting_year: Optional[int] = Field(description="The most recent reporting year identified (e.g., 2023).")
+    currency: Optional[str] = Field(description="Global currency identified for financials (e.g., USD, EUR).")
+    revenue: Metric
+
+class EmissionsExtraction(BaseModel):
+    reporting_year: Optional[int] = Field(description="The most recent reporting year identified (e.g., 2023).")
+    co2_scope_1: Metric
+    co2_scope_2: Metric
+    co2_scope_3: Metric
+    scope_3_reporting_categories_y0: Optional[int] = Field(description="The number of Scope 3 reporting categories (from 0 to 15) for Y0.")
+
+METRIC_FIELDS = ["revenue", "co2_scope_1", "co2_scope_2", "co2_scope_3"]
+
+METRIC_GROUPS = {
+    "financial": {
+        "schema": FinancialExtraction,
+        "keywords": [r"revenue", r"turnover", r"financials", r"millions", r"billions", r"€", r"\$", r"£"],
+        "primary": ["revenue"],
+        "task": "Focus only on revenue / turnover for Y0, Y0-1 and Y0-2, the reporting currency and the most recent reporting year.",
+    },
+    "emissions": {
+        "schema": EmissionsExtraction,
+        "keywords": [r"scope\s*1", r"scope\s*2", r"scope\s*3", r"emissions", r"ghg", r"carbon", r"co2"],
+        "primary": ["co2_scope_1", "co2_scope_2", "co2_scope_3"],
+        "task": "Focus only on Scope 1, Scope 2 (market based) and Scope 3 CO2 emissions for Y0, Y0-1 and Y0-2, "
+                "the number of Scope 3 reporting categories and the most recent reporting year.",
+    },
+}
+
+GROUP_SCANNERS = {name: KeywordScanner(group["keywords"], KEYWORD_WEIGHTS) for name, group in METRIC_GROUPS.items()}
+
+METRIC_LABELS = {
+    "revenue": "Revenue / turnover",
+    "co2_scope_1": "Scope 1 CO2 emissions",
+    "co2_scope_2": "Scope 2 (market based) CO2 emissions",
+    "co2_scope_3": "Scope 3 CO2 emissions",
+}
+PERIOD_LABELS = {"y0": "Y0", "y0_1": "Y0-1", "y0_2": "Y0-2"}
+SCALAR_LABELS = {
+    "reporting_year": "the most recent reporting year",
+    "currency": "the reporting currency",
+    "scope_3_reporting_categories_y0": "the number of Scope 3 reporting categories",
+}
+
+# Adaptive mode ranks the pages not yet sent by the keywords of the fields still missing
+FIELD_KEYWORDS = {
+    "reporting_year": [r"annual\s+report", r"reporting\s+year", r"financial\s+year", r"fiscal\s+year"],
+    "currency": [r"revenue", r"turnover", r"millions", r"billions", r"€", r"\$", r"£"],
+    "revenue": [r"revenue", r"turnover", r"net\s+sales", r"income\s+statement"],
+    "co2_scope_1": [r"scope\s*1", r"direct\s+emissions"],
+    "co2_scope_2": [r"scope\s*2", r"market.based"],
+    "co2_scope_3": [r"scope\s*3", r"value\s+chain"],
+    "scope_3_reporting_categories_y0": [r"scope\s*3", r"categor"],
+}
+FIELD_SCANNERS = {field: KeywordScanner(keywords, KEYWORD_WEIGHTS) for field, keywords in FIELD_KEYWORDS.items()}
+
+def _empty_metric() -> Dict[str, Any]:
+    return {"y0": None, "y0_1": None, "y0_2": None}
+
+def _metric_found(metric: Optional[Dict[str, Any]]) -> bool:
+    return bool(metric) and any(v and v.get("value") is not None for v in metric.values())
+
+def _remap_pages(result: Dict[str, Any], page_map: Dict[int, int]) -> Dict[str, Any]:
+    """
+    An earlier document's result with page numbers moved to the new document. Values
+    whose source page did not survive unchanged are dropped, since they can't be trusted.
+    """
+    remapped = dict(result)
+    for field in METRIC_FIELDS:
+        metric = {}
+        for period, value in (result.get(field) or _empty_metric()).items():
+            if value and value.get("page") is not None:
+                page = page_map.get(value["page"])
+                value = dict(value, page=page) if page is not None else None
+            metric[period] = value
+        remapped[field] = metric
+    return remapped
+
+def _merge_diff(previous: Dict[str, Any], fresh: Dict[str, Any]) -> Dict[str, Any]:
+    """Values found on the changed pages win; everything else keeps the reused value."""
+    merged = {}
+    for field in ESGExtraction.model_fields:
+        if field in METRIC_FIELDS:
+            old, new = previous.get(field) or _empty_metric(), fresh.get(field) or _empty_metric()
+            merged[field] = {period: new.get(period) if new.get(period) and new[period].get("value") is not None
+                             else old.get(period) for period in old}
+        else:
+            merged[field] = fresh.get(field) if fresh.get(field) is not None else previous.get(field)
+    return merged
+
+def _missing_fields(data: Dict[str, Any]) -> List[str]:
+    """Scalar fields and metric field keys (e.g. "co2_scope_1_y0_2") that came back null."""
+    missing = []
+    for field in ESGExtraction.model_fields:
+        if field in METRIC_FIELDS:
+            metric = data.get(field) or {}
+            missing += [f"{field}_{period}" for period in PERIOD_LABELS
+                        if not metric.get(period) or metric[period].get("value") is None]
+        elif data.get(field) is None:
+            missing.append(field)
+    return missing
+
+def _split_field(field_key: str) -> Tuple[str, str]:
+    """("co2_scope_1", "y0_1") from "co2_scope_1_y0_1"."""
+    for period in ("y0_1", "y0_2", "y0"):
+        if field_key.endswith(f"_{period}"):
+            return field_key[:-len(period) - 1], period
+    raise ValueError(f"Not a metric field key: {field_key}")
+
+def _field_label(field: str, reporting_year: Optional[int] = None) -> str:
+    if field in SCALAR_LABELS:
+        return SCALAR_LABELS[field]
+    metric, period = _split_field(field)
+    label = f"{METRIC_LABELS[metric]} {PERIOD_LABELS[period]}"
+    return f"{label} ({reporting_year - PERIODS[period]})" if reporting_year else label
+
+def _year_pattern(year: int) -> "re.Pattern":
+    """A fiscal year as written in reports: 2021, FY21, FY 2021 or 2020/21."""
+    short = f"{year % 100:02d}"
+    return re.compile(rf"\b{year}\b|\bfy\s?(?:{year // 100})?{short}\b|\b\d{{2,4}}[/-]{short}\b")
+
+def _known_context(data: Dict[str, Any]) -> str:
+    """What the first call established, so escalation calls don't have to guess what Y0 is."""
+    facts = []
+    reporting_year = parse_year(data.get("reporting_year"))
+    if reporting_year:
+        facts.append(f"The most recent reporting year (Y0) of this report is {reporting_year}, "
+                     f"so Y0-1 is {reporting_year - 1} and Y0-2 is {reporting_year - 2}.")
+    if data.get("currency"):
+        facts.append(f"Financials are reported in {data['currency']}.")
+    return " ".join(facts)
+
+def _doubt_reasons(val_obj: Dict[str, Any], checks: Dict[str, Any]) -> str:
+    reasons = []
+    if not checks["located"]:
+        reasons.append("the number was not found on the candidate pages")
+    elif checks["located"] == "other_page":
+        reasons.append(f"the number appears on page {checks['found_on_page']}, not page {val_obj.get('page')}")
+    if checks["located"] and not checks["year"]:
+        reasons.append(f"the page puts it under {checks['year_found']}" if checks["year_found"]
+                       else "no matching year column or row")
+    if checks["row"] is False:
+        reasons.append("it is on another metric's row")
+    reasons += [issue.split(": ", 1)[-1] for issue in checks["issues"]]
+    return "; ".join(reasons)
+
 # --- Agent Implementation ---
 
 class ExtractionAgent:
     """
     Uses OpenAI's structured outputs to deterministically extract all ESG fields.
-    Takes candidate pages and batches them into a single call.
+    Takes candidate pages and batches them into a single call ("monolithic" mode),
+    or routes page subsets to smaller concurrent per-metric calls ("targeted" mode)
+    and falls back to the single call only for metrics those calls missed.
+    With `table_first`, the rule-based TableExtractionAgent runs first and the LLM
+    is skipped when it finds every required field with high confidence.
+    With a `fingerprint_index`, a document whose candidate pages match an earlier
+    extracted document reuses its result: unchanged when every page matches, otherwise
+    only the changed pages go to the LLM (when at least `min_reuse_overlap` of the
+    pages are unchanged) and the answers are merged into the reused result.
+    In "adaptive" mode, only the `adaptive_pages` most relevant pages are sent first;
+    while fields are still null, the next `adaptive_step` pages ranked by the keywords
+    (and, once known, the years) of just those fields follow, up to `adaptive_max_pages`
+    pages in total or until a round fills none of them.
+    With `requery_below`, the LLM result is checked against the pages (see
+    VerificationAgent) and only fields scoring below that confidence are asked
+    again, on their pages; a new answer replaces the old one only if it verifies better.
     """
     
-    def __init__(self, candidate_pages: List[Dict[str, Any]], pdf_path: str):
+    MODEL = "gpt-4o"
+    # Bump whenever the prompt wording changes so cached results are not reused
+    PROMPT_VERSION = "1"
+    SYSTEM_PROMPT = "You are a precise, deterministic AI extraction pipeline element."
+    # Pages per targeted call when no token budget trims the context
+    MAX_TARGETED_PAGES = 8
+    # Best pages per metric group added to the cited pages of a re-query
+    REQUERY_PAGES = 3
+    # Adaptive escalation stops after this many consecutive rounds that fill no missing field
+    MAX_IDLE_ROUNDS = 1
+
+    def __init__(self, candidate_pages: List[Dict[str, Any]], pdf_path: str,
+                 cache: Optional[ExtractionCache] = None, refresh: bool = False,
+                 token_budget: Optional[int] = None, mode: str = "monolithic", table_first: bool = False,
+                 model: Optional[str] = None, fingerprint_index: Optional[FingerprintIndex] = None,
+                 min_reuse_overlap: float = 0.5, requery_below: Optional[float] = None,
+                 adaptive_pages: int = 3, adaptive_step: int = 3, adaptive_max_pages: int = 20):
         self.candidate_pages = candidate_pages
         self.pdf_path = pdf_path
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", ""))
+        self.cache = cache
+        self.refresh = refresh
+        self.token_budget = token_budget
+        self.mode = mode
+        self.table_first = table_first
+        self.model = model or self.MODEL
+        self.fingerprint_index = fingerprint_index
+        self.min_reuse_overlap = min_reuse_overlap
+        self.requery_below = requery_below
+        self.adaptive_pages = adaptive_pages
+        self.adaptive_step = adaptive_step
+        self.adaptive_max_pages = adaptive_max_pages
+        self.cache_hit = False
+        self.cache_hits = 0
+        self.context_report: Dict[str, Any] = {}
+        self.run_stats: Dict[str, Any] = {}
+        self.metrics: List[Dict[str, Any]] = []
 
-    def run(self) -> Dict[str, Any]:
-        logger.info("Running Extraction Agent")
-        
-        if not self.candidate_pages:
-            logger.warning("No candidate pages provided to Extraction Agent.")
-            return {}
+    def _build_context(self, pages: Optional[List[Dict[str, Any]]] = None, scanner: KeywordScanner = ESG_SCANNER,
+                       token_budget: Optional[int] = None) -> str:
+        started = time.perf_counter()
+        try:
+            return self._build_context_string(pages, scanner, token_budget)
+        finally:
+            self.run_stats["prompt_build_s"] = round(self.run_stats.get("prompt_build_s", 0.0) + time.perf_counter() - started, 4)
+
+    def _build_context_string(self, pages: Optional[List[Dict[str, Any]]], scanner: KeywordScanner,
+                              token_budget: Optional[int]) -> str:
+        pages = self.candidate_pages if pages is None else pages
+        token_budget = self.token_budget if token_budget is None else token_budget
+        if token_budget:
+            builder = ContextBuilder(token_budget, scanner, model=self.model)
+            context_string, report = builder.build(pages)
+            # Targeted mode builds one context per call; keep the totals
+            for key, value in report.items():
+                self.context_report[key] = self.context_report.get(key, 0) + value
+            logger.info(f"Packed {report['blocks_selected']}/{report['blocks_total']} blocks "
+                        f"into {report['tokens_packed']} tokens (budget {token_budget}), "
+                        f"saved {report['tokens_saved']} tokens")
+            return context_string
 
-        # Optionally grab tables for candidate pages to improve tabular reading
-        page_nums = [p["page"] for p in self.candidate_pages]
-        # Skip plumber parsing if large to save time, but good for robust logic:
-        # tables_by_page = extract_tables_pdfplumber(self.pdf_path, page_nums)
-        
         # Build prompt context
         context_parts = []
-        for p in self.candidate_pages:
-            # You could inject table representation here as well for better LLM comprehension
+        for p in pages:
             context_parts.append(f"--- PAGE {p['page']} ---\n{p['text']}\n")
             
-        context_string = "\n".join(context_parts)
+        return "\n".join(context_parts)
+
+    def _build_messages(self, context_string: Optional[str] = None, task: Optional[str] = None) -> List[Dict[str, str]]:
+        if context_string is None:
+            context_string = self._build_context()
         
         prompt = (
             "You are an expert ESG Data Extractor. Your task is to extract exact ESG metrics "
             "from the following text. The most recent reporting year is Y0, the previous year is Y0-1, etc. "
             "If multiple candidates are found, prefer tables over paragraphs, prefer consolidated ESG tables. "
             "IMPORTANT: If a value is missing or not explicitly stated, return null.\n\n"
+            + (f"{task}\n\n" if task else "") +
             "CONTEXT:\n"
             f"{context_string}"
         )
+        return [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    async def _call(self, llm_client: Optional[AsyncLLMClient], messages: List[Dict[str, str]], schema, label: str) -> Dict[str, Any]:
+        """One cached structured-output call. Raises if the LLM call fails."""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(messages, self.model, self.PROMPT_VERSION, schema.model_json_schema())
+            if not self.refresh:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    self.cache_hits += 1
+                    logger.info(f"Extraction cache hit for {label} ({cache_key[:12]}), skipping LLM call")
+                    return cached
+
+        # Note: requires an OpenAI model supporting parse/structured outputs, e.g., gpt-4o-2024-08-06 or newer
+        result, record = await llm_client.parse(
+            model=self.model,
+            messages=messages,
+            response_format=schema,
+            temperature=0.0, # Determinism requirement
+            label=label,
+            metrics_sink=self.metrics
+        )
+        logger.info(f"LLM call {label} finished in {record['latency_s']}s after {record['attempts']} attempt(s), "
+                    f"tokens: {record['prompt_tokens']} prompt / {record['completion_tokens']} completion")
         
-        try:
-            # Note: requires an OpenAI model supporting parse/structured outputs, e.g., gpt-4o-2024-08-06 or newer
-            # using 'gpt-4o-mini' for speed/cost.
-            response = self.client.beta.chat.completions.parse(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a precise, deterministic AI extraction pipeline element."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format=ESGExtraction,
-                temperature=0.0 # Determinism requirement
-            )
-            
-            result = response.choices[0].message.parsed
+        if not result:
+            return {}
+        data = result.model_dump()
+        if cache_key is not None:
+            self.cache.put(cache_key, data, meta={"pdf": os.path.basename(self.pdf_path), "model": self.model})
+        return data
+
+    async def _run_monolithic(self, llm_client: Optional[AsyncLLMClient]) -> Dict[str, Any]:
+        return await self._call(llm_client, self._build_messages(), ESGExtraction, os.path.basename(self.pdf_path))
+
+    def _route_pages(self, group_name: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Candidate pages carrying the group's keywords, best first, returned in reading order."""
+        scanner = GROUP_SCANNERS[group_name]
+        scored = []
+        for page in self.candidate_pages:
+            score = scanner.relevance(page["text"].lower())["score"]
+            if score > 0:
+                scored.append((score, page))
+        scored.sort(key=lambda sp: sp[0], reverse=True)
+        if limit is None and not self.token_budget:
+            limit = self.MAX_TARGETED_PAGES
+        if limit:
+            scored = scored[:limit]
+        return sorted((page for _, page in scored), key=lambda p: p["page"])
+
+    async def _run_group(self, llm_client: Optional[AsyncLLMClient], group_name: str) -> Optional[Dict[str, Any]]:
+        pages = self._route_pages(group_name)
+        if not pages:
+            logger.info(f"No pages routed to the {group_name} call")
+            return None
+        group = METRIC_GROUPS[group_name]
+        # Each targeted call gets an equal share of the budget
+        budget = self.token_budget // len(METRIC_GROUPS) if self.token_budget else None
+        context_string = self._build_context(pages, GROUP_SCANNERS[group_name], budget)
+        messages = self._build_messages(context_string, group["task"])
+        return await self._call(llm_client, messages, group["schema"], f"{os.path.basename(self.pdf_path)}:{group_name}")
+
+    async def _run_targeted(self, llm_client: Optional[AsyncLLMClient]) -> Dict[str, Any]:
+        group_names = list(METRIC_GROUPS)
+        results = await asyncio.gather(*(self._run_group(llm_client, name) for name in group_names), return_exceptions=True)
+
+        merged: Dict[str, Any] = {field: None for field in ESGExtraction.model_fields}
+        for field in METRIC_FIELDS:
+            merged[field] = _empty_metric()
+
+        fallback_groups = []
+        for name, result in zip(group_names, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Targeted {name} call failed: {result}")
+                result = None
             if result:
-                return result.model_dump()
+                for field, value in result.items():
+                    if field in METRIC_FIELDS:
+                        merged[field] = value or _empty_metric()
+                    elif merged.get(field) is None:
+                        merged[field] = value
+            if not result or not any(_metric_found(merged[f]) for f in METRIC_GROUPS[name]["primary"]):
+                fallback_groups.append(name)
+
+        if fallback_groups:
+            logger.info(f"Falling back to the monolithic call for: {', '.join(fallback_groups)}")
+            try:
+                full = await self._run_monolithic(llm_client)
+            except Exception as e:
+                # Keep what the targeted calls found rather than losing the document
+                logger.error(f"Monolithic fallback failed, keeping the targeted results: {e}")
+                full = None
+            for name in fallback_groups if full else []:
+                for field in METRIC_GROUPS[name]["schema"].model_fields:
+                    if field in METRIC_FIELDS:
+                        if not _metric_found(merged[field]) and full.get(field):
+                            merged[field] = full[field]
+                    elif merged.get(field) is None:
+                        merged[field] = full.get(field)
+
+        self.run_stats["fallback_groups"] = fallback_groups
+        return merged
+
+    def _rank_for(self, pages: List[Dict[str, Any]], missing: List[str],
+                  reporting_year: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Pages mentioning the missing fields, best first. With a known reporting year,
+        a page counts for a period's field only if it mentions that period's year.
+        """
+        # Field -> year patterns a page must match one of (none: any page)
+        fields: Dict[str, List["re.Pattern"]] = {}
+        for field in missing:
+            if field in FIELD_SCANNERS:
+                fields[field] = []
+                continue
+            metric, period = _split_field(field)
+            fields.setdefault(metric, [])
+            if reporting_year:
+                fields[metric].append(_year_pattern(reporting_year - PERIODS[period]))
+        scored = []
+        for page in pages:
+            text = page["text"].lower()
+            score = sum(FIELD_SCANNERS[field].relevance(text)["score"] for field, years in fields.items()
+                        if not years or any(year.search(text) for year in years))
+            if score > 0:
+                scored.append((score, page))
+        scored.sort(key=lambda sp: sp[0], reverse=True)
+        return [page for _, page in scored]
+
+    async def _run_adaptive(self, llm_client: Optional[AsyncLLMClient]) -> Dict[str, Any]:
+        """Starts from the top pages and escalates with pages ranked for the fields still null."""
+        name = os.path.basename(self.pdf_path)
+        # LayoutAgent's score when present, so the first call gets exactly its top pages
+        ranked = sorted(self.candidate_pages, reverse=True, key=lambda p: p["relevance_score"] if "relevance_score" in p
+                        else ESG_SCANNER.relevance(p["text"].lower())["score"])
+        cap = min(self.adaptive_max_pages, len(ranked))
+        batch = ranked[:min(self.adaptive_pages, cap)]
+        sent = {p["page"] for p in batch}
+        messages = self._build_messages(self._build_context(sorted(batch, key=lambda p: p["page"])))
+        data = await self._call(llm_client, messages, ESGExtraction, f"{name}:adaptive-1")
+        rounds, idle = 1, 0
+        missing = _missing_fields(data)
+
+        while missing and len(sent) < cap and idle < self.MAX_IDLE_ROUNDS:
+            reporting_year = parse_year(data.get("reporting_year"))
+            remaining = [p for p in ranked if p["page"] not in sent]
+            batch = self._rank_for(remaining, missing, reporting_year)[:min(self.adaptive_step, cap - len(sent))]
+            if not batch:
+                logger.info(f"No remaining candidate page mentions the {len(missing)} missing field(s)")
+                break
+            sent.update(p["page"] for p in batch)
+            rounds += 1
+            task = " ".join(filter(None, [
+                _known_context(data),
+                "Earlier pages of this report did not state: " +
+                "; ".join(_field_label(f, reporting_year) for f in missing) +
+                ". Focus only on these; return null for anything these pages do not state."]))
+            logger.info(f"Escalating with {len(batch)} page(s) for {len(missing)} missing field(s)")
+            try:
+                messages = self._build_messages(self._build_context(sorted(batch, key=lambda p: p["page"])), task)
+                fresh = await self._call(llm_client, messages, ESGExtraction, f"{name}:adaptive-{rounds}")
+            except Exception as e:
+                logger.warning(f"Adaptive escalation failed, keeping the fields found so far: {e}")
+                break
+            # Values already found win; the new pages only fill the gaps
+            data = _merge_diff(fresh, data)
+            still_missing = _missing_fields(data)
+            # Reports often publish fewer years than asked for; stop paying for pages that add nothing
+            idle = idle + 1 if len(still_missing) == len(missing) else 0
+            missing = still_missing
+
+        if missing:
+            logger.info(f"{len(missing)} field(s) still missing after {rounds} adaptive call(s) on {len(sent)} page(s): "
+                        f"{', '.join(missing)}")
+        self.run_stats.update({"adaptive_rounds": rounds, "pages_sent": len(sent), "missing_fields": missing})
+        return data
+
+    def _plan_reuse(self, fingerprints: Dict[int, str]) -> Optional[Dict[str, Any]]:
+        """Earlier result remapped onto this document and the changed pages, or None when nothing is reusable."""
+        try:
+            match = self.fingerprint_index.best_match(fingerprints, self.model, self.PROMPT_VERSION)
+        except sqlite3.Error as e:
+            logger.warning(f"Fingerprint index lookup failed: {e}")
+            return None
+        if not match:
+            return None
+        new_page_by_fp = {}
+        for page, fp in fingerprints.items():
+            new_page_by_fp.setdefault(fp, page)
+        page_map = {old: new_page_by_fp[fp] for old, fp in match["pages"].items() if fp in new_page_by_fp}
+        known = set(match["pages"].values())
+        changed = [p for p in self.candidate_pages if fingerprints[p["page"]] not in known]
+        overlap = 1 - len(changed) / len(self.candidate_pages)
+        if overlap < self.min_reuse_overlap:
+            logger.info(f"Best fingerprint match {match['pdf_path']} shares only {overlap:.0%} of the candidate pages")
+            return None
+        return {"pdf_path": match["pdf_path"], "previous": _remap_pages(match["result"], page_map),
+                "changed": changed, "reused_pages": len(self.candidate_pages) - len(changed)}
+
+    async def _run_diff(self, llm_client: Optional[AsyncLLMClient], reuse: Dict[str, Any]) -> Dict[str, Any]:
+        """Extracts from the changed pages only and merges the answers into the reused result."""
+        logger.info(f"Re-extracting {len(reuse['changed'])} changed page(s), reusing {reuse['reused_pages']} "
+                    f"unchanged page(s) from {reuse['pdf_path']}")
+        messages = self._build_messages(self._build_context(reuse["changed"]))
+        fresh = await self._call(llm_client, messages, ESGExtraction, f"{os.path.basename(self.pdf_path)}:diff")
+        return _merge_diff(reuse["previous"], fresh)
+
+    def _verify(self, data: Dict[str, Any]) -> VerificationAgent:
+        # Normalization fills in normalized_value in place; the result itself stays raw
+        return VerificationAgent(NormalizationAgent(copy.deepcopy(data)).run(), self.candidate_pages)
+
+    async def requery(self, llm_client: Optional[AsyncLLMClient], data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Asks again for the fields of `data` that score below `requery_below` (default
+        VerificationAgent.LOW_CONFIDENCE) only, and keeps whichever answer verifies
+        better. Also usable on an earlier result.
+        """
+        doubtful = self._verify(data).low_confidence_fields(self.requery_below or VerificationAgent.LOW_CONFIDENCE)
+        if not doubtful:
+            return data
+        fields = {key: _split_field(key) for key in doubtful}
+        metrics = {metric for metric, _ in fields.values()}
+        groups = [name for name, group in METRIC_GROUPS.items() if metrics & set(group["primary"])]
+
+        page_nums = {data[metric][period].get("page") for metric, period in fields.values()}
+        page_nums |= {a["checks"]["found_on_page"] for a in doubtful.values()}
+        for name in groups:
+            page_nums |= {p["page"] for p in self._route_pages(name, self.REQUERY_PAGES)}
+        pages = [p for p in self.candidate_pages if p["page"] in page_nums]
+        if not pages:
+            return data
+
+        lines = [f"- {METRIC_LABELS[metric]} {PERIOD_LABELS[period]}: {data[metric][period]['value']} "
+                 f"(page {data[metric][period].get('page')}) - {_doubt_reasons(data[metric][period], doubtful[key]['checks'])}"
+                 for key, (metric, period) in fields.items()]
+        task = ("An earlier answer gave these values, but they could not be verified against the document:\n"
+                + "\n".join(lines) +
+                "\nRe-read the context and return the value printed for exactly these fields and years. "
+                "All other fields may be null.")
+        schema = METRIC_GROUPS[groups[0]]["schema"] if len(groups) == 1 else ESGExtraction
+        budget = self.token_budget // len(METRIC_GROUPS) if self.token_budget else None
+        logger.info(f"Re-querying {len(fields)} low-confidence field(s) on {len(pages)} page(s): {', '.join(fields)}")
+        try:
+            messages = self._build_messages(self._build_context(pages, token_budget=budget), task)
+            fresh = await self._call(llm_client, messages, schema, f"{os.path.basename(self.pdf_path)}:requery")
+        except Exception as e:
+            logger.warning(f"Re-query failed, keeping the first answers: {e}")
+            return data
+
+        merged = dict(data)
+        for metric, period in fields.values():
+            answer = (fresh.get(metric) or {}).get(period)
+            if answer and answer.get("value") is not None:
+                merged[metric] = dict(merged[metric], **{period: answer})
+        rescored = self._verify(merged).assess()
+        replaced = []
+        for key, (metric, period) in fields.items():
+            if merged[metric][period] is data[metric][period]:
+                continue
+            if rescored[key]["confidence"] > doubtful[key]["confidence"]:
+                replaced.append(key)
+            else:
+                merged[metric] = dict(merged[metric], **{period: data[metric][period]})
+        self.run_stats.update({"requeried_fields": list(fields), "requery_replaced": replaced})
+        logger.info(f"Re-query replaced {len(replaced)}/{len(fields)} field(s)")
+        return merged
+
+    def _remember(self, data: Dict[str, Any], fingerprints: Optional[Dict[int, str]]):
+        if self.fingerprint_index is None or not data or not fingerprints:
+            return
+        try:
+            self.fingerprint_index.record(file_sha256(self.pdf_path), os.path.abspath(self.pdf_path), fingerprints,
+                                          data, self.model, self.PROMPT_VERSION)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not record {self.pdf_path} in the fingerprint index: {e}")
+
+    def _skip_llm(self, mode: str, started: float):
+        self.run_stats.update({"llm_skipped": True, "mode": mode, "wall_s": round(time.monotonic() - started, 4),
+                               "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                               "cache_hits": 0, "llm_latency_s": 0.0})
+
+    def run(self, llm_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Blocking entry point; runs the async extraction path on a private event loop.
+        `llm_options` are passed to make_llm_client to pick the LLM backend.
+        """
+        async def _run():
+            return await self.run_async(make_llm_client(**llm_options) if llm_options else None)
+        return asyncio.run(_run())
+
+    async def run_async(self, llm_client: Optional[AsyncLLMClient] = None) -> Dict[str, Any]:
+        """
+        Extracts all ESG fields. Pass a shared AsyncLLMClient to apply a common rate
+        limit and concurrency bound across documents, or an OpenAIBatchClient to
+        submit the calls of many documents as one Batch API job.
+        """
+        logger.info(f"Running Extraction Agent ({self.mode} mode)")
+        
+        if not self.candidate_pages:
+            logger.warning("No candidate pages provided to Extraction Agent.")
             return {}
+
+        started = time.monotonic()
+        self.run_stats["llm_skipped"] = False
+
+        fingerprints = reuse = None
+        if self.fingerprint_index is not None:
+            fingerprints = {p["page"]: page_fingerprint(p["text"]) for p in self.candidate_pages}
+            # --refresh re-extracts from scratch but still records the new result
+            reuse = None if self.refresh else self._plan_reuse(fingerprints)
+            if reuse:
+                self.run_stats.update({"reused_from": reuse["pdf_path"], "reused_pages": reuse["reused_pages"],
+                                       "changed_pages": len(reuse["changed"])})
+            if reuse and not reuse["changed"]:
+                self._skip_llm("reused", started)
+                logger.info(f"All candidate pages match {reuse['pdf_path']}, reusing its extraction")
+                self._remember(reuse["previous"], fingerprints)
+                return reuse["previous"]
+
+        if self.table_first:
+            table_agent = TableExtractionAgent(self.candidate_pages, self.pdf_path)
+            try:
+                # pdfplumber is CPU-bound; keep it off the event loop shared with other documents
+                table_data = await asyncio.to_thread(table_agent.run)
+            except Exception as e:
+                logger.warning(f"Table extraction failed: {e}")
+                table_data = {}
+            if table_agent.complete:
+                self._skip_llm("table", started)
+                logger.info(f"All required fields found in tables in {self.run_stats['wall_s']}s, skipping the LLM")
+                self._remember(table_data, fingerprints)
+                return table_data
+        llm_client = llm_client or AsyncLLMClient()
+        
+        mode = "diff" if reuse else self.mode
+        try:
+            if reuse:
+                data = await self._run_diff(llm_client, reuse)
+            elif self.mode == "targeted":
+                data = await self._run_targeted(llm_client)
+            elif self.mode == "adaptive":
+                data = await self._run_adaptive(llm_client)
+            else:
+                data = await self._run_monolithic(llm_client)
         except Exception as e:
             logger.error(f"LLM Extraction failed: {e}")
-            return {}
+            data = {}
+        if data and self.requery_below:
+            data = await self.requery(llm_client, data)
+
+        self.cache_hit = not self.metrics and self.cache_hits > 0
+        self.run_stats.update({
+            "cache_hits": self.cache_hits,
+            "llm_latency_s": round(sum(m["latency_s"] or 0 for m in self.metrics), 4),
+            "mode": mode,
+            "wall_s": round(time.monotonic() - started, 4),
+            "llm_calls": len(self.metrics),
+            "prompt_tokens": sum(m["prompt_tokens"] or 0 for m in self.metrics),
+            "completion_tokens": sum(m["completion_tokens"] or 0 for m in self.metrics),
+        })
+        logger.info(f"Extraction ({mode}) finished in {self.run_stats['wall_s']}s with {self.run_stats['llm_calls']} LLM call(s), "
+                    f"{self.run_stats['prompt_tokens']} prompt / {self.run_stats['completion_tokens']} completion tokens")
+        self._remember(data, fingerprints)
+        return data
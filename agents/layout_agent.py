@@ -1,7 +1,14 @@
-import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple
+import os
+import time
+import heapq
 import logging
-from utils.pdf_utils import extract_text_and_bboxes_pymupdf
+from utils.pdf_utils import (extract_text_and_bboxes_pymupdf, iter_page_texts, iter_pages, extract_blocks_for_pages,
+                             extract_words_for_pages)
+from utils.page_cache import CachedPages, PageCacheWriter, page_cache_path, load_pages
+from utils.keyword_scanner import KeywordScanner
+from utils.cache import ExtractionCache
+from utils.ocr import MIN_TEXT_CHARS, find_scanned_pages, ocr_pages
 
 logger = logging.getLogger(__name__)
 
@@ -13,39 +20,227 @@ ESG_KEYWORDS = [
     r"millions", r"billions", r"€", r"\$", r"£"
 ]
 
+# Metric-specific keywords weigh more than generic financial vocabulary
+KEYWORD_WEIGHTS = {
+    r"scope\s*1": 3.0, r"scope\s*2": 3.0, r"scope\s*3": 3.0,
+    r"emissions": 2.0, r"ghg": 2.0, r"co2": 2.0,
+    r"revenue": 2.0, r"turnover": 2.0,
+}
+
+ESG_SCANNER = KeywordScanner(ESG_KEYWORDS, KEYWORD_WEIGHTS)
+
 class LayoutAgent:
     """
     LayoutAgent focuses on scanning a document's layout, extracting raw text,
     identifying structured content (bounding boxes, tables), and filtering out
     pages that likely lack relevant ESG data to reduce token context size.
+
+    By default it works in two phases: a cheap plain-text pass scores every page,
+    then blocks and bboxes are materialized only for the selected candidate pages.
+    When a page cache is configured, the full parse is done once to populate it.
+
+    With `ocr`, pages that have (almost) no text layer but are covered by images are
+    OCR'd in a pool of `ocr_workers` processes after the text pass, scored like any
+    other page, and their OCR blocks and words replace the empty text-layer records.
+    OCR results are cached per page content hash in `ocr_cache_dir`.
+
+    With `stream`, memory stays bounded regardless of page count: pages are parsed
+    one at a time (or in a bounded window of shards with `parse_workers`), only the
+    top `max_pages` candidates are kept in a heap with their blocks, everything else
+    is released as soon as it is scored, and a page cache entry is written while
+    streaming instead of from a fully parsed document.
     """
     
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, page_cache_dir: str = None, parse_workers: int = 1, lazy: bool = True,
+                 max_pages: int = 20, ocr: bool = False, ocr_workers: int = 1, ocr_cache_dir: str = None,
+                 ocr_language: str = "eng", ocr_dpi: int = 300, stream: bool = False):
         self.pdf_path = pdf_path
+        self.max_pages = max_pages
+        self.page_cache_dir = page_cache_dir
+        self.parse_workers = parse_workers
+        self.lazy = lazy
+        self.stream = stream
+        self.ocr = ocr
+        self.ocr_workers = ocr_workers
+        self.ocr_cache = ExtractionCache(ocr_cache_dir) if ocr and ocr_cache_dir else None
+        self.ocr_language = ocr_language
+        self.ocr_dpi = ocr_dpi
         self.pages_data = []
+        # Page records parsed during the scan (OCR pages, and streamed pages still in the top k)
+        self.records: Dict[int, Dict[str, Any]] = {}
+        self.page_scores: Dict[int, Dict[str, Any]] = {}
+        self.candidates = 0
+        self._top: List[Tuple[float, int]] = []
+        self.stats: Dict[str, Any] = {}
+
+    def _score(self, text: str) -> Dict[str, Any]:
+        return ESG_SCANNER.relevance(text.lower())
+
+    def _consider(self, page_num: int, signals: Dict[str, Any], record: Optional[Dict[str, Any]] = None,
+                  counted: bool = False):
+        """
+        Tracks a scored page. Streaming mode keeps only the top `max_pages` in a min-heap
+        and drops the score and record of every page that falls out of it.
+        A page OCR'd after its text layer was scored replaces its earlier entry; `counted`
+        tells that the text layer already made it a candidate.
+        """
+        # Simple threshold: at least 1 keyword from the list.
+        if not signals["counts"]:
+            return
+        if not counted:
+            self.candidates += 1
+        if self.stream and page_num in self.page_scores:
+            # In streaming mode page_scores holds exactly the pages in the heap
+            self._top.remove((self.page_scores[page_num]["score"], -page_num))
+            heapq.heapify(self._top)
+        self.page_scores[page_num] = signals
+        if record is not None:
+            self.records[page_num] = record
+        if not self.stream:
+            return
+        # Ties keep the earlier page, like the stable sort of the non-streaming path
+        entry = (signals["score"], -page_num)
+        if len(self._top) < self.max_pages:
+            heapq.heappush(self._top, entry)
+            return
+        dropped = -heapq.heappushpop(self._top, entry)[1]
+        del self.page_scores[dropped]
+        self.records.pop(dropped, None)
+
+    def _iter_page_texts(self) -> Iterator[Tuple[int, str, Optional[Dict[str, Any]]]]:
+        """Yields (page number, text, full record or None when it is materialized later)."""
+        if self.lazy and not self.page_cache_dir and (self.parse_workers <= 1 or not self.stream):
+            for page_num, text in iter_page_texts(self.pdf_path, self.parse_workers):
+                yield page_num, text, None
+            return
+
+        if self.stream:
+            entry_path = None
+            if self.page_cache_dir:
+                os.makedirs(self.page_cache_dir, exist_ok=True)
+                entry_path = page_cache_path(self.page_cache_dir, self.pdf_path)
+                self.pages_data = load_pages(entry_path) or []
+            if not self.pages_data:
+                # Parse page by page, writing the cache entry as we go instead of holding the document
+                writer = PageCacheWriter(entry_path) if entry_path else None
+                try:
+                    for page in iter_pages(self.pdf_path, self.parse_workers):
+                        if writer:
+                            writer.add(page)
+                        yield page["page"], page["text"], page
+                except BaseException:
+                    if writer:
+                        writer.abort()
+                    raise
+                if writer:
+                    writer.commit()
+                return
+        else:
+            self.pages_data = extract_text_and_bboxes_pymupdf(self.pdf_path, cache_dir=self.page_cache_dir, workers=self.parse_workers)
+
+        for index in range(len(self.pages_data)):
+            if isinstance(self.pages_data, CachedPages):
+                # Avoid building block dicts for pages that will be discarded
+                yield index + 1, self.pages_data.page_text(index), None
+            else:
+                yield index + 1, self.pages_data[index]["text"], None
+
+    def _materialize(self, page_nums: List[int]) -> List[Dict[str, Any]]:
+        """Full records of the selected pages, with word bboxes for the verification index."""
+        text_pages = [n for n in page_nums if n not in self.records]
+        records = {page["page"]: page for page in self._materialize_text_layer(text_pages)}
+        missing_words = [n for n in page_nums if n in self.records and "words" not in self.records[n]]
+        words = extract_words_for_pages(self.pdf_path, missing_words) if missing_words else {}
+        for n in page_nums:
+            if n in self.records:
+                records[n] = dict(self.records[n], words=words[n]) if n in words else self.records[n]
+        return [records[n] for n in page_nums]
+
+    def _materialize_text_layer(self, page_nums: List[int]) -> List[Dict[str, Any]]:
+        if not page_nums:
+            return []
+        if self.pages_data:
+            words = extract_words_for_pages(self.pdf_path, page_nums)
+            return [dict(self.pages_data[n - 1], words=words[n]) for n in page_nums]
+        return extract_blocks_for_pages(self.pdf_path, page_nums, with_words=True)
+
+    def _run_ocr(self, low_text: Dict[int, str], counted: Set[int]) -> Dict[str, Any]:
+        """
+        OCRs the scanned pages among `low_text` and scores their recovered text.
+        `counted` are the low-text pages already counted as candidates from their text layer.
+        """
+        ocr_started = time.perf_counter()
+        scanned = find_scanned_pages(self.pdf_path, low_text)
+        logger.info(f"{len(scanned)} of {len(low_text)} low-text page(s) look scanned")
+        # Streaming mode OCRs in chunks so only one chunk of OCR records is alive at a time
+        chunk_size = max(16, 4 * self.ocr_workers) if self.stream else max(1, len(scanned))
+        stats = {"ocr_pages": 0, "ocr_cache_hits": 0, "ocr_failed": 0}
+        score_s = 0.0
+        for i in range(0, len(scanned), chunk_size):
+            records, chunk_stats = ocr_pages(self.pdf_path, scanned[i:i + chunk_size], workers=self.ocr_workers,
+                                             cache=self.ocr_cache, language=self.ocr_language, dpi=self.ocr_dpi)
+            for key in stats:
+                stats[key] += chunk_stats[key]
+            score_started = time.perf_counter()
+            for page_num, record in records.items():
+                self._consider(page_num, self._score(record["text"]), record, counted=page_num in counted)
+            score_s += time.perf_counter() - score_started
+        stats["ocr_score_s"] = score_s
+        # Includes the image-coverage check and cache lookups, not just Tesseract
+        stats["ocr_s"] = round(time.perf_counter() - ocr_started - score_s, 4)
+        return stats
 
     def run(self) -> List[Dict[str, Any]]:
-        logger.info(f"Running Layout Agent on: {self.pdf_path}")
-        self.pages_data = extract_text_and_bboxes_pymupdf(self.pdf_path)
+        logger.info(f"Running Layout Agent on: {self.pdf_path}{' (streaming)' if self.stream else ''}")
         
-        # Identify candidate pages using regex heuristics
-        candidate_pages = []
-        for page in self.pages_data:
-            text = page["text"].lower()
-            match_count = sum(1 for kw in ESG_KEYWORDS if re.search(kw, text))
-            page["keyword_score"] = match_count
-            
-            # Simple threshold: at least 1 keyword from the list.
-            if match_count > 0:
-                candidate_pages.append(page)
+        # Identify candidate pages using a single-pass keyword scan
+        self.page_scores = {}
+        self.records = {}
+        self.candidates = 0
+        self._top = []
+        total_pages = 0
+        score_s = 0.0
+        # Pages with (almost) no text layer; OCR candidates
+        low_text: Dict[int, str] = {}
+        low_text_candidates: Set[int] = set()
+        started = time.perf_counter()
+        for page_num, text, record in self._iter_page_texts():
+            total_pages += 1
+            if self.ocr and len(text.strip()) < MIN_TEXT_CHARS:
+                low_text[page_num] = text
+            score_started = time.perf_counter()
+            signals = self._score(text)
+            score_s += time.perf_counter() - score_started
+            self._consider(page_num, signals, record)
+            if page_num in low_text and signals["counts"]:
+                low_text_candidates.add(page_num)
+
+        ocr_stats = {}
+        if low_text:
+            ocr_stats = self._run_ocr(low_text, low_text_candidates)
+            score_s += ocr_stats.pop("ocr_score_s")
         
-        logger.info(f"Identified {len(candidate_pages)} candidate pages out of {len(self.pages_data)}")
+        logger.info(f"Identified {self.candidates} candidate pages out of {total_pages}")
         
-        # Sort candidate pages by keyword density (top 20)
-        candidate_pages = sorted(candidate_pages, key=lambda x: x["keyword_score"], reverse=True)
+        # Sort candidate pages by relevance (TF-weighted keywords, table and number density, top max_pages)
+        ranked = sorted(self.page_scores, key=lambda n: self.page_scores[n]["score"], reverse=True)
         # Limiting to a reasonable number to avoid LLM token overflow, while including high priority pages
-        selected = candidate_pages[:20] 
-        selected = sorted(selected, key=lambda x: x["page"]) # Keep it in logical reading order
+        selected_nums = sorted(ranked[:self.max_pages]) # Keep it in logical reading order
+        
+        selected = self._materialize(selected_nums)
+        self.records = {}
+        self.stats = {
+            "pages_in": total_pages,
+            "pages_out": len(selected),
+            "score_s": round(score_s, 4),
+            # Everything else is PyMuPDF work: text pass, block and word extraction
+            "parse_s": round(time.perf_counter() - started - score_s - ocr_stats.get("ocr_s", 0.0), 4),
+        }
+        self.stats.update(ocr_stats)
+        for page in selected:
+            signals = self.page_scores[page["page"]]
+            page["keyword_score"] = len(signals["counts"])
+            page["relevance_score"] = signals["score"]
+            page["keyword_counts"] = signals["counts"]
         
         return selected
-
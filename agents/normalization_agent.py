@@ -1,8 +1,51 @@
+import re
 import logging
+from functools import lru_cache
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
+METRICS = [("revenue", True), ("co2_scope_1", False), ("co2_scope_2", False), ("co2_scope_3", False)]
+PERIODS = ["y0", "y0_1", "y0_2"]
+
+# Whole unit tokens only, so "kWh" or "bnp" never read as thousands / billions
+UNIT_MULTIPLIERS = {
+    "billion": 1_000_000_000, "billions": 1_000_000_000, "bn": 1_000_000_000, "bln": 1_000_000_000, "b": 1_000_000_000,
+    "million": 1_000_000, "millions": 1_000_000, "mn": 1_000_000, "mln": 1_000_000, "mm": 1_000_000, "m": 1_000_000,
+    "thousand": 1_000, "thousands": 1_000, "k": 1_000, "000s": 1_000, "000": 1_000,
+}
+CURRENCY_PREFIXES = ("eur", "usd", "gbp", "chf", "jpy", "sek", "nok", "dkk", "cad", "aud", "€", "$", "£", "¥")
+UNIT_TOKEN_PATTERN = re.compile(r"[a-z0-9€$£¥]+")
+# "ktCO2e", "KtCO2e" and "ktco2e" are kilotonnes; only "Mt" is a megatonne, since
+# "mtCO2e" and "MTCO2e" usually mean metric tonnes
+TONNE_PREFIX_PATTERN = re.compile(r"\b(?:(k)t|(?-i:(M)t))\s?co2", re.IGNORECASE)
+
+def _token_multiplier(token: str) -> int:
+    if token in UNIT_MULTIPLIERS:
+        return UNIT_MULTIPLIERS[token]
+    # "€m", "eurbn", "$k"
+    for prefix in CURRENCY_PREFIXES:
+        if token.startswith(prefix) and token[len(prefix):] in UNIT_MULTIPLIERS:
+            return UNIT_MULTIPLIERS[token[len(prefix):]]
+    return 0
+
+@lru_cache(maxsize=4096)
+def unit_multiplier(unit: str) -> int:
+    """Multiplier for a free-text unit such as "millions", "€bn", "ktCO2e" or "tCO2e/kWh"."""
+    if not unit:
+        return 1
+    tonnes = TONNE_PREFIX_PATTERN.search(unit)
+    if tonnes:
+        return 1_000 if tonnes.group(1) else 1_000_000
+    lowered = unit.lower()
+    if lowered.strip() in UNIT_MULTIPLIERS:
+        return UNIT_MULTIPLIERS[lowered.strip()]
+    for token in UNIT_TOKEN_PATTERN.findall(lowered.replace("€", " €").replace("$", " $").replace("£", " £")):
+        multiplier = _token_multiplier(token)
+        if multiplier:
+            return multiplier
+    return 1
+
 class NormalizationAgent:
     """
     Standardizes numerical formats, converts string numbers to floats,
@@ -24,16 +67,7 @@ class NormalizationAgent:
                 
                 if raw_val is not None:
                     # Normally LLM returns float directly, but if we need magnitude scaling:
-                    text_unit = str(unit).lower()
-                    
-                    if "billion" in text_unit or "bn" in text_unit or "b" == text_unit.strip():
-                        val_obj["normalized_value"] = raw_val * 1_000_000_000
-                    elif "million" in text_unit or "m" == text_unit.strip():
-                        val_obj["normalized_value"] = raw_val * 1_000_000
-                    elif "thousand" in text_unit or "k" in text_unit:
-                        val_obj["normalized_value"] = raw_val * 1_000
-                    else:
-                        val_obj["normalized_value"] = raw_val
+                    val_obj["normalized_value"] = raw_val * unit_multiplier(str(unit))
                         
                     # If it's revenue, we want everything in millions typically for CSV, or base
                     # If we convert to millions:
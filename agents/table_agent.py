@@ -0,0 +1,275 @@
+import re
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+from utils.pdf_utils import extract_tables_pdfplumber
+from utils.number_utils import clean_number_string, parse_float, normalize_multiplier
+
+logger = logging.getLogger(__name__)
+
+YEAR_PATTERN = re.compile(r"\b(?:fy\s?)?((?:19|20)\d{2})\b")
+# Table cell values in a text line: grouped numbers, plain numbers, or a dash/n.a. placeholder
+VALUE_PATTERN = re.compile(
+    r"-?\d{1,3}(?:[,.  ]\d{3})+(?:[.,]\d+)?|-?\d+(?:[.,]\d+)?|(?<!\S)(?:[-–—]|n/?a)(?!\S)"
+)
+PLACEHOLDER_PATTERN = re.compile(r"^(?:[-–—]|n/?a|)$")
+EMISSIONS_UNIT_PATTERN = re.compile(r"\b([km]?)t\s?co2")
+CATEGORIES_PATTERN = re.compile(
+    r"\b(\d{1,2})\s+(?:of\s+(?:the\s+)?15\s+)?(?:relevant\s+|material\s+|reported\s+)?(?:scope\s*3\s+)?categories"
+)
+
+CURRENCY_PATTERNS = [
+    ("EUR", re.compile(r"\beur\b|€")),
+    ("GBP", re.compile(r"\bgbp\b|£")),
+    ("CHF", re.compile(r"\bchf\b")),
+    ("JPY", re.compile(r"\bjpy\b|¥")),
+    ("SEK", re.compile(r"\bsek\b")),
+    ("NOK", re.compile(r"\bnok\b")),
+    ("DKK", re.compile(r"\bdkk\b")),
+    ("CAD", re.compile(r"\bcad\b|c\$")),
+    ("AUD", re.compile(r"\baud\b|a\$")),
+    ("USD", re.compile(r"\busd\b|\$")),
+]
+
+# label: row label pattern; exclude: rows that mention a different metric;
+# prefer: tie-breaker when several rows disagree
+ROW_RULES = {
+    "revenue": {
+        "label": re.compile(r"\b(?:total\s+|net\s+|group\s+)?(?:revenues?|turnover|net\s+sales)\b"),
+        "exclude": re.compile(r"growth|%|\bper\b|cost|deferred|margin|employee|staff"),
+        "prefer": re.compile(r"\btotal\b|\bgroup\b"),
+    },
+    "co2_scope_1": {
+        "label": re.compile(r"\bscope\s*1\b"),
+        "exclude": re.compile(r"scope\s*1\s*(?:\+|and|&|,)\s*(?:scope\s*)?2|intensity|%|\bper\b"),
+        "prefer": re.compile(r"\btotal\b"),
+    },
+    "co2_scope_2": {
+        "label": re.compile(r"\bscope\s*2\b"),
+        "exclude": re.compile(r"location|scope\s*2\s*(?:\+|and|&|,)\s*(?:scope\s*)?3|intensity|%|\bper\b"),
+        "prefer": re.compile(r"market"),
+    },
+    "co2_scope_3": {
+        "label": re.compile(r"\bscope\s*3\b"),
+        "exclude": re.compile(r"categor|\bcat\.|intensity|%|\bper\b"),
+        "prefer": re.compile(r"\btotal\b"),
+    },
+}
+
+PERIODS = ["y0", "y0_1", "y0_2"]
+# A text line is a table row only if little prose remains once label and values are removed
+MAX_ROW_LETTERS = 30
+
+def _parse_cell(cell: str) -> Optional[float]:
+    return None if PLACEHOLDER_PATTERN.match(cell) else parse_float(clean_number_string(cell))
+
+class TableExtractionAgent:
+    """
+    Rule-based extractor for the common case of a clean GHG / income statement table.
+    Finds Scope 1/2/3 and revenue rows plus the year header above them, on pdfplumber
+    tables and on the text lines of the candidate pages, and returns the same
+    structure as the ExtractionAgent.
+
+    `complete` is True only when every required field was found with high confidence
+    (unambiguous row, one value per year column, unit and currency known), in which
+    case the LLM call can be skipped.
+    """
+
+    REQUIRED_FIELDS = ["reporting_year", "currency"] + [f"{m}_{p}" for m in ROW_RULES for p in PERIODS]
+    HIGH_CONFIDENCE = 0.9
+    EXTRACTION_METHOD = "Rule-based table extraction + Normalization"
+
+    def __init__(self, candidate_pages: List[Dict[str, Any]], pdf_path: str, use_pdfplumber: bool = True):
+        self.candidate_pages = candidate_pages
+        self.pdf_path = pdf_path
+        self.use_pdfplumber = use_pdfplumber
+        self.confidence: Dict[str, float] = {}
+        self.complete = False
+
+    # --- Row collection ---
+
+    def _text_rows(self, page: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Each line becomes a row; the nearest year header line above it gives its columns."""
+        rows = []
+        header = None
+        previous = ""
+        for line in page["text"].lower().splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            years = [int(y) for y in YEAR_PATTERN.findall(line)]
+            if len(years) >= 2 and not any(r["label"].search(line) for r in ROW_RULES.values()):
+                header = {"years": years, "text": f"{previous} {line}"}
+            else:
+                rows.append({"page": page["page"], "text": line, "header": header, "cells": None})
+            previous = line
+        return rows
+
+    def _table_rows(self, page_num: int, tables: List[List[List[str]]]) -> List[Dict[str, Any]]:
+        """pdfplumber rows keep their cells, so values are aligned to year columns by index."""
+        rows = []
+        for table in tables:
+            header = None
+            for cells in table:
+                cells = [(c or "").strip().lower() for c in cells]
+                text = "  ".join(c for c in cells if c)
+                columns = {i: int(m.group(1)) for i, c in enumerate(cells) for m in [YEAR_PATTERN.fullmatch(c)] if m}
+                if len(columns) >= 2:
+                    header = {"columns": columns, "years": list(columns.values()), "text": text}
+                elif text:
+                    rows.append({"page": page_num, "text": text, "header": header, "cells": cells})
+        return rows
+
+    def _collect_rows(self) -> List[Dict[str, Any]]:
+        rows = []
+        if self.use_pdfplumber:
+            # Only pages mentioning a metric label are worth the pdfplumber pass
+            pages = [p["page"] for p in self.candidate_pages
+                     if any(r["label"].search(p["text"].lower()) for r in ROW_RULES.values())]
+            if pages:
+                try:
+                    for page_num, tables in extract_tables_pdfplumber(self.pdf_path, pages).items():
+                        rows.extend(self._table_rows(page_num, tables))
+                except Exception as e:
+                    logger.warning(f"pdfplumber table extraction failed: {e}")
+        for page in self.candidate_pages:
+            rows.extend(self._text_rows(page))
+        return rows
+
+    # --- Row matching ---
+
+    def _match_row(self, metric: str, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Returns {year: value}, confidence and context for a row matching the metric's label."""
+        rule = ROW_RULES[metric]
+        text = row["text"]
+        label = rule["label"].search(text)
+        if not label or rule["exclude"].search(text) or not row["header"]:
+            return None
+        header = row["header"]
+
+        if row["cells"] is not None:
+            columns = header.get("columns")
+            if not columns:
+                return None
+            raw = {year: row["cells"][i] if i < len(row["cells"]) else "" for i, year in columns.items()}
+            confidence = 1.0
+        else:
+            rest = text[label.end():]
+            # Skip prose: a sentence mentioning the label and a few numbers is not a row
+            if len(re.sub(r"[^a-z]", "", VALUE_PATTERN.sub("", rest))) > MAX_ROW_LETTERS:
+                return None
+            tokens = VALUE_PATTERN.findall(rest)
+            years = header["years"]
+            if len(tokens) < len(years):
+                return None
+            # Extra trailing columns (targets, % change) or footnote markers make the alignment uncertain
+            confidence = 1.0 if len(tokens) == len(years) else 0.7
+            raw = dict(zip(years, tokens))
+
+        values = {year: _parse_cell(cell) for year, cell in raw.items()}
+        if all(v is None for v in values.values()):
+            return None
+        return {"values": values, "raw": raw, "confidence": confidence, "page": row["page"],
+                "context": f"{header['text']} {text}", "label": text[label.start():label.end()],
+                "preferred": bool(rule["prefer"].search(text))}
+
+    def _best_match(self, metric: str, rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        matches = [m for m in (self._match_row(metric, r) for r in rows) if m]
+        if not matches:
+            return None
+        if any(m["preferred"] for m in matches):
+            matches = [m for m in matches if m["preferred"]]
+        # The same row is usually seen twice (pdfplumber cell and text line); disagreeing rows are ambiguous
+        distinct = {tuple(sorted(m["values"].items())) for m in matches}
+        best = max(matches, key=lambda m: m["confidence"])
+        if len(distinct) > 1:
+            best = dict(best, confidence=min(best["confidence"], 0.5))
+        return best
+
+    # --- Units ---
+
+    def _unit(self, metric: str, context: str) -> Tuple[Optional[str], bool]:
+        """Returns (unit, known) where known means the magnitude is stated."""
+        if metric != "revenue":
+            m = EMISSIONS_UNIT_PATTERN.search(context)
+            if m:
+                prefix = {"k": "thousand ", "m": "million "}.get(m.group(1), "")
+                return f"{prefix}tCO2e", True
+        multiplier = normalize_multiplier(1.0, context)
+        label = {1e9: "billions", 1e6: "millions", 1e3: "thousands"}.get(multiplier)
+        if metric == "revenue":
+            return label, label is not None
+        return (f"{label} tCO2e" if label else "tCO2e"), label is not None or "tonne" in context
+
+    def _currency(self, contexts: List[str]) -> Optional[str]:
+        for text in contexts:
+            for code, pattern in CURRENCY_PATTERNS:
+                if pattern.search(text):
+                    return code
+        return None
+
+    def _scope_3_categories(self) -> Optional[int]:
+        found = set()
+        for page in self.candidate_pages:
+            for m in CATEGORIES_PATTERN.finditer(page["text"].lower()):
+                if 0 <= int(m.group(1)) <= 15:
+                    found.add(int(m.group(1)))
+        return found.pop() if len(found) == 1 else None
+
+    # --- Entry point ---
+
+    def run(self) -> Dict[str, Any]:
+        logger.info("Running Table Extraction Agent")
+        self.confidence = {}
+        self.complete = False
+        if not self.candidate_pages:
+            return {}
+
+        rows = self._collect_rows()
+        matches = {metric: self._best_match(metric, rows) for metric in ROW_RULES}
+        years = [max(m["values"]) for m in matches.values() if m]
+        reporting_year = max(years) if years else None
+
+        revenue = matches["revenue"]
+        contexts = [revenue["context"]] if revenue else []
+        contexts += [p["text"].lower() for p in self.candidate_pages if revenue and p["page"] == revenue["page"]]
+        currency = self._currency(contexts)
+
+        data: Dict[str, Any] = {
+            "reporting_year": reporting_year,
+            "currency": currency if revenue else None,
+            "scope_3_reporting_categories_y0": self._scope_3_categories(),
+        }
+        self.confidence["reporting_year"] = 1.0 if reporting_year else 0.0
+        self.confidence["currency"] = 1.0 if data["currency"] else 0.0
+
+        for metric, match in matches.items():
+            metric_data = {p: None for p in PERIODS}
+            if match and reporting_year:
+                unit, unit_known = self._unit(metric, match["context"])
+                for offset, period in enumerate(PERIODS):
+                    year = reporting_year - offset
+                    value = match["values"].get(year)
+                    if value is None:
+                        continue
+                    confidence = match["confidence"]
+                    if not unit_known and (metric != "revenue" or value < 1e6):
+                        # A bare revenue figure is almost always in a multiplier stated elsewhere
+                        confidence = min(confidence, 0.6)
+                    self.confidence[f"{metric}_{period}"] = confidence
+                    metric_data[period] = {
+                        "value": value,
+                        "raw_text": match["raw"][year],
+                        "unit": unit,
+                        "page": match["page"],
+                        "source_type": "table",
+                        "reasoning_summary": f"Rule-based: matched '{match['label']}' row for {year}",
+                        "extraction_method": self.EXTRACTION_METHOD,
+                    }
+            data[metric] = metric_data
+
+        missing = [f for f in self.REQUIRED_FIELDS if self.confidence.get(f, 0.0) < self.HIGH_CONFIDENCE]
+        self.complete = not missing
+        logger.info(f"Table extraction found {len(self.REQUIRED_FIELDS) - len(missing)}/{len(self.REQUIRED_FIELDS)} "
+                    f"required fields with high confidence" + ("" if self.complete else f"; missing: {', '.join(missing)}"))
+        return data
@@ -1,67 +1,202 @@
+import time
 import logging
-import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+from utils.bbox_index import PageIndex
+from agents.table_agent import ROW_RULES
 
 logger = logging.getLogger(__name__)
 
+METRICS = ["revenue", "co2_scope_1", "co2_scope_2", "co2_scope_3"]
+EMISSIONS = ["co2_scope_1", "co2_scope_2", "co2_scope_3"]
+# Period key -> years before the reporting year
+PERIODS = {"y0": 0, "y0_1": 1, "y0_2": 2}
+
+def parse_year(value: Any) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
 class VerificationAgent:
     """
     Synthesizes the extraction and normalization data into the final Audit/Verification JSON structure
     while attaching metadata like confidence and extraction method.
+
+    Confidence is built from evidence in the document: whether the number is found
+    on its cited page (or another candidate page), whether that page ties it to the
+    period's year (by row, column or header position) and to the metric's row label,
+    or to different ones, and whether it is plausible next to the other years and
+    scopes. Fields below LOW_CONFIDENCE are flagged so they can be re-queried on their own.
     """
-    
+
+    BASE_SCORE = 0.2
+    LOCATED_SCORES = {"page": 0.3, "other_page": 0.1}
+    YEAR_SCORE = 0.25
+    ROW_SCORE = 0.15
+    REASONING_SCORE = 0.05
+    # Tied to another year or another metric's row
+    MISMATCH_PENALTY = 0.35
+    ISSUE_PENALTY = 0.15
+    LOW_CONFIDENCE = 0.5
+    # Adjacent years further apart than this factor suggest a unit slip or a wrong column
+    MAX_YEAR_RATIO = 5.0
+
     def __init__(self, normalized_data: Dict[str, Any], candidate_pages: List[Dict[str, Any]]):
         self.data = normalized_data
-        self.pages = candidate_pages
+        self.pages = {p["page"]: p for p in candidate_pages}
+        self.indexes: Dict[int, PageIndex] = {}
+        self.assessments: Optional[Dict[str, Dict[str, Any]]] = None
+        self.stats: Dict[str, Any] = {"bbox_lookups": 0, "bbox_lookup_s": 0.0, "fields_checked": 0,
+                                      "low_confidence": 0, "checks_s": 0.0}
+
+    def _page_index(self, page_num: int) -> Optional[PageIndex]:
+        # Built once per page on first use
+        if page_num not in self.indexes:
+            page = self.pages.get(page_num)
+            self.indexes[page_num] = PageIndex(page) if page else None
+        return self.indexes[page_num]
 
-    def _find_bbox(self, text_snippet: str, page_num: int) -> List[float]:
-        if not text_snippet or not page_num:
+    def _find_bbox(self, text_snippet: str, page_num: int, value: Optional[float] = None) -> List[float]:
+        if not (text_snippet or value is not None) or not page_num:
             return None
-            
-        for p in self.pages:
-            if p["page"] == page_num:
-                for block in p.get("blocks", []):
-                    if text_snippet.lower() in block["text"].lower() or block["text"].lower() in text_snippet.lower():
-                        return block["bbox"]
-        return None
+        started = time.perf_counter()
+        index = self._page_index(page_num)
+        bbox = index.find(text_snippet, value) if index else None
+        self.stats["bbox_lookups"] += 1
+        self.stats["bbox_lookup_s"] = round(self.stats["bbox_lookup_s"] + time.perf_counter() - started, 6)
+        return bbox
+
+    def _value(self, metric: str, period: str) -> Optional[float]:
+        val_obj = (self.data.get(metric) or {}).get(period)
+        if not val_obj or val_obj.get("value") is None:
+            return None
+        normalized = val_obj.get("normalized_value")
+        return normalized if normalized is not None else val_obj["value"]
+
+    def _plausibility_issues(self) -> Dict[str, List[str]]:
+        """Cross-year ratio, Scope 1 vs Scope 3 and sign checks, as issue labels per field key."""
+        issues: Dict[str, List[str]] = {}
+        def add(metric: str, period: str, issue: str):
+            issues.setdefault(f"{metric}_{period}", []).append(issue)
+
+        for metric in METRICS:
+            present = [(p, v) for p in PERIODS for v in [self._value(metric, p)] if v is not None]
+            for (p1, v1), (p2, v2) in zip(present, present[1:]):
+                if v1 > 0 and v2 > 0 and max(v1, v2) / min(v1, v2) > self.MAX_YEAR_RATIO:
+                    issue = f"year_ratio: {p1} vs {p2} differ {max(v1, v2) / min(v1, v2):.1f}x"
+                    add(metric, p1, issue)
+                    add(metric, p2, issue)
+            if metric in EMISSIONS:
+                for period, value in present:
+                    if value < 0:
+                        add(metric, period, "negative: emissions below zero")
+        for period in PERIODS:
+            scope_1, scope_3 = self._value("co2_scope_1", period), self._value("co2_scope_3", period)
+            if scope_1 is not None and scope_3 is not None and scope_1 > scope_3:
+                add("co2_scope_1", period, "scope_order: Scope 1 exceeds Scope 3")
+                add("co2_scope_3", period, "scope_order: Scope 1 exceeds Scope 3")
+        return issues
+
+    def _locate(self, val_obj: Dict[str, Any]) -> Tuple[Optional[str], Optional[int], List[int]]:
+        """("page" | "other_page" | None, page the number was found on, its word positions)."""
+        cited = val_obj.get("page")
+        index = self._page_index(cited) if cited else None
+        positions = index.locate(val_obj["value"]) if index else []
+        if positions:
+            return "page", cited, positions
+        for page_num in self.pages:
+            if page_num != cited:
+                positions = self._page_index(page_num).locate(val_obj["value"])
+                if positions:
+                    return "other_page", page_num, positions
+        return None, None, []
+
+    def _position_evidence(self, index: PageIndex, position: int, metric: str, year: Optional[int]) -> Dict[str, Any]:
+        """Year and metric row the page ties one occurrence of the number to."""
+        tied, how = index.year_tie(position) if year else (None, None)
+        # Block-level pages have no lines to tell rows apart
+        labels = {m for m, rule in ROW_RULES.items() if rule["label"].search(index.line_text(position))} if index.word_level else set()
+        evidence = {"year": how if tied == year else None, "year_found": tied, "row": metric in labels if labels else None}
+        score = 0.0
+        if evidence["year"]:
+            score += self.YEAR_SCORE
+        elif tied:
+            # The page puts the number under another year: most likely the wrong column
+            score -= self.MISMATCH_PENALTY
+        if evidence["row"]:
+            score += self.ROW_SCORE
+        elif evidence["row"] is False:
+            # ... or on another metric's row
+            score -= self.MISMATCH_PENALTY
+        evidence["score"] = score
+        return evidence
 
-    def _compute_confidence(self, val_obj: Dict[str, Any]) -> float:
-        # Heuristic confidence calculation
-        if val_obj is None or val_obj.get("value") is None:
-            return 0.0
-            
-        score = 0.5 # Base score for LLM returning a value
-        
-        # Increment if it provided clear reasoning
+    def _assess(self, val_obj: Dict[str, Any], metric: str, period: str, issues: List[str]) -> Dict[str, Any]:
+        located, page, positions = self._locate(val_obj)
+        reporting_year = parse_year(self.data.get("reporting_year"))
+        year = reporting_year - PERIODS[period] if reporting_year else None
+        evidence = {"year": None, "year_found": None, "row": None, "score": 0.0}
+        if positions:
+            index = self._page_index(page)
+            evidence = max((self._position_evidence(index, i, metric, year) for i in positions), key=lambda e: e["score"])
+
+        score = self.BASE_SCORE + self.LOCATED_SCORES.get(located, 0.0) + evidence.pop("score")
         if val_obj.get("reasoning_summary"):
-            score += 0.2
-            
-        # Increment if found on a specific page
-        if val_obj.get("page"):
-            score += 0.2
-            
-        score = min(score, 1.0)
-        return score
-
-    def build_verification_json(self) -> Dict[str, Any]:
+            score += self.REASONING_SCORE
+        score -= self.ISSUE_PENALTY * len({issue.split(":")[0] for issue in issues})
+        return {
+            "confidence": round(min(max(score, 0.0), 1.0), 2),
+            "checks": {"located": located, "found_on_page": page, **evidence, "issues": issues},
+        }
+
+    def assess(self) -> Dict[str, Dict[str, Any]]:
+        """Confidence and checks per extracted field key (e.g. "co2_scope_1_y0"), computed once."""
+        if self.assessments is not None:
+            return self.assessments
+        started = time.perf_counter()
+        self.assessments = {}
+        issues = self._plausibility_issues() if self.data else {}
+        for metric, metric_data in (self.data or {}).items():
+            if not isinstance(metric_data, dict):
+                continue
+            for period in PERIODS:
+                val_obj = metric_data.get(period)
+                if val_obj and val_obj.get("value") is not None:
+                    field_key = f"{metric}_{period}"
+                    self.assessments[field_key] = self._assess(val_obj, metric, period, issues.get(field_key, []))
+        self.stats["fields_checked"] = len(self.assessments)
+        self.stats["low_confidence"] = len(self.low_confidence_fields())
+        self.stats["checks_s"] = round(time.perf_counter() - started, 6)
+        return self.assessments
+
+    def low_confidence_fields(self, threshold: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Assessments of the extracted fields scoring below `threshold` (default LOW_CONFIDENCE)."""
+        threshold = self.LOW_CONFIDENCE if threshold is None else threshold
+        return {key: a for key, a in self.assess().items() if a["confidence"] < threshold}
+
+    def build_verification_json(self, model: str = "gpt-4o", backend: str = "openai") -> Dict[str, Any]:
+        """`model` and `backend` name the LLM that produced fields without their own extraction_method."""
         logger.info("Building Verification JSON")
+        llm_method = f"LLM Structured Output ({model}, {backend} backend) + Normalization"
         audit_trail = {}
-        
+
         if not self.data:
             return audit_trail
-            
+
+        assessments = self.assess()
         for metric_name, metric_data in self.data.items():
             if metric_name in ["reporting_year", "currency", "scope_3_reporting_categories_y0"]:
                 audit_trail[metric_name] = {"value": metric_data}
                 continue
-            
-            for period in ["y0", "y0_1", "y0_2"]:
+
+            for period in PERIODS:
                 field_key = f"{metric_name}_{period}"
                 val_obj = metric_data.get(period)
-                
+
                 if val_obj and val_obj.get("value") is not None:
-                    bbox = self._find_bbox(val_obj.get("raw_text"), val_obj.get("page"))
-                    
+                    bbox = self._find_bbox(val_obj.get("raw_text"), val_obj.get("page"), val_obj.get("value"))
+                    assessment = assessments[field_key]
+
                     audit_record = {
                         "value": val_obj.get("value"),
                         "unit": val_obj.get("unit"),
@@ -70,10 +205,15 @@ class VerificationAgent:
                         "bbox": bbox,
                         "raw_text": val_obj.get("raw_text"),
                         "normalized_value": val_obj.get("normalized_value"),
-                        "confidence": self._compute_confidence(val_obj),
-                        "extraction_method": "LLM Structured Output (gpt-4o) + Normalization",
+                        "confidence": assessment["confidence"],
+                        "low_confidence": assessment["confidence"] < self.LOW_CONFIDENCE,
+                        "checks": assessment["checks"],
+                        "extraction_method": val_obj.get("extraction_method") or llm_method,
                         "reasoning_summary": val_obj.get("reasoning_summary")
                     }
                     audit_trail[field_key] = audit_record
-                    
+
+        if self.stats["low_confidence"]:
+            logger.info(f"{self.stats['low_confidence']}/{self.stats['fields_checked']} field(s) below confidence "
+                        f"{self.LOW_CONFIDENCE}: {', '.join(self.low_confidence_fields())}")
         return audit_trail
@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Tuple
+
+from agents.layout_agent import LayoutAgent
+from agents.extraction_agent import ExtractionAgent
+from utils.llm_client import AsyncLLMClient, make_llm_client
+from utils.result_store import ResultStore
+from utils.profiling import StageProfiler, summarize_stages
+from extract import (finalize_document, merge_rows_into_csv, add_pipeline_arguments, cache_from_args, evict_caches,
+                     layout_options_from_args, extraction_options_from_args, llm_options_from_args, llm_method_options)
+
+logger = logging.getLogger("batch_extract")
+
+# --- Stage functions (run in worker processes / the LLM event loop) ---
+
+# Each stage returns its result together with its StageProfiler records
+
+def _profiler(pdf_path: str, profile_dir: Optional[str]) -> StageProfiler:
+    return StageProfiler(os.path.splitext(os.path.basename(pdf_path))[0], profile_dir)
+
+def layout_stage(pdf_path: str, layout_options: Optional[Dict[str, Any]] = None,
+                 profile_dir: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"File not found: {pdf_path}")
+    profiler = _profiler(pdf_path, profile_dir)
+    with profiler.stage("layout") as stats:
+        agent = LayoutAgent(pdf_path, **(layout_options or {}))
+        pages = agent.run()
+        stats.update(agent.stats)
+    return pages, profiler.records
+
+async def extraction_stage(pdf_path: str, candidate_pages: List[Dict[str, Any]], llm_client: AsyncLLMClient,
+                           extraction_options: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Returns the raw extraction, the agent's run stats and the stage record."""
+    profiler = _profiler(pdf_path, None)
+    # Other documents share the event loop thread, so only wall time and counters are attributable
+    with profiler.stage("extraction", exclusive=False) as stats:
+        agent = ExtractionAgent(candidate_pages, pdf_path, **(extraction_options or {}))
+        raw_data = await agent.run_async(llm_client)
+        stats.update(agent.run_stats)
+    if not raw_data:
+        # ExtractionAgent swallows LLM errors into an empty dict; surface it so the
+        # document is reported and retried on the next (resumed) run.
+        raise RuntimeError("LLM extraction returned no data")
+    return raw_data, agent.run_stats, profiler.records
+
+def finalize_stage(pdf_path: str, candidate_pages: List[Dict[str, Any]], raw_data: Dict[str, Any], verification_json: str,
+                   store_path: Optional[str] = None, profile_dir: Optional[str] = None,
+                   method_options: Optional[Dict[str, Any]] = None,
+                   company_name: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """`method_options` are llm_method_options() of the run, recorded in the verification JSON."""
+    profiler = _profiler(pdf_path, profile_dir)
+    row = finalize_document(pdf_path, candidate_pages, raw_data, verification_json, profiler,
+                            company_name=company_name, **(method_options or {}))
+    if store_path:
+        with profiler.stage("output"):
+            # Each worker upserts through its own connection as soon as the document is done
+            store = ResultStore(store_path)
+            store.upsert(row, os.path.abspath(pdf_path))
+            store.close()
+    return row, profiler.records
+
+# --- Inputs and progress log ---
+
+def collect_inputs(source: str) -> List[str]:
+    """
+    Resolves a directory (all *.pdf files, sorted) or a manifest file
+    (one PDF path per line, '#' comments allowed, relative to the manifest).
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(".pdf")
+        )
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    pdf_paths = []
+    with open(source, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            pdf_paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return pdf_paths
+
+def verification_path(verification_dir: str, pdf_path: str) -> str:
+    """`<stem>-<hash>.json`: the short hash of the absolute path keeps same-named PDFs from different folders apart."""
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    digest = hashlib.sha256(os.path.abspath(pdf_path).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(verification_dir, f"{stem}-{digest}.json")
+
+def company_names(pdf_paths: List[str]) -> Dict[str, str]:
+    """
+    CSV company names per absolute path: the path relative to the folder that holds
+    all inputs, so same-named PDFs from different folders get separate rows. For a
+    directory input this is just the file name.
+    """
+    abs_paths = [os.path.abspath(p) for p in pdf_paths]
+    if not abs_paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(p) for p in abs_paths])
+    return {p: os.path.relpath(p, root) for p in abs_paths}
+
+def failure_records(progress: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Documents whose latest progress record is a failure, from this run or an earlier one."""
+    return {pdf: {"stage": r.get("stage"), "error": r.get("error")}
+            for pdf, r in progress.items() if r.get("status") == "failed"}
+
+def load_progress(progress_log: str) -> Dict[str, Dict[str, Any]]:
+    """Returns the latest progress record per document from a JSONL progress log."""
+    records = {}
+    if not os.path.exists(progress_log):
+        return records
+    with open(progress_log, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-write can leave a truncated last line
+                continue
+            records[record["pdf"]] = record
+    return records
+
+def append_progress(progress_log: str, record: Dict[str, Any]):
+    with open(progress_log, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+# --- Batch runner ---
+
+class LLMEventLoop:
+    """
+    Runs an asyncio loop in a background thread so that LLM calls from all documents
+    share one LLM client (rate limiter, concurrency bound, connection pool, or the
+    pending Batch API job) while the batch runner keeps waiting on ordinary
+    concurrent futures.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: float, tokens_per_minute: float,
+                 llm_options: Optional[Dict[str, Any]] = None):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        options = dict(llm_options or {}, max_concurrency=max_concurrency,
+                       requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+        self.llm_client = self.run(self._make_client(options)).result()
+
+    async def _make_client(self, options: Dict[str, Any]):
+        # asyncio primitives must be created on the loop that uses them
+        return make_llm_client(**options)
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+def run_batch(pdf_paths: List[str], output_csv: str, verification_dir: str,
+              workers: Optional[int] = None, llm_concurrency: int = 8,
+              requests_per_minute: float = 500, tokens_per_minute: float = 30_000,
+              progress_log: Optional[str] = None, failure_report: Optional[str] = None,
+              layout_options: Optional[Dict[str, Any]] = None,
+              extraction_options: Optional[Dict[str, Any]] = None,
+              store_path: Optional[str] = None, profile_dir: Optional[str] = None,
+              llm_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Runs the pipeline over many PDFs. Layout and normalization/verification run in a
+    process pool, LLM calls run concurrently on a shared rate-limited async client. Every finished document
+    is recorded in a JSONL progress log so an interrupted batch can be resumed, and the
+    CSV is merged once at the end. With `store_path`, workers upsert rows into the
+    SQLite result store as they finish and the CSV is exported from the store.
+    Per-stage metrics of every finished document are appended to
+    `<verification_dir>/metrics.jsonl` and aggregated under "stages" in the summary.
+    `llm_options` select the LLM backend (see make_llm_client); with the batch backend
+    the prompts of all documents in flight are submitted together as Batch API jobs.
+    """
+    os.makedirs(verification_dir, exist_ok=True)
+    progress_log = progress_log or os.path.join(verification_dir, "progress.jsonl")
+    failure_report = failure_report or os.path.join(verification_dir, "failures.json")
+    metrics_log = os.path.join(verification_dir, "metrics.jsonl")
+
+    extraction_options = extraction_options or {}
+    cache = extraction_options.get("cache")
+    method_options = llm_method_options(extraction_options, llm_options)
+    names = company_names(pdf_paths)
+    progress = load_progress(progress_log)
+    rows = [r["row"] for r in progress.values() if r.get("status") == "ok"]
+    done = {pdf for pdf, r in progress.items() if r.get("status") in ("ok", "skipped")}
+    pending = [p for p in pdf_paths if os.path.abspath(p) not in done]
+    logger.info(f"Batch: {len(pdf_paths)} documents, {len(pdf_paths) - len(pending)} already done, {len(pending)} to process")
+
+    failures = {}
+    skipped = []
+    extracted = 0
+    llm_skipped = 0
+    # Documents that reused an earlier result through the fingerprint index (fully or diff-only)
+    reused = {"reused": 0, "diff": 0}
+    stage_records: Dict[str, Dict[str, Any]] = {}
+    document_metrics = []
+    started = time.time()
+
+    def record(pdf_path: str, status: str, **extra):
+        entry = {"pdf": os.path.abspath(pdf_path), "status": status, "timestamp": time.time()}
+        entry.update(extra)
+        append_progress(progress_log, entry)
+
+    llm = LLMEventLoop(llm_concurrency, requests_per_minute, tokens_per_minute, llm_options)
+    with ProcessPoolExecutor(max_workers=workers) as procs:
+        in_flight = {}
+        for pdf_path in pending:
+            in_flight[procs.submit(layout_stage, pdf_path, layout_options, profile_dir)] = ("layout", pdf_path, None)
+
+        while in_flight:
+            finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for fut in finished:
+                stage, pdf_path, candidate_pages = in_flight.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    logger.error(f"[{os.path.basename(pdf_path)}] {stage} stage failed: {e}")
+                    failures[pdf_path] = {"stage": stage, "error": f"{type(e).__name__}: {e}"}
+                    record(pdf_path, "failed", stage=stage, error=failures[pdf_path]["error"])
+                    continue
+
+                # Every stage returns its stage records last
+                *result, records = result
+                stage_records.setdefault(pdf_path, {}).update(records)
+
+                if stage == "layout":
+                    result = result[0]
+                    if not result:
+                        logger.warning(f"[{os.path.basename(pdf_path)}] No candidate pages found, skipping.")
+                        skipped.append(pdf_path)
+                        record(pdf_path, "skipped", reason="no candidate pages")
+                        continue
+                    in_flight[llm.run(extraction_stage(pdf_path, result, llm.llm_client, extraction_options))] = ("extraction", pdf_path, result)
+                elif stage == "extraction":
+                    result, stats = result
+                    extracted += 1
+                    llm_skipped += stats.get("llm_skipped", False)
+                    if stats.get("mode") in reused:
+                        reused[stats["mode"]] += 1
+                    verification_json = verification_path(verification_dir, pdf_path)
+                    in_flight[procs.submit(finalize_stage, pdf_path, candidate_pages, result, verification_json, store_path, profile_dir,
+                                                        method_options, names[os.path.abspath(pdf_path)])] = ("finalize", pdf_path, None)
+                else:
+                    result = result[0]
+                    rows.append(result)
+                    record(pdf_path, "ok", row=result, verification_json=verification_path(verification_dir, pdf_path))
+                    records = stage_records.pop(pdf_path)
+                    metrics = {"pdf": os.path.abspath(pdf_path), "stages": records,
+                               "wall_s": round(sum(r["wall_s"] for r in records.values()), 4)}
+                    document_metrics.append(metrics)
+                    append_progress(metrics_log, metrics)
+    llm.close()
+
+    write_started = time.perf_counter()
+    if store_path:
+        store = ResultStore(store_path)
+        store.export_csv(output_csv)
+        store.close()
+    else:
+        merge_rows_into_csv(rows, output_csv)
+    csv_write_s = round(time.perf_counter() - write_started, 4)
+
+    # A resumed run only retries earlier failures, so the report is rebuilt from the whole log
+    with open(failure_report, 'w') as f:
+        json.dump(failure_records(load_progress(progress_log)), f, indent=2)
+
+    summary = {
+        "documents": len(pdf_paths),
+        "processed": len(pending),
+        "succeeded": len(pending) - len(failures) - len(skipped),
+        "skipped": len(skipped),
+        "failed": len(failures),
+        "llm_calls": len(llm.llm_client.metrics),
+        "cache_hits": cache.hits if cache is not None else 0,
+        "llm_skipped": llm_skipped,
+        "llm_skip_rate": round(llm_skipped / extracted, 4) if extracted else 0.0,
+        "reused_documents": reused["reused"],
+        "diff_extractions": reused["diff"],
+        "llm_prompt_tokens": sum(m["prompt_tokens"] or 0 for m in llm.llm_client.metrics),
+        "llm_completion_tokens": sum(m["completion_tokens"] or 0 for m in llm.llm_client.metrics),
+        "elapsed_seconds": round(time.time() - started, 2),
+        "csv_write_s": csv_write_s,
+        "stages": summarize_stages(document_metrics),
+    }
+    logger.info(f"Batch finished: {summary}. Failure report: {failure_report}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch ESG Extraction over a directory or manifest of PDFs")
+    parser.add_argument("input", type=str, help="Directory of PDFs or manifest file (one PDF path per line)")
+    parser.add_argument("output_csv", type=str, help="Path to output CSV")
+    parser.add_argument("verification_dir", type=str, help="Directory for per-document verification JSON files")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size for layout/normalization/verification (default: CPU count)")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="Maximum concurrent LLM calls")
+    parser.add_argument("--rpm", type=float, default=500, help="LLM requests-per-minute limit shared by the batch")
+    parser.add_argument("--tpm", type=float, default=30_000, help="LLM tokens-per-minute limit shared by the batch")
+    parser.add_argument("--progress-log", type=str, default=None, help="Resumable JSONL progress log (default: <verification_dir>/progress.jsonl)")
+    parser.add_argument("--failure-report", type=str, default=None, help="Per-document failure report (default: <verification_dir>/failures.json)")
+    add_pipeline_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.llm_backend != "local" and not os.environ.get("OPENAI_API_KEY"):
+        logger.error("OPENAI_API_KEY environment variable is not set. The LLM extraction will fail unless using a local endpoint mapped to base_url.")
+
+    pdf_paths = collect_inputs(args.input)
+    if not pdf_paths:
+        logger.error(f"No PDFs found in {args.input}")
+        sys.exit(1)
+
+    cache = cache_from_args(args)
+    run_batch(pdf_paths, args.output_csv, args.verification_dir,
+              workers=args.workers, llm_concurrency=args.llm_concurrency,
+              requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+              progress_log=args.progress_log, failure_report=args.failure_report,
+              layout_options=layout_options_from_args(args),
+              extraction_options=extraction_options_from_args(args, cache),
+              store_path=args.store,
+              profile_dir=args.profile_dir if args.profile else None,
+              llm_options=llm_options_from_args(args))
+    evict_caches(args, cache)
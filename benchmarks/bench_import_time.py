@@ -0,0 +1,111 @@
+"""
+Import time of the CLI entry points, measured with `python -X importtime`.
+
+    python -m benchmarks.bench_import_time --repeat 7
+    python -m benchmarks.bench_import_time --report imports.json
+    python -m benchmarks.bench_import_time --baseline imports.json   # exits 1 on regressions
+
+Every measurement is a fresh interpreter. Reported per module (median over --repeat):
+`import_ms`, the module's cumulative import time from -X importtime; `startup_ms`,
+wall time of the whole `python -c "import <module>"` process; and the heaviest
+top-level packages it pulled in. Dependencies in DEFERRED are only needed by some
+stages and must not be imported by the entry points themselves; finding one of them
+after the import is always reported as a regression.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import List, Dict, Any
+
+MODULES = ["extract", "batch_extract", "serve"]
+# Imported by the stage that needs them: CSV writing / batch normalization, LLM calls,
+# table-first extraction and schema validation
+DEFERRED = ["pandas", "openai", "pdfplumber", "jsonschema"]
+
+PROBE = "import sys, json, {module}; print(json.dumps(sorted(m for m in {deferred!r} if m in sys.modules)))"
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Cumulative microseconds per top-level package (or module) from -X importtime output."""
+    packages: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        top = name.strip().split(".")[0]
+        packages[top] = max(packages.get(top, 0), int(cumulative))
+    return packages
+
+def measure(module: str, repeat: int, repo_root: str) -> Dict[str, Any]:
+    import_us, startup_s, packages, leaked = [], [], {}, set()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, deferred=DEFERRED)],
+                             cwd=repo_root, capture_output=True, text=True, check=True)
+        startup_s.append(time.perf_counter() - started)
+        run = parse_importtime(out.stderr)
+        import_us.append(run[module])
+        for name, us in run.items():
+            packages.setdefault(name, []).append(us)
+        leaked.update(json.loads(out.stdout.strip().splitlines()[-1]))
+    # Third-party packages only; the repo's own modules are what import them
+    local = {name for name in packages if os.path.exists(os.path.join(repo_root, name)) or
+             os.path.exists(os.path.join(repo_root, f"{name}.py"))}
+    heaviest = sorted(((name, statistics.median(us)) for name, us in packages.items() if name not in local),
+                      key=lambda item: item[1], reverse=True)[:5]
+    return {
+        "module": module,
+        "import_ms": round(statistics.median(import_us) / 1000, 1),
+        "startup_ms": round(statistics.median(startup_s) * 1000, 1),
+        "heaviest": [[name, round(us / 1000, 1)] for name, us in heaviest],
+        "deferred_imported": sorted(leaked),
+    }
+
+def find_regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    previous = {r["module"]: r for r in baseline}
+    regressions = []
+    for r in results:
+        if r["deferred_imported"]:
+            regressions.append(f"{r['module']}: imports {', '.join(r['deferred_imported'])} at module load")
+        base = previous.get(r["module"])
+        if base and r["import_ms"] > base["import_ms"] * (1 + tolerance):
+            regressions.append(f"{r['module']}: import {r['import_ms']} ms > baseline {base['import_ms']} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module; the median is reported")
+    parser.add_argument("--report", type=str, default=None, help="Write results as JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare against an earlier --report and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative import time regression")
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    print(f"{'module':>14} {'import_ms':>10} {'startup_ms':>11}  heaviest packages (ms)")
+    for module in args.modules:
+        result = measure(module, args.repeat, repo_root)
+        results.append(result)
+        heaviest = ", ".join(f"{name} {ms}" for name, ms in result["heaviest"])
+        print(f"{module:>14} {result['import_ms']:>10} {result['startup_ms']:>11}  {heaviest}")
+
+    regressions = find_regressions(results, [], args.tolerance)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Micro-benchmark of LayoutAgent page scoring plus a ranking recall check.
+
+    python -m benchmarks.bench_keyword_scan --pages 500 --repeat 20 --top-k 3
+
+Compares the former per-keyword `re.search` loop against the single compiled
+KeywordScanner (counts only, and full relevance scoring) over the page texts of a
+synthetic report replicated `--repeat` times, then checks that the known GHG and
+revenue table pages rank in the top-k among pages with decoy keyword mentions.
+"""
+import re
+import os
+import time
+import argparse
+import tempfile
+
+from agents.layout_agent import LayoutAgent, ESG_KEYWORDS, ESG_SCANNER
+from benchmarks.synthetic_pdf import make_synthetic_report, ghg_table_page, revenue_table_page
+from utils.pdf_utils import iter_page_texts
+
+def _presence_loop(text: str) -> int:
+    return sum(1 for kw in ESG_KEYWORDS if re.search(kw, text))
+
+def _timed(fn, texts) -> float:
+    started = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--decoy-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "synthetic.pdf")
+        make_synthetic_report(pdf_path, args.pages, decoy_rate=args.decoy_rate)
+
+        texts = [text.lower() for _, text in iter_page_texts(pdf_path)] * args.repeat
+        print(f"Scoring {len(texts)} pages")
+        for name, fn in [("presence loop (15x re.search)", _presence_loop),
+                         ("KeywordScanner.scan", ESG_SCANNER.scan),
+                         ("KeywordScanner.relevance", ESG_SCANNER.relevance)]:
+            elapsed = _timed(fn, texts)
+            print(f"  {name:<32} {elapsed:8.3f}s  {len(texts) / elapsed:10.0f} pages/s")
+
+        expected = {ghg_table_page(args.pages), revenue_table_page(args.pages)}
+
+        # Former ranking: number of distinct keywords present (stable sort keeps page order on ties)
+        presence = {n: _presence_loop(text.lower()) for n, text in iter_page_texts(pdf_path)}
+        baseline = sorted((n for n in presence if presence[n]), key=lambda n: presence[n], reverse=True)
+        baseline_recall = len(expected & set(baseline[:args.top_k])) / len(expected)
+
+        agent = LayoutAgent(pdf_path)
+        agent.run()
+        ranked = sorted(agent.page_scores, key=lambda n: agent.page_scores[n]["score"], reverse=True)
+        print(f"Candidate pages: {len(agent.page_scores)}, top-{args.top_k}: {ranked[:args.top_k]}, expected: {sorted(expected)}")
+        recall = len(expected & set(ranked[:args.top_k])) / len(expected)
+        print(f"Recall@{args.top_k}: {recall:.2f} (presence ranking: {baseline_recall:.2f})")
+        if recall < 1.0:
+            raise SystemExit("Known ESG pages fell out of the top-k")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Peak memory of LayoutAgent by page count: eager parsing vs streaming.
+
+    python -m benchmarks.bench_layout_memory --pages 100 1000 3000 --workers 4
+
+Modes:
+    eager         full parse of every page kept in memory (lazy=False)
+    cache-fill    first run with a page cache: the whole document is parsed, then saved
+    lazy          default two-pass scan (text pass, then blocks for selected pages)
+    stream        streaming mode: top-k heap, pages released as soon as they are scored
+    stream-cache  streaming mode writing the page cache entry while parsing
+    stream-par    streaming mode with a bounded window of parallel parse shards
+
+Each measurement runs in a fresh subprocess. `rss_growth_mb` is the peak RSS minus
+the RSS after imports, i.e. what the layout stage itself added; with workers the
+largest worker peak is reported separately.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.synthetic_pdf import make_synthetic_report
+
+MODES = {
+    "eager": {"lazy": False},
+    "cache-fill": {"cache": True},
+    "lazy": {},
+    "stream": {"stream": True},
+    "stream-cache": {"stream": True, "cache": True},
+    "stream-par": {"stream": True, "parallel": True},
+}
+
+def _measure(pdf_path: str, mode: str, workers: int, cache_dir: str) -> dict:
+    import time
+    import resource
+    from agents.layout_agent import LayoutAgent
+    from utils.profiling import peak_rss_mb
+
+    options = dict(MODES[mode])
+    if options.pop("cache", False):
+        options["page_cache_dir"] = cache_dir
+    if options.pop("parallel", False):
+        options["parse_workers"] = workers
+
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    agent = LayoutAgent(pdf_path, **options)
+    selected = agent.run()
+    elapsed = time.perf_counter() - started
+    peak = peak_rss_mb()
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return {"pages_in": agent.stats["pages_in"], "pages_out": len(selected), "wall_s": round(elapsed, 3),
+            "peak_rss_mb": round(peak, 1), "rss_growth_mb": round(peak - baseline, 1),
+            "worker_peak_rss_mb": round(worker_rss / 2**20, 1),
+            "selected": [p["page"] for p in selected]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000, 3000])
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--measure", nargs=4, metavar=("PDF", "MODE", "WORKERS", "CACHE_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        pdf_path, mode, workers, cache_dir = args.measure
+        print(json.dumps(_measure(pdf_path, mode, int(workers), cache_dir)))
+        return
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"{'pages':>6} {'mode':>13} {'wall_s':>8} {'peak_rss_mb':>12} {'growth_mb':>10} {'worker_mb':>10} {'same':>5}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_pages in args.pages:
+            pdf_path = os.path.join(tmp, f"synthetic_{n_pages}.pdf")
+            make_synthetic_report(pdf_path, n_pages)
+            reference = None
+            for mode in args.modes:
+                # Fresh cache per run so the cache modes always fill it
+                cache_dir = os.path.join(tmp, f"cache_{n_pages}_{mode}")
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_layout_memory", "--measure", pdf_path, mode,
+                     str(args.workers), cache_dir],
+                    cwd=repo_root, capture_output=True, text=True, check=True
+                )
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                reference = reference or result["selected"]
+                print(f"{n_pages:>6} {mode:>13} {result['wall_s']:>8} {result['peak_rss_mb']:>12} "
+                      f"{result['rss_growth_mb']:>10} {result['worker_peak_rss_mb']:>10} "
+                      f"{str(result['selected'] == reference):>5}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares serial and page-sharded parallel PyMuPDF parsing on synthetic reports.
+
+    python -m benchmarks.bench_layout_parse --pages 50 200 500 --workers 4
+
+Each measurement runs in a fresh subprocess so peak RSS is not polluted by earlier
+runs. Reported RSS is the parent process peak plus the largest worker peak.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.synthetic_pdf import make_synthetic_report
+
+def _measure(pdf_path: str, workers: int) -> dict:
+    import time
+    import resource
+    from utils.pdf_utils import extract_text_and_bboxes_pymupdf
+
+    started = time.perf_counter()
+    pages = extract_text_and_bboxes_pymupdf(pdf_path, workers=workers)
+    elapsed = time.perf_counter() - started
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    parent_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return {"pages": len(pages), "wall_s": round(elapsed, 3),
+            "peak_rss_mb": round((parent_rss + worker_rss) / 2**20, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--measure", nargs=2, metavar=("PDF", "WORKERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(_measure(args.measure[0], int(args.measure[1]))))
+        return
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"{'pages':>6} {'mode':>14} {'wall_s':>8} {'peak_rss_mb':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_pages in args.pages:
+            pdf_path = os.path.join(tmp, f"synthetic_{n_pages}.pdf")
+            make_synthetic_report(pdf_path, n_pages)
+            for workers in (1, args.workers):
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_layout_parse", "--measure", pdf_path, str(workers)],
+                    cwd=repo_root, capture_output=True, text=True, check=True
+                )
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                mode = "serial" if workers == 1 else f"parallel x{workers}"
+                print(f"{n_pages:>6} {mode:>14} {result['wall_s']:>8} {result['peak_rss_mb']:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-document NormalizationAgent throughput, with the memoized unit lookup and with
+every unit string resolved from scratch.
+
+    python -m benchmarks.bench_normalization --docs 10000
+    python -m benchmarks.bench_normalization --cache-dir .esg_cache/llm
+
+Synthetic extraction results use a realistic spread of unit spellings; with
+`--cache-dir`, cached LLM extraction results are renormalized instead. Both lookups
+must produce the same multipliers.
+"""
+import copy
+import time
+import random
+import argparse
+
+from agents.normalization_agent import NormalizationAgent, unit_multiplier, METRICS, PERIODS
+from utils.cache import ExtractionCache
+
+REVENUE_UNITS = ["millions", "million", "€m", "EURm", "$bn", "bn", "billions", "USD", "£'000", "thousands", None]
+EMISSION_UNITS = ["tCO2e", "tonnes CO2e", "ktCO2e", "KtCO2e", "MtCO2e", "thousand tCO2e", "metric tons", None]
+
+def synthetic_extractions(n_docs: int, seed: int = 0):
+    rnd = random.Random(seed)
+    for i in range(n_docs):
+        data = {"reporting_year": 2023, "currency": "EUR", "scope_3_reporting_categories_y0": None}
+        for metric, is_financial in METRICS:
+            unit = rnd.choice(REVENUE_UNITS if is_financial else EMISSION_UNITS)
+            data[metric] = {
+                period: None if rnd.random() < 0.1 else {"value": round(rnd.uniform(1, 100_000), 2), "unit": unit}
+                for period in PERIODS
+            }
+        yield f"doc-{i:05d}.pdf", data
+
+def cached_extractions(cache_dir: str):
+    for key, entry in ExtractionCache(cache_dir).iter_entries():
+        yield f"{entry.get('meta', {}).get('pdf', '')}:{key[:12]}", entry["result"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10_000)
+    parser.add_argument("--cache-dir", type=str, default=None, help="Renormalize cached extraction results instead")
+    args = parser.parse_args()
+
+    if args.cache_dir:
+        extractions = list(cached_extractions(args.cache_dir))
+    else:
+        extractions = list(synthetic_extractions(args.docs))
+    print(f"Normalizing {len(extractions)} extraction results")
+
+    units = [str(val_obj.get("unit") or "")
+             for _, data in extractions for metric, _ in METRICS for period in PERIODS
+             for val_obj in [((data or {}).get(metric) or {}).get(period)] if isinstance(val_obj, dict)]
+
+    copies = copy.deepcopy(extractions)
+    unit_multiplier.cache_clear()
+    started = time.perf_counter()
+    for _, data in copies:
+        NormalizationAgent(data).run()
+    per_doc_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cached = [unit_multiplier(u) for u in units]
+    cached_s = time.perf_counter() - started
+    started = time.perf_counter()
+    uncached = [unit_multiplier.__wrapped__(u) for u in units]
+    uncached_s = time.perf_counter() - started
+
+    print(f"  per-document NormalizationAgent {per_doc_s:8.3f}s  ({len(units)} values, {len(set(units))} distinct units)")
+    print(f"  unit lookup, memoized           {cached_s:8.3f}s")
+    print(f"  unit lookup, from scratch       {uncached_s:8.3f}s")
+
+    if cached != uncached:
+        raise SystemExit("Memoized unit lookup disagrees with resolving every unit")
+    print("  results match")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+End-to-end benchmark of extract_pipeline against the local mock LLM.
+
+    python -m benchmarks.bench_pipeline --pages 10 100 1000 --docs 3 --latency-ms 300
+    python -m benchmarks.bench_pipeline --report bench.json
+    python -m benchmarks.bench_pipeline --baseline bench.json   # exits 1 on regressions
+
+Synthetic reports with GHG and revenue tables among noise pages are generated per
+size, and every mode (--modes) runs all of them through the full pipeline in a fresh
+subprocess. Reported per size and mode: throughput, document latency and per-stage
+wall time percentiles, LLM requests, prompt tokens and summed LLM latency, pages sent
+in adaptive mode, peak RSS, and field accuracy of the output CSV against the ground
+truth rendered in the output_expected.csv layout. The mock LLM answers from that ground
+truth, for each field whose true value is in the prompt, so in the LLM modes accuracy
+measures whether the right pages and blocks reached the prompt; it says nothing about
+how well a real model reads them. Only table-first accuracy tests a reader (the
+rule-based one). `--years 2` publishes only two years, as many real filings do, so
+the Y0-2 fields have no answer anywhere in the report.
+"""
+import os
+import sys
+import json
+import shlex
+import argparse
+import tempfile
+import subprocess
+from typing import List, Dict, Any
+
+from benchmarks.synthetic_pdf import make_synthetic_report
+from benchmarks.mock_llm_server import MockLLMServer
+
+MODES = {
+    "monolithic": [],
+    "targeted": ["--extraction-mode", "targeted"],
+    # Whole top-20 pages, no packing: the fixed selection adaptive mode is measured against
+    "fixed-20": ["--token-budget", "0", "--max-pages", "20"],
+    "adaptive": ["--extraction-mode", "adaptive"],
+    "table-first": ["--table-first"],
+    "batch-api": ["--llm-backend", "batch", "--batch-window", "0.1", "--batch-poll-interval", "0.1"],
+}
+# Columns that are not extracted values
+IGNORED_COLUMNS = {"Company name", "Financial year end"}
+
+def truth_row(company_name: str, truth: Dict[str, Any]) -> Dict[str, Any]:
+    """Ground truth rendered through the same CSV formatting as the pipeline."""
+    from extract import build_csv_row
+
+    normalized = {
+        "reporting_year": truth["reporting_year"],
+        "currency": truth["currency"],
+        "scope_3_reporting_categories_y0": truth["scope_3_reporting_categories_y0"],
+    }
+    for metric in ["revenue", "co2_scope_1", "co2_scope_2", "co2_scope_3"]:
+        scale = 1_000_000 if metric == "revenue" else 1
+        normalized[metric] = {period: {"normalized_value": value * scale}
+                              for period, value in zip(["y0", "y0_1", "y0_2"], truth[metric])}
+    return {k: str(v) for k, v in build_csv_row(company_name, normalized).items()}
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1) + 0.5))], 4) if ordered else 0.0
+
+def _measure(config_path: str) -> Dict[str, Any]:
+    import time
+    import logging
+    import resource
+    import pandas as pd
+
+    with open(config_path) as f:
+        config = json.load(f)
+    os.environ["OPENAI_BASE_URL"] = config["base_url"]
+    os.environ["OPENAI_API_KEY"] = "mock"
+
+    from extract import (extract_pipeline, add_pipeline_arguments, layout_options_from_args, extraction_options_from_args,
+                         llm_options_from_args)
+    from utils.profiling import summarize_stages
+    logging.disable(logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    add_pipeline_arguments(parser)
+    args = parser.parse_args(config["pipeline_args"] + ["--no-cache"])
+    layout_options = layout_options_from_args(args)
+    extraction_options = extraction_options_from_args(args, None)
+    llm_options = llm_options_from_args(args)
+
+    out_dir = config["out_dir"]
+    output_csv = os.path.join(out_dir, "output.csv")
+    documents, failed = [], 0
+    started = time.perf_counter()
+    for pdf_path in config["pdfs"]:
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        try:
+            documents.append(extract_pipeline(pdf_path, output_csv, os.path.join(out_dir, f"{stem}.json"),
+                                              layout_options=layout_options, extraction_options=extraction_options,
+                                              llm_options=llm_options))
+        except SystemExit:
+            failed += 1
+    elapsed = time.perf_counter() - started
+
+    correct = total = docs_exact = 0
+    rows = {}
+    if os.path.exists(output_csv):
+        rows = {r["Company name"]: r for r in pd.read_csv(output_csv, dtype=str).fillna("").to_dict("records")}
+    for pdf_path, truth in zip(config["pdfs"], config["truths"]):
+        company = os.path.basename(pdf_path)
+        expected = truth_row(company, truth)
+        got = rows.get(company, {})
+        matches = [got.get(col, "") == value for col, value in expected.items() if col not in IGNORED_COLUMNS]
+        correct += sum(matches)
+        total += len(matches)
+        docs_exact += all(matches)
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    rss = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)) * scale
+    latencies = [d["wall_s"] for d in documents]
+    stages = summarize_stages(documents)
+    return {
+        "documents": len(config["pdfs"]),
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_s": round(len(config["pdfs"]) / elapsed, 4),
+        "pages_per_s": round(config["pages"] * len(config["pdfs"]) / elapsed, 1),
+        "doc_latency_p50_s": _percentile(latencies, 0.5),
+        "doc_latency_p95_s": _percentile(latencies, 0.95),
+        "stages": stages,
+        "llm_calls": stages.get("extraction", {}).get("llm_calls", 0),
+        "prompt_tokens": stages.get("extraction", {}).get("prompt_tokens", 0),
+        "llm_latency_s": stages.get("extraction", {}).get("llm_latency_s", 0.0),
+        "pages_sent": sum(d["stages"].get("extraction", {}).get("pages_sent", 0) for d in documents),
+        "peak_rss_mb": round(rss / 2**20, 1),
+        "field_accuracy": round(correct / total, 4) if total else 0.0,
+        "documents_exact": docs_exact,
+    }
+
+def find_regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    previous = {(r["pages"], r["mode"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        base = previous.get((r["pages"], r["mode"]))
+        if not base:
+            continue
+        name = f"{r['mode']} @ {r['pages']} pages"
+        if r["docs_per_s"] < base["docs_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {r['docs_per_s']} < baseline {base['docs_per_s']} docs/s")
+        if r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {r['peak_rss_mb']} > baseline {base['peak_rss_mb']} MiB")
+        if r["field_accuracy"] < base["field_accuracy"]:
+            regressions.append(f"{name}: accuracy {r['field_accuracy']} < baseline {base['field_accuracy']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--docs", type=int, default=3, help="Synthetic reports per size")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=["monolithic", "targeted"])
+    parser.add_argument("--pipeline-args", type=str, default="", help="Extra extract.py flags for every run, e.g. '--token-budget 0'")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Mock LLM latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=0.0,
+                        help="Mock LLM latency per 1,000 prompt tokens, so smaller prompts answer faster")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of first LLM attempts answered with 429")
+    parser.add_argument("--years", type=int, default=3, choices=[1, 2, 3],
+                        help="Years published in the synthetic tables; fewer than 3 leaves the Y0-2 fields unanswerable")
+    parser.add_argument("--report", type=str, default=None, help="Write results as JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare against an earlier --report and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative throughput / memory regression")
+    parser.add_argument("--measure", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(_measure(args.measure)))
+        return
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    print(f"{'pages':>6} {'mode':>12} {'docs/s':>8} {'p50_s':>7} {'p95_s':>7} {'llm':>5} {'tokens':>8} {'llm_s':>7} "
+          f"{'sent':>5} {'rss_mb':>7} {'accuracy':>9}")
+    with tempfile.TemporaryDirectory() as tmp, MockLLMServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                                               error_rate=args.error_rate,
+                                                               ms_per_1k_tokens=args.ms_per_1k_tokens) as server:
+        for n_pages in args.pages:
+            pdfs, truths = [], []
+            for i in range(args.docs):
+                pdf_path = os.path.join(tmp, f"report_{n_pages}_{i}.pdf")
+                truths.append(make_synthetic_report(pdf_path, n_pages, seed=i + 1, years=args.years))
+                server.truths.append(truths[-1])
+                pdfs.append(pdf_path)
+
+            for mode in args.modes:
+                out_dir = os.path.join(tmp, f"out_{n_pages}_{mode}")
+                os.makedirs(out_dir)
+                config_path = os.path.join(out_dir, "config.json")
+                with open(config_path, "w") as f:
+                    json.dump({"pdfs": pdfs, "truths": truths, "pages": n_pages, "out_dir": out_dir,
+                               "base_url": server.base_url,
+                               "pipeline_args": MODES[mode] + shlex.split(args.pipeline_args)}, f)
+                out = subprocess.run([sys.executable, "-m", "benchmarks.bench_pipeline", "--measure", config_path],
+                                     cwd=repo_root, capture_output=True, text=True)
+                if out.returncode != 0:
+                    raise SystemExit(f"{mode} @ {n_pages} pages failed:\n{out.stderr[-2000:]}")
+                result = dict(json.loads(out.stdout.strip().splitlines()[-1]), pages=n_pages, mode=mode)
+                results.append(result)
+                print(f"{n_pages:>6} {mode:>12} {result['docs_per_s']:>8} {result['doc_latency_p50_s']:>7} "
+                      f"{result['doc_latency_p95_s']:>7} {result['llm_calls']:>5} {result['prompt_tokens']:>8} "
+                      f"{round(result['llm_latency_s'], 2):>7} {result['pages_sent'] or '-':>5} {result['peak_rss_mb']:>7} "
+                      f"{result['field_accuracy']:>9}")
+        print(f"Mock LLM served {server.requests} requests ({server.rate_limited} rate limited)")
+        print("LLM mode accuracy: the mock answers true values found in the prompt, so it measures page and block "
+              "selection, not reading")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Throughput of the resident extraction service vs one `python extract.py` per document.
+
+    python -m benchmarks.bench_service --docs 12 --pages 20 --workers 1 2 4 --latency-ms 500
+
+Modes:
+    cli        a fresh extract.py process per document, run one after another
+    service-N  serve.py with N warm workers; all documents are submitted over HTTP
+               and polled until done
+
+Every mode extracts the same synthetic reports against the local mock LLM with caches
+disabled. For the service, `startup_s` (until /health reports every worker warm)
+is paid once and reported separately from the queue's `docs/s`; for the CLI, every
+document pays interpreter startup, imports and client setup, so it is part of docs/s.
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from typing import List, Dict, Any
+
+from benchmarks.synthetic_pdf import make_synthetic_report
+from benchmarks.mock_llm_server import MockLLMServer
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _call(base: str, path: str, body: Dict[str, Any] = None) -> Dict[str, Any]:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    with urllib.request.urlopen(urllib.request.Request(base + path, data=data, method="POST" if data else "GET")) as r:
+        return json.loads(r.read())
+
+def run_cli(pdfs: List[str], out_dir: str, env: Dict[str, str], pipeline_args: List[str], repo_root: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    failed = 0
+    for pdf_path in pdfs:
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        out = subprocess.run([sys.executable, "extract.py", pdf_path, os.path.join(out_dir, "output.csv"),
+                              os.path.join(out_dir, f"{stem}.json")] + pipeline_args,
+                             cwd=repo_root, env=env, capture_output=True, text=True)
+        failed += out.returncode != 0
+    elapsed = time.perf_counter() - started
+    return {"startup_s": 0.0, "elapsed_s": round(elapsed, 3), "docs_per_s": round(len(pdfs) / elapsed, 4), "failed": failed}
+
+def run_service(pdfs: List[str], out_dir: str, env: Dict[str, str], pipeline_args: List[str], repo_root: str,
+                workers: int) -> Dict[str, Any]:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "serve.py", os.path.join(out_dir, "jobs.db"), out_dir, "--port", str(port),
+                             "--workers", str(workers), "--poll-interval", "0.05"] + pipeline_args,
+                            cwd=repo_root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise SystemExit(f"serve.py exited with code {proc.returncode}")
+            try:
+                if _call(base, "/health")["ready_workers"] == workers:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.05)
+        startup = time.perf_counter() - started
+
+        started = time.perf_counter()
+        ids = [_call(base, "/jobs", {"pdf_path": pdf_path})["id"] for pdf_path in pdfs]
+        while True:
+            counts = _call(base, "/health")["jobs"]
+            if counts["queued"] + counts["running"] == 0:
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        jobs = [_call(base, f"/jobs/{job_id}") for job_id in ids]
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {
+        "startup_s": round(startup, 3),
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_s": round(len(pdfs) / elapsed, 4),
+        "failed": sum(job["status"] != "done" for job in jobs),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=12)
+    parser.add_argument("--pages", type=int, default=20, help="Pages per synthetic report")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Service worker counts to measure")
+    parser.add_argument("--no-cli", action="store_true", help="Skip the per-document extract.py baseline")
+    parser.add_argument("--pipeline-args", type=str, default="", help="Extra pipeline flags for every run, e.g. '--table-first'")
+    parser.add_argument("--latency-ms", type=float, default=500, help="Mock LLM latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pipeline_args = ["--no-cache"] + shlex.split(args.pipeline_args)
+    print(f"{'mode':>10} {'startup_s':>10} {'elapsed_s':>10} {'docs/s':>8} {'speedup':>8} {'failed':>7}")
+    with tempfile.TemporaryDirectory() as tmp, MockLLMServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms) as server:
+        pdfs = []
+        for i in range(args.docs):
+            pdf_path = os.path.join(tmp, f"report_{i}.pdf")
+            make_synthetic_report(pdf_path, args.pages, seed=i + 1)
+            pdfs.append(pdf_path)
+        env = dict(os.environ, OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="mock")
+
+        runs = [] if args.no_cli else [("cli", None)]
+        runs += [(f"service-{n}", n) for n in args.workers]
+        reference = None
+        for mode, workers in runs:
+            out_dir = os.path.join(tmp, mode)
+            os.makedirs(out_dir)
+            if workers is None:
+                result = run_cli(pdfs, out_dir, env, pipeline_args, repo_root)
+            else:
+                # The mock has no account-wide limits to share between workers
+                result = run_service(pdfs, out_dir, env, pipeline_args + ["--rpm", "0", "--tpm", "0"], repo_root, workers)
+            reference = reference or result["docs_per_s"]
+            print(f"{mode:>10} {result['startup_s']:>10} {result['elapsed_s']:>10} {result['docs_per_s']:>8} "
+                  f"{result['docs_per_s'] / reference:>8.2f} {result['failed']:>7}")
+
+if __name__ == "__main__":
+    main()
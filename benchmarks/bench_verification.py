@@ -0,0 +1,139 @@
+"""
+Calibration of the VerificationAgent confidence and the cost of field-level re-queries.
+
+    python -m benchmarks.bench_verification --docs 20 --pages 40 --errors 2 --latency-ms 300
+
+For every synthetic report, the rule-based table reader (the same reader the mock LLM
+answers with) gives a correct extraction. `--errors` of its values are then corrupted
+the way LLM answers go wrong: the neighbouring year's value, another scope's value, a
+x1000 slip or an invented number. Reported:
+
+    calibration  share of correct values per confidence bucket
+    flags        precision / recall of the low-confidence flag for the corrupted values
+    repair       against the mock LLM, ExtractionAgent.requery on the corrupted result
+                 vs re-running the whole document: calls, prompt tokens, LLM latency
+                 and values still wrong afterwards
+"""
+import os
+import copy
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from typing import List, Dict, Any, Tuple
+
+from agents.layout_agent import LayoutAgent
+from agents.table_agent import TableExtractionAgent
+from agents.extraction_agent import ExtractionAgent
+from agents.normalization_agent import NormalizationAgent
+from agents.verification_agent import VerificationAgent, METRICS, EMISSIONS, PERIODS
+from benchmarks.synthetic_pdf import make_synthetic_report
+from benchmarks.mock_llm_server import MockLLMServer
+from utils.llm_client import make_llm_client
+
+BUCKETS = [0.0, 0.3, 0.5, 0.7, 0.9, 1.01]
+CORRUPTIONS = ["year_shift", "other_scope", "scale", "invented"]
+
+def corrupt(rnd: random.Random, data: Dict[str, Any], metric: str, period: str, kind: str) -> float:
+    value = data[metric][period]["value"]
+    if kind == "year_shift":
+        others = [p for p in PERIODS if p != period and (data[metric].get(p) or {}).get("value") is not None]
+        return data[metric][rnd.choice(others)]["value"] if others else value * 1000
+    if kind == "other_scope" and metric in EMISSIONS:
+        others = [m for m in EMISSIONS if m != metric and (data[m].get(period) or {}).get("value") is not None]
+        return data[rnd.choice(others)][period]["value"] if others else value * 1000
+    if kind == "invented":
+        return round(value * rnd.uniform(0.6, 0.9), 1)
+    return value * 1000
+
+def field_values(data: Dict[str, Any]) -> Dict[str, float]:
+    return {f"{m}_{p}": (data.get(m) or {}).get(p, {}).get("value") if (data.get(m) or {}).get(p) else None
+            for m in METRICS for p in PERIODS}
+
+def prepare(pdf_path: str, max_pages: int, errors: int, seed: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, Any], set]:
+    """Candidate pages, correct extraction, corrupted extraction and the corrupted field keys."""
+    pages = LayoutAgent(pdf_path, max_pages=max_pages).run()
+    clean = TableExtractionAgent(pages, pdf_path, use_pdfplumber=False).run()
+    rnd = random.Random(seed)
+    present = [(m, p) for m in METRICS for p in PERIODS if (clean.get(m) or {}).get(p)]
+    corrupted = copy.deepcopy(clean)
+    wrong = set()
+    for metric, period in rnd.sample(present, min(errors, len(present))):
+        value = corrupt(rnd, clean, metric, period, rnd.choice(CORRUPTIONS))
+        if value != clean[metric][period]["value"]:
+            corrupted[metric][period]["value"] = value
+            wrong.add(f"{metric}_{period}")
+    return pages, clean, corrupted, wrong
+
+def still_wrong(result: Dict[str, Any], clean: Dict[str, Any]) -> int:
+    truth = field_values(clean)
+    return sum(value != truth[key] for key, value in field_values(result).items())
+
+async def repair(pages: List[Dict[str, Any]], pdf_path: str, corrupted: Dict[str, Any], client,
+                 token_budget: int, threshold: float) -> Tuple[Dict[str, Any], Dict[str, Any], ExtractionAgent, ExtractionAgent]:
+    requery_agent = ExtractionAgent(pages, pdf_path, token_budget=token_budget, requery_below=threshold)
+    requeried = await requery_agent.requery(client, copy.deepcopy(corrupted))
+    rerun_agent = ExtractionAgent(pages, pdf_path, token_budget=token_budget)
+    rerun = await rerun_agent.run_async(client)
+    return requeried, rerun, requery_agent, rerun_agent
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=40, help="Pages per synthetic report")
+    parser.add_argument("--max-pages", type=int, default=40, help="Candidate pages kept by the Layout Agent")
+    parser.add_argument("--errors", type=int, default=2, help="Corrupted values per document")
+    parser.add_argument("--threshold", type=float, default=VerificationAgent.LOW_CONFIDENCE)
+    parser.add_argument("--token-budget", type=int, default=16000)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Mock LLM latency per call")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    scored: List[Tuple[float, bool]] = []
+    totals = {"requery": {"calls": 0, "prompt_tokens": 0, "latency_s": 0.0, "wrong": 0},
+              "rerun": {"calls": 0, "prompt_tokens": 0, "latency_s": 0.0, "wrong": 0}}
+    wrong_before = 0
+    with tempfile.TemporaryDirectory() as tmp, MockLLMServer(latency_ms=args.latency_ms, jitter_ms=0) as server:
+        client = make_llm_client("local", base_url=server.base_url)
+        loop = asyncio.new_event_loop()
+        for i in range(args.docs):
+            pdf_path = os.path.join(tmp, f"report_{i}.pdf")
+            make_synthetic_report(pdf_path, args.pages, seed=i + 1)
+            pages, clean, corrupted, wrong = prepare(pdf_path, args.max_pages, args.errors, seed=i)
+            assessments = VerificationAgent(NormalizationAgent(copy.deepcopy(corrupted)).run(), pages).assess()
+            scored += [(a["confidence"], key not in wrong) for key, a in assessments.items()]
+            wrong_before += len(wrong)
+            if i == 0:
+                # Client setup and the first connection are paid once, outside the measurement
+                loop.run_until_complete(ExtractionAgent(pages, pdf_path, token_budget=args.token_budget).run_async(client))
+
+            requeried, rerun, requery_agent, rerun_agent = loop.run_until_complete(
+                repair(pages, pdf_path, corrupted, client, args.token_budget, args.threshold))
+            for name, result, agent in [("requery", requeried, requery_agent), ("rerun", rerun, rerun_agent)]:
+                totals[name]["calls"] += len(agent.metrics)
+                totals[name]["prompt_tokens"] += sum(m["prompt_tokens"] or 0 for m in agent.metrics)
+                totals[name]["latency_s"] += sum(m["latency_s"] or 0 for m in agent.metrics)
+                totals[name]["wrong"] += still_wrong(result, clean)
+        loop.close()
+
+    print(f"{'confidence':>12} {'values':>7} {'correct':>8}")
+    for low, high in zip(BUCKETS, BUCKETS[1:]):
+        bucket = [correct for confidence, correct in scored if low <= confidence < high]
+        share = f"{sum(bucket) / len(bucket):.2f}" if bucket else "-"
+        print(f"{low:>5.1f}-{min(high, 1.0):<5.1f}  {len(bucket):>7} {share:>8}")
+
+    flagged = [correct for confidence, correct in scored if confidence < args.threshold]
+    true_flags = sum(not correct for correct in flagged)
+    precision = true_flags / len(flagged) if flagged else 0.0
+    recall = true_flags / wrong_before if wrong_before else 0.0
+    print(f"\nflags below {args.threshold}: {len(flagged)} of {len(scored)} values, "
+          f"precision {precision:.2f}, recall {recall:.2f} ({wrong_before} corrupted)")
+
+    print(f"\n{'repair':>8} {'calls':>6} {'prompt_tokens':>14} {'llm_s':>7} {'wrong':>6}")
+    print(f"{'none':>8} {0:>6} {0:>14} {0.0:>7} {wrong_before:>6}")
+    for name, total in totals.items():
+        print(f"{name:>8} {total['calls']:>6} {total['prompt_tokens']:>14} {total['latency_s']:>7.2f} {total['wrong']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Deterministic local mock of the OpenAI chat completions endpoint for structured outputs,
+plus the Files and Batches endpoints used by the batch LLM backend.
+
+    python -m benchmarks.mock_llm_server --port 8011 --latency-ms 300 --jitter-ms 100
+
+Point the pipeline at it with OPENAI_BASE_URL=http://127.0.0.1:8011/v1 and any
+OPENAI_API_KEY. The "model" only sees the CONTEXT section of the prompt. With the
+ground truth of the documents registered (`truths`, as bench_pipeline does), it is an
+oracle reader: it answers a field with its true value exactly when that value appears
+in the prompt, so field accuracy measures whether the right pages and blocks reached
+the prompt, not how well anything reads them. Without truths it falls back to the
+rule-based table row matcher, which is the same reader as --table-first. Latency (and optional 429s, which carry a
+retry-after-ms header) are derived from a hash of the request body, so reruns of the
+same prompts behave identically.
+With --ms-per-1k-tokens, every 1,000 prompt tokens add to the latency, as prefill
+time does on a real endpoint.
+Batch jobs answer every line of the uploaded JSONL the same way and complete after
+one latency period.
+"""
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional
+
+from agents.table_agent import TableExtractionAgent
+
+PAGE_HEADER_PATTERN = re.compile(r"^--- PAGE (\d+) ---$", re.MULTILINE)
+NUMBER_PATTERN = re.compile(r"\d[\d,]*(?:\.\d+)?")
+VALUE_FIELDS = ["value", "raw_text", "unit", "page", "source_type", "reasoning_summary"]
+METRICS = ["revenue", "co2_scope_1", "co2_scope_2", "co2_scope_3"]
+PERIODS = ["y0", "y0_1", "y0_2"]
+
+def context_pages(prompt: str) -> List[Dict[str, Any]]:
+    """Splits the prompt context back into page records."""
+    context = prompt.split("CONTEXT:", 1)[-1]
+    headers = list(PAGE_HEADER_PATTERN.finditer(context))
+    pages = []
+    for i, m in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(context)
+        pages.append({"page": int(m.group(1)), "text": context[m.end():end].strip()})
+    return pages
+
+def page_numbers(text: str) -> Dict[float, str]:
+    """Numbers on a page mapped to the token they were written as."""
+    numbers = {}
+    for token in NUMBER_PATTERN.findall(text):
+        numbers.setdefault(float(token.replace(",", "")), token)
+    return numbers
+
+def truth_answer(pages: List[Dict[str, Any]], properties: List[str], truths: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Oracle answer: the true value of every requested field whose value appears in the
+    prompt context (a metric value as a number on some page, the reporting year and
+    currency anywhere, the Scope 3 category count next to "categor"), null otherwise.
+    """
+    numbers = {page["page"]: page_numbers(page["text"]) for page in pages}
+    context = "\n".join(page["text"] for page in pages).lower()
+
+    def find(value: float):
+        return next(((page, found[float(value)]) for page, found in numbers.items() if float(value) in found), None)
+
+    # The registered document most of whose values the prompt shows
+    truth = max(truths, key=lambda t: sum(find(v) is not None for m in METRICS for v in t[m]))
+    answer = {}
+    for field in properties:
+        if field in METRICS:
+            metric = {}
+            for period, value in zip(PERIODS, truth[field] + [None] * len(PERIODS)):
+                hit = find(value) if value is not None else None
+                metric[period] = {
+                    "value": value, "raw_text": hit[1], "unit": "millions" if field == "revenue" else "tCO2e",
+                    "page": hit[0], "source_type": "table", "reasoning_summary": "Mock: true value found in the prompt",
+                } if hit else None
+            answer[field] = metric
+        elif field == "reporting_year":
+            answer[field] = truth[field] if str(truth[field]) in context else None
+        elif field == "currency":
+            answer[field] = truth[field] if re.search(rf"\b{truth[field].lower()}\b", context) else None
+        elif field == "scope_3_reporting_categories_y0":
+            count = truth[field]
+            answer[field] = count if re.search(rf"\b{count}\b[^.\n]*categor", context) else None
+        else:
+            answer[field] = None
+    return answer
+
+def mock_answer(prompt: str, properties: List[str], truths: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    if truths:
+        return truth_answer(context_pages(prompt), properties, truths)
+    data = TableExtractionAgent(context_pages(prompt), pdf_path=None, use_pdfplumber=False).run() or {}
+    answer = {}
+    for field in properties:
+        value = data.get(field)
+        if isinstance(value, dict):
+            # Metric: keep only the ExtractedValue fields of the schema
+            value = {period: ({k: v.get(k) for k in VALUE_FIELDS} if v else None) for period, v in value.items()}
+        answer[field] = value
+    return answer
+
+def request_prompt(request: Dict[str, Any]) -> str:
+    return "\n".join(m.get("content") or "" for m in request.get("messages", []))
+
+def chat_completion(request: Dict[str, Any], digest: int, truths: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Chat completion response answering the prompt from its CONTEXT section."""
+    prompt = request_prompt(request)
+    schema = request.get("response_format", {}).get("json_schema", {}).get("schema", {})
+    content = json.dumps(mock_answer(prompt, list(schema.get("properties", {})), truths))
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": f"chatcmpl-mock-{digest:08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "logprobs": None,
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+def multipart_fields(body: bytes, content_type: str) -> Dict[str, bytes]:
+    """Minimal multipart/form-data parser for the file upload endpoint."""
+    boundary = content_type.split("boundary=", 1)[-1].strip('"').encode()
+    fields = {}
+    for part in body.split(b"--" + boundary):
+        headers, _, value = part.partition(b"\r\n\r\n")
+        name = re.search(rb'name="([^"]*)"', headers)
+        if name:
+            fields[name.group(1).decode()] = value[:-2] if value.endswith(b"\r\n") else value
+    return fields
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    server_version = "MockLLM/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _not_found(self):
+        self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_GET(self):
+        mock = self.server.mock
+        parts = self.path.rstrip("/").split("/")
+        if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in mock.batches:
+            self._send(200, mock.batches[parts[-1]])
+        elif len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content" and parts[-2] in mock.files:
+            payload = mock.files[parts[-2]]["content"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        else:
+            self._not_found()
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.rstrip("/")
+        if path.endswith("/files"):
+            fields = multipart_fields(raw, self.headers.get("Content-Type", ""))
+            self._send(200, self.server.mock.add_file(fields.get("file", b""), fields.get("purpose", b"").decode()))
+            return
+        if path.endswith("/batches"):
+            batch = self.server.mock.create_batch(json.loads(raw))
+            self._send(200 if batch else 404, batch or {"error": {"message": "Unknown input_file_id"}})
+            return
+        if not path.endswith("/chat/completions"):
+            self._not_found()
+            return
+        request = json.loads(raw)
+        digest = int(hashlib.sha256(raw).hexdigest()[:8], 16)
+        mock = self.server.mock
+
+        with mock.lock:
+            mock.requests += 1
+            attempt = mock.attempts.get(digest, 0)
+            mock.attempts[digest] = attempt + 1
+        # Only first attempts are rejected, so retries always succeed
+        if attempt == 0 and mock.error_rate and (digest % 1000) / 1000 < mock.error_rate:
+            with mock.lock:
+                mock.rate_limited += 1
+            self._send(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}},
+                       {"retry-after-ms": str(mock.retry_after_ms)})
+            return
+
+        latency = mock.latency_s + mock.jitter_s * ((digest % 2001) / 1000 - 1)
+        latency += mock.s_per_1k_tokens * len(request_prompt(request)) / 4 / 1000
+        time.sleep(max(0.0, latency))
+        self._send(200, chat_completion(request, digest, mock.truths))
+
+class MockLLMServer:
+    """Threaded mock server; use as a context manager or call start()/stop()."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 200, jitter_ms: float = 0,
+                 error_rate: float = 0.0, ms_per_1k_tokens: float = 0.0, retry_after_ms: int = 50,
+                 truths: Optional[List[Dict[str, Any]]] = None):
+        self.latency_s = latency_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.s_per_1k_tokens = ms_per_1k_tokens / 1000
+        self.error_rate = error_rate
+        self.retry_after_ms = retry_after_ms
+        # Ground truth of the documents being extracted (see synthetic_pdf.report_values)
+        self.truths: List[Dict[str, Any]] = list(truths or [])
+        self.requests = 0
+        self.rate_limited = 0
+        self.attempts: Dict[int, int] = {}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), MockLLMHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.thread: Optional[threading.Thread] = None
+
+    def add_file(self, content: bytes, purpose: str) -> Dict[str, Any]:
+        with self.lock:
+            file_id = f"file-mock-{len(self.files)}"
+            meta = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                    "filename": f"{file_id}.jsonl", "purpose": purpose, "status": "processed"}
+            self.files[file_id] = dict(meta, content=content)
+        return meta
+
+    def create_batch(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        input_file = self.files.get(request.get("input_file_id"))
+        if input_file is None:
+            return None
+        lines = [json.loads(line) for line in input_file["content"].decode("utf-8").splitlines() if line.strip()]
+        with self.lock:
+            batch_id = f"batch-mock-{len(self.batches)}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request.get("endpoint"), "errors": None,
+                "input_file_id": input_file["id"], "completion_window": request.get("completion_window", "24h"),
+                "status": "in_progress", "output_file_id": None, "error_file_id": None,
+                "created_at": int(time.time()),
+                "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+            }
+        threading.Thread(target=self._run_batch, args=(batch_id, lines), daemon=True).start()
+        return self.batches[batch_id]
+
+    def _run_batch(self, batch_id: str, lines: List[Dict[str, Any]]):
+        time.sleep(self.latency_s)
+        output = []
+        for line in lines:
+            digest = int(hashlib.sha256(json.dumps(line["body"], sort_keys=True).encode()).hexdigest()[:8], 16)
+            output.append(json.dumps({
+                "id": f"batch-req-{digest:08x}", "custom_id": line["custom_id"], "error": None,
+                "response": {"status_code": 200, "request_id": f"req-{digest:08x}", "body": chat_completion(line["body"], digest, self.truths)},
+            }))
+        with self.lock:
+            self.requests += len(lines)
+        output_file = self.add_file("\n".join(output).encode("utf-8"), "batch_output")
+        self.batches[batch_id].update({"status": "completed", "output_file_id": output_file["id"],
+                                       "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0}})
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of first attempts answered with 429")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=0.0, help="Extra latency per 1,000 prompt tokens")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.ms_per_1k_tokens)
+    print(f"Mock LLM listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
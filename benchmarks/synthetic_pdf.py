@@ -0,0 +1,105 @@
+import random
+from typing import List, Dict, Any
+import fitz  # PyMuPDF
+
+NOISE_WORDS = [
+    "strategy", "people", "community", "governance", "board", "customers", "growth",
+    "innovation", "culture", "employees", "report", "annual", "performance", "review",
+    "market", "product", "value", "colleagues", "purpose", "responsible", "future",
+]
+
+# Narrative sentences that mention ESG keywords without carrying any metric values
+DECOY_PHRASES = [
+    "Our carbon strategy supports long-term revenue growth.",
+    "We continue to reduce emissions across our operations.",
+    "Turnover of colleagues remained stable during the year.",
+    "Investments of several millions were made in the community.",
+    "Our financials reflect a resilient business model.",
+]
+
+def _noise_paragraph(rnd: random.Random, words: int, decoy_rate: float = 0.0) -> str:
+    text = " ".join(rnd.choice(NOISE_WORDS) for _ in range(words)).capitalize() + "."
+    if rnd.random() < decoy_rate:
+        text += " " + rnd.choice(DECOY_PHRASES)
+    return text
+
+def ghg_table_page(n_pages: int) -> int:
+    """1-indexed page carrying the GHG table."""
+    return n_pages // 2 + 1
+
+def revenue_table_page(n_pages: int) -> int:
+    """1-indexed page carrying the revenue table."""
+    return n_pages // 3 + 1
+
+REPORTING_YEAR = 2023
+
+def report_values(seed: int = 0) -> Dict[str, Any]:
+    """
+    Ground truth of a synthetic report: reporting year, currency, Scope 3 category count
+    and [Y0, Y0-1, Y0-2] values per metric (revenue in millions, emissions in tCO2e).
+    Seed 0 gives the fixed values used by the layout benchmarks.
+    """
+    if seed == 0:
+        metrics = {
+            "revenue": [1234.5, 1180.2, 1101.9],
+            "co2_scope_1": [12345, 11980, 11502],
+            "co2_scope_2": [5432, 5610, 5870],
+            "co2_scope_3": [98765, 97120, 95400],
+        }
+        return {"reporting_year": REPORTING_YEAR, "currency": "EUR", "scope_3_reporting_categories_y0": 7, **metrics}
+    rnd = random.Random(f"values-{seed}")
+    def series(low: float, high: float, decimals: int) -> List[float]:
+        return [round(rnd.uniform(low, high), decimals) for _ in range(3)]
+    return {
+        "reporting_year": REPORTING_YEAR,
+        "currency": rnd.choice(["EUR", "USD", "GBP"]),
+        "scope_3_reporting_categories_y0": rnd.randint(1, 15),
+        "revenue": series(100, 90_000, 1),
+        "co2_scope_1": series(1_000, 900_000, 0),
+        "co2_scope_2": series(500, 400_000, 0),
+        "co2_scope_3": series(10_000, 9_000_000, 0),
+    }
+
+def _fmt(value: float, decimals: int) -> str:
+    return f"{value:,.{decimals}f}"
+
+def make_synthetic_report(path: str, n_pages: int, seed: int = 0, decoy_rate: float = 0.05,
+                          years: int = 3) -> Dict[str, Any]:
+    """
+    Writes a synthetic annual report with mostly narrative noise pages, some of which
+    mention ESG keywords (decoys). A GHG table and a revenue table are placed on fixed
+    pages so layout scoring can be checked. The tables publish the most recent `years`
+    years (at most 3). Returns the report's ground truth values.
+    """
+    rnd = random.Random(seed)
+    truth = report_values(seed)
+    for metric in ["revenue", "co2_scope_1", "co2_scope_2", "co2_scope_3"]:
+        truth[metric] = truth[metric][:years]
+    years = "   ".join(str(REPORTING_YEAR - i) for i in range(len(truth["revenue"])))
+    doc = fitz.open()
+    for page_idx in range(n_pages):
+        page = doc.new_page()
+        y = 72
+        page.insert_text((72, 40), f"Annual Report {page_idx + 1}")
+        if page_idx + 1 == ghg_table_page(n_pages):
+            for line in [f"Greenhouse gas emissions (tCO2e)   {years}",
+                         "Scope 1   " + "   ".join(_fmt(v, 0) for v in truth["co2_scope_1"]),
+                         "Scope 2 (market-based)   " + "   ".join(_fmt(v, 0) for v in truth["co2_scope_2"]),
+                         "Scope 3   " + "   ".join(_fmt(v, 0) for v in truth["co2_scope_3"]),
+                         f"We report {truth['scope_3_reporting_categories_y0']} of the 15 Scope 3 categories."]:
+                page.insert_text((72, y), line)
+                y += 18
+        elif page_idx + 1 == revenue_table_page(n_pages):
+            for line in [f"Consolidated income statement ({truth['currency']} millions)   {years}",
+                         "Revenue   " + "   ".join(_fmt(v, 1) for v in truth["revenue"])]:
+                page.insert_text((72, y), line)
+                y += 18
+        else:
+            for _ in range(10):
+                # Boxes are sized so that a paragraph plus a decoy sentence always fits
+                rect = fitz.Rect(72, y, 540, y + 60)
+                page.insert_textbox(rect, _noise_paragraph(rnd, 30, decoy_rate), fontsize=9)
+                y += 64
+    doc.save(path)
+    doc.close()
+    return truth
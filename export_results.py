@@ -0,0 +1,22 @@
+import logging
+import argparse
+
+from utils.result_store import ResultStore
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the SQLite result store to the output CSV layout")
+    parser.add_argument("store", type=str, help="Path to the SQLite result store (--store of extract.py / batch_extract.py)")
+    parser.add_argument("output_csv", type=str, help="Path to output CSV")
+    args = parser.parse_args()
+
+    store = ResultStore(args.store)
+    if not len(store):
+        logger.warning(f"No results in {args.store}")
+    store.export_csv(args.output_csv)
+    store.close()
@@ -1,15 +1,21 @@
 import os
 import sys
 import json
+import math
 import logging
 import argparse
-import pandas as pd
-from jsonschema import validate, ValidationError
+from typing import Optional
+from functools import lru_cache
 
 from agents.layout_agent import LayoutAgent
 from agents.extraction_agent import ExtractionAgent, ESGExtraction
 from agents.normalization_agent import NormalizationAgent
 from agents.verification_agent import VerificationAgent
+from utils.cache import ExtractionCache
+from utils.llm_client import LLM_BACKENDS
+from utils.result_store import ResultStore
+from utils.fingerprint_index import FingerprintIndex
+from utils.profiling import StageProfiler
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,12 +23,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schemas", "esg_schema.json")
+
 def load_schema(schema_path: str):
     with open(schema_path, 'r') as f:
         return json.load(f)
 
+@lru_cache(maxsize=None)
+def schema_validator(schema_path: str = SCHEMA_PATH):
+    """Draft 7 validator for the output schema, loaded, checked and compiled once per process."""
+    from jsonschema import Draft7Validator
+
+    schema = load_schema(schema_path)
+    Draft7Validator.check_schema(schema)
+    return Draft7Validator(schema)
+
+def is_nan(val) -> bool:
+    # Scalar stand-in for pd.isna, so building a row doesn't need pandas
+    return isinstance(val, float) and math.isnan(val)
+
 def clean_missing(val):
-    if val is None or val == "None" or str(val).strip().upper() == "N/A" or pd.isna(val):
+    if val is None or val == "None" or str(val).strip().upper() == "N/A" or is_nan(val):
         return "N/A"
     return val
 
@@ -36,42 +57,10 @@ def format_comma(val):
         pass
     return val
 
-def extract_pipeline(pdf_path: str, output_csv: str, verification_json: str):
-    logger.info(f"Starting Extraction Pipeline for {pdf_path}")
-    
-    company_name = os.path.basename(pdf_path)
-    if not os.path.exists(pdf_path):
-        logger.error(f"File not found: {pdf_path}")
-        sys.exit(1)
-        
-    # --- 1. Layout Agent ---
-    layout_agent = LayoutAgent(pdf_path)
-    candidate_pages = layout_agent.run()
-    
-    if not candidate_pages:
-        logger.warning("No candidate pages found. Aborting.")
-        sys.exit(0)
-
-    # --- 2. Extraction Agent ---
-    extractor = ExtractionAgent(candidate_pages, pdf_path)
-    raw_data = extractor.run()
-    
-    # --- 3. Normalization Agent ---
-    normalizer = NormalizationAgent(raw_data)
-    normalized_data = normalizer.run()
+def validate_against_schema(normalized_data: dict):
+    if os.path.exists(SCHEMA_PATH):
+        from jsonschema.exceptions import ValidationError, best_match
 
-    # --- 4. Verification Agent ---
-    verifier = VerificationAgent(normalized_data, candidate_pages)
-    audit_data = verifier.build_verification_json()
-    
-    # Output Verification JSON
-    with open(verification_json, 'w') as f:
-        json.dump(audit_data, f, indent=2)
-    logger.info(f"Saved verification log to {verification_json}")
-    
-    # Validate against Schema
-    schema_path = os.path.join(os.path.dirname(__file__), "schemas", "esg_schema.json")
-    if os.path.exists(schema_path):
         try:
             # We must map our complex structure to the simple schema requested in Step 3
             simple_data = {
@@ -88,14 +77,17 @@ def extract_pipeline(pdf_path: str, output_csv: str, verification_json: str):
                 for y in ["y0", "y0_1", "y0_2"]:
                     if y not in simple_data[k]: simple_data[k][y] = None
                     
-            schema = load_schema(schema_path)
-            validate(instance=simple_data, schema=schema)
+            # Same error as jsonschema.validate reports, without rebuilding the validator per document
+            error = best_match(schema_validator().iter_errors(simple_data))
+            if error is not None:
+                raise error
             logger.info("JSON Schema validation passed.")
         except ValidationError as e:
             logger.error(f"JSON Schema validation failed: {e}")
     else:
-        logger.warning(f"Schema not found at {schema_path}, skipping validation.")
+        logger.warning(f"Schema not found at {SCHEMA_PATH}, skipping validation.")
 
+def build_csv_row(company_name: str, normalized_data: dict) -> dict:
     # --- Format to CSV Format ---
     def get_val(metric, period):
         obj = normalized_data.get(metric, {}).get(period, {})
@@ -109,7 +101,7 @@ def extract_pipeline(pdf_path: str, output_csv: str, verification_json: str):
 
     def format_val(val):
         # We want missing or NaN to be blank, not "N/A" per the output_expected.csv columns
-        if val is None or val == "N/A" or pd.isna(val):
+        if val is None or val == "N/A" or is_nan(val):
             return ""
         try:
             if isinstance(val, (int, float)):
@@ -136,7 +128,7 @@ def extract_pipeline(pdf_path: str, output_csv: str, verification_json: str):
     curr = clean_missing(normalized_data.get("currency"))
     if curr == "N/A": curr = ""
 
-    row = {
+    return {
         "Company name": company_name,
         "Most recent reporting year": rep_year,
         "Financial year end": "31-Dec",
@@ -159,30 +151,248 @@ def extract_pipeline(pdf_path: str, output_csv: str, verification_json: str):
         " Y0-2-CO2 Scope 3\n(tCO2e) ": format_val(get_val("co2_scope_3", "y0_2")),
     }
 
-    df_new = pd.DataFrame([row])
+def merge_rows_into_csv(rows: list, output_csv: str):
+    """
+    Merges finished rows into output_csv in a single read/write.
+    Rows replace any existing row with the same company name.
+    """
+    if not rows:
+        return
+    import pandas as pd
+
+    df_new = pd.DataFrame(rows)
     
     if os.path.exists(output_csv):
         df_existing = pd.read_csv(output_csv, dtype=str) # Read as string to preserve exact blanks
         # Drop if same company exists to replace:
-        df_existing = df_existing[df_existing["Company name"] != company_name]
+        df_existing = df_existing[~df_existing["Company name"].isin(df_new["Company name"])]
         df_combined = pd.concat([df_existing, df_new], ignore_index=True)
     else:
         df_combined = df_new
 
     # Write without dropping .0 by avoiding automatic NaN float upcasting
     df_combined.fillna("").to_csv(output_csv, index=False)
-    logger.info(f"Appended new data to {output_csv}")
+    logger.info(f"Merged {len(rows)} row(s) into {output_csv}")
+
+def finalize_document(pdf_path: str, candidate_pages: list, raw_data: dict, verification_json: str,
+                      profiler: StageProfiler = None, model: str = ExtractionAgent.MODEL, backend: str = "openai",
+                      company_name: str = None) -> dict:
+    """
+    Runs normalization and verification on an extraction result, writes the
+    verification JSON and returns the CSV row for the document. `model` and
+    `backend` are recorded as the extraction method of LLM-extracted fields.
+    `company_name` keys the CSV row (default: the PDF's file name).
+    """
+    company_name = company_name or os.path.basename(pdf_path)
+    profiler = profiler or StageProfiler()
+
+    # --- 3. Normalization Agent ---
+    with profiler.stage("normalization"):
+        normalizer = NormalizationAgent(raw_data)
+        normalized_data = normalizer.run()
+
+    # --- 4. Verification Agent ---
+    with profiler.stage("verification") as stats:
+        verifier = VerificationAgent(normalized_data, candidate_pages)
+        audit_data = verifier.build_verification_json(model, backend)
+        stats.update(verifier.stats)
+    
+    with profiler.stage("output"):
+        # Output Verification JSON
+        with open(verification_json, 'w') as f:
+            json.dump(audit_data, f, indent=2)
+        logger.info(f"Saved verification log to {verification_json}")
+        
+        # Validate against Schema
+        validate_against_schema(normalized_data)
+
+        return build_csv_row(company_name, normalized_data)
+
+def add_pipeline_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--parse-workers", type=int, default=1, help="Worker processes for page-sharded PDF parsing")
+    parser.add_argument("--token-budget", type=int, default=16000,
+                        help="Token budget for the packed LLM context (0 disables packing and sends whole pages)")
+    parser.add_argument("--extraction-mode", choices=["monolithic", "targeted", "adaptive"], default="monolithic",
+                        help="One call for all fields, concurrent per-metric calls with fallback, or the top "
+                             "--adaptive-pages pages first and more pages only for the fields still missing")
+    parser.add_argument("--adaptive-pages", type=int, default=3, help="Adaptive mode: pages sent in the first call")
+    parser.add_argument("--adaptive-step", type=int, default=3, help="Adaptive mode: pages added per escalation")
+    parser.add_argument("--adaptive-max-pages", type=int, default=20, help="Adaptive mode: cap on pages sent in total")
+    parser.add_argument("--table-first", action="store_true",
+                        help="Try rule-based table extraction first and skip the LLM when it finds every required field")
+    parser.add_argument("--max-pages", type=int, default=None,
+                        help="Candidate pages kept by the Layout Agent (default: 40 with packing, 20 without)")
+    parser.add_argument("--store", type=str, default=None,
+                        help="SQLite result store to upsert rows into instead of merging them into the CSV; "
+                             "batch runs export the CSV once at the end, single runs leave it to export_results.py")
+    parser.add_argument("--profile", action="store_true", help="Run each stage under cProfile and dump its stats to --profile-dir")
+    parser.add_argument("--profile-dir", type=str, default="profiles", help="Directory for per-stage cProfile dumps")
+    parser.add_argument("--stream", action="store_true",
+                        help="Memory-bounded layout pass for very large PDFs: keep only the top --max-pages candidates while scanning")
+    parser.add_argument("--ocr", action="store_true",
+                        help="OCR scanned pages (little text, mostly images) with Tesseract; needs Tesseract language data")
+    parser.add_argument("--ocr-workers", type=int, default=1,
+                        help="Worker processes for OCR (per document, so per batch worker in batch_extract.py)")
+    parser.add_argument("--ocr-language", type=str, default="eng", help="Tesseract language(s), e.g. 'eng+deu'")
+    parser.add_argument("--ocr-dpi", type=int, default=300, help="Rendering resolution for OCR")
+    parser.add_argument("--llm-backend", choices=LLM_BACKENDS, default=os.environ.get("ESG_LLM_BACKEND", "openai"),
+                        help="LLM backend: OpenAI API, a local OpenAI-compatible server (--base-url), or OpenAI Batch API jobs "
+                             "(default: $ESG_LLM_BACKEND or openai)")
+    parser.add_argument("--model", type=str, default=os.environ.get("ESG_LLM_MODEL", ExtractionAgent.MODEL),
+                        help="Model name sent to the backend (default: $ESG_LLM_MODEL or %(default)s)")
+    parser.add_argument("--base-url", type=str, default=None, help="OpenAI-compatible endpoint (default: $OPENAI_BASE_URL)")
+    parser.add_argument("--batch-window", type=float, default=5.0,
+                        help="Batch backend: seconds to collect requests before submitting them as one job")
+    parser.add_argument("--batch-poll-interval", type=float, default=30.0, help="Batch backend: seconds between job status polls")
+    parser.add_argument("--dedup-index", type=str, default=None,
+                        help="SQLite index of page fingerprints; re-issued reports reuse earlier results and only "
+                             "changed candidate pages go to the LLM")
+    parser.add_argument("--min-reuse-overlap", type=float, default=0.5,
+                        help="Share of unchanged candidate pages needed to reuse an earlier document's result")
+    parser.add_argument("--requery-below", type=float, default=0.0,
+                        help="Ask the LLM again, on their pages only, for fields whose verification confidence is "
+                             f"below this, e.g. {VerificationAgent.LOW_CONFIDENCE} (default 0: disabled)")
+    parser.add_argument("--cache-dir", type=str, default=".esg_cache", help="Directory for cached LLM extraction results and parsed pages")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the extraction and parsed-page caches entirely")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached results and overwrite them with fresh LLM calls")
+    parser.add_argument("--cache-max-mb", type=float, default=None,
+                        help="Evict least recently used entries of the LLM and OCR caches beyond this size (each)")
+    parser.add_argument("--cache-max-age-days", type=float, default=None, help="Expire LLM and OCR cache entries older than this")
+
+def cache_from_args(args) -> Optional[ExtractionCache]:
+    if args.no_cache:
+        return None
+    return ExtractionCache(
+        os.path.join(args.cache_dir, "llm"),
+        max_bytes=int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None,
+        max_age_seconds=args.cache_max_age_days * 86400 if args.cache_max_age_days else None,
+    )
+
+def evict_caches(args, cache: Optional[ExtractionCache]):
+    """Applies the size and age limits to the LLM cache and the OCR cache next to it."""
+    if cache is None:
+        return
+    cache.evict()
+    ocr_dir = os.path.join(args.cache_dir, "ocr")
+    if os.path.isdir(ocr_dir):
+        ExtractionCache(ocr_dir, max_bytes=cache.max_bytes, max_age_seconds=cache.max_age_seconds).evict()
+
+def layout_options_from_args(args) -> dict:
+    max_pages = args.max_pages or (40 if args.token_budget else 20)
+    return {
+        "page_cache_dir": None if args.no_cache else os.path.join(args.cache_dir, "pages"),
+        "parse_workers": args.parse_workers,
+        "max_pages": max_pages,
+        "stream": args.stream,
+        "ocr": args.ocr,
+        "ocr_workers": args.ocr_workers,
+        "ocr_cache_dir": None if args.no_cache else os.path.join(args.cache_dir, "ocr"),
+        "ocr_language": args.ocr_language,
+        "ocr_dpi": args.ocr_dpi,
+    }
+
+def extraction_options_from_args(args, cache: Optional[ExtractionCache] = None) -> dict:
+    return {
+        "cache": cache,
+        "refresh": args.refresh,
+        "token_budget": args.token_budget or None,
+        "mode": args.extraction_mode,
+        "table_first": args.table_first,
+        "model": args.model,
+        "fingerprint_index": FingerprintIndex(args.dedup_index) if args.dedup_index else None,
+        "min_reuse_overlap": args.min_reuse_overlap,
+        "requery_below": args.requery_below or None,
+        "adaptive_pages": args.adaptive_pages,
+        "adaptive_step": args.adaptive_step,
+        "adaptive_max_pages": args.adaptive_max_pages,
+    }
+
+def llm_options_from_args(args) -> dict:
+    return {
+        "backend": args.llm_backend,
+        "base_url": args.base_url,
+        "batch_window_s": args.batch_window,
+        "batch_poll_interval_s": args.batch_poll_interval,
+    }
+
+def llm_method_options(extraction_options: Optional[dict], llm_options: Optional[dict]) -> dict:
+    """The configured model and backend, as finalize_document keyword arguments."""
+    return {
+        "model": (extraction_options or {}).get("model") or ExtractionAgent.MODEL,
+        "backend": (llm_options or {}).get("backend") or "openai",
+    }
+
+def extract_pipeline(pdf_path: str, output_csv: str, verification_json: str,
+                     layout_options: dict = None, extraction_options: dict = None, store_path: str = None,
+                     profile_dir: str = None, metrics_json: str = None, llm_options: dict = None) -> dict:
+    """
+    Runs all stages on one document. Returns the per-stage metrics record, which is
+    also written to `metrics_json` when given.
+    """
+    logger.info(f"Starting Extraction Pipeline for {pdf_path}")
+    
+    if not os.path.exists(pdf_path):
+        logger.error(f"File not found: {pdf_path}")
+        sys.exit(1)
+        
+    profiler = StageProfiler(os.path.splitext(os.path.basename(pdf_path))[0], profile_dir)
+
+    # --- 1. Layout Agent ---
+    with profiler.stage("layout") as stats:
+        layout_agent = LayoutAgent(pdf_path, **(layout_options or {}))
+        candidate_pages = layout_agent.run()
+        stats.update(layout_agent.stats)
+    
+    if not candidate_pages:
+        logger.warning("No candidate pages found. Aborting.")
+        sys.exit(0)
+
+    # --- 2. Extraction Agent ---
+    with profiler.stage("extraction") as stats:
+        extractor = ExtractionAgent(candidate_pages, pdf_path, **(extraction_options or {}))
+        raw_data = extractor.run(llm_options)
+        stats.update(extractor.run_stats)
+    
+    row = finalize_document(pdf_path, candidate_pages, raw_data, verification_json, profiler,
+                            **llm_method_options(extraction_options, llm_options))
+    with profiler.stage("output"):
+        if store_path:
+            # Rendering the CSV costs the whole store; it is a separate step (export_results.py)
+            store = ResultStore(store_path)
+            store.upsert(row, os.path.abspath(pdf_path))
+            store.close()
+            logger.info(f"Upserted {row['Company name']} into {store_path}; "
+                        f"render the CSV with: python export_results.py {store_path} {output_csv}")
+        else:
+            merge_rows_into_csv([row], output_csv)
+
+    record = profiler.document_record(pdf_path)
+    logger.info(f"Stage metrics: {json.dumps(record['stages'])}")
+    if metrics_json:
+        with open(metrics_json, 'w') as f:
+            json.dump(record, f, indent=2)
+    return record
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Deterministic ESG Extraction Agent")
     parser.add_argument("input_pdf", type=str, help="Path to input PDF")
     parser.add_argument("output_csv", type=str, help="Path to output CSV")
     parser.add_argument("verification_json", type=str, help="Path to verification JSON")
+    parser.add_argument("--metrics-json", type=str, default=None, help="Write the per-stage metrics record to this file")
+    add_pipeline_arguments(parser)
     
     args = parser.parse_args()
     
     # Make sure OpenAI key is present
-    if not os.environ.get("OPENAI_API_KEY"):
+    if args.llm_backend != "local" and not os.environ.get("OPENAI_API_KEY"):
         logger.error("OPENAI_API_KEY environment variable is not set. The LLM extraction will fail unless using a local endpoint mapped to base_url.")
     
-    extract_pipeline(args.input_pdf, args.output_csv, args.verification_json)
+    cache = cache_from_args(args)
+    extract_pipeline(args.input_pdf, args.output_csv, args.verification_json,
+                     layout_options=layout_options_from_args(args),
+                     extraction_options=extraction_options_from_args(args, cache),
+                     store_path=args.store,
+                     profile_dir=args.profile_dir if args.profile else None,
+                     metrics_json=args.metrics_json,
+                     llm_options=llm_options_from_args(args))
+    evict_caches(args, cache)
@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+from typing import Dict, Any, Optional, Tuple
+
+from utils.job_queue import JobQueue, JOB_STATUSES
+from batch_extract import LLMEventLoop, layout_stage, extraction_stage, finalize_stage
+from extract import (add_pipeline_arguments, cache_from_args, evict_caches, layout_options_from_args,
+                     extraction_options_from_args, llm_options_from_args, llm_method_options, schema_validator)
+
+logger = logging.getLogger("serve")
+
+# --- Worker processes ---
+
+def run_job(job: Dict[str, Any], llm: LLMEventLoop, config: Dict[str, Any]) -> Tuple[str, Dict[str, Any], Optional[str]]:
+    """Runs all stages on one job's PDF. Returns (status, result, error)."""
+    pdf_path = job["pdf_path"]
+    stage = "layout"
+    records: Dict[str, Any] = {}
+    try:
+        candidate_pages, stage_records = layout_stage(pdf_path, config["layout_options"], config["profile_dir"])
+        records.update(stage_records)
+        if not candidate_pages:
+            logger.warning(f"[job {job['id']}] No candidate pages found in {pdf_path}, skipping.")
+            return "skipped", {"reason": "no candidate pages", "stages": records}, None
+
+        stage = "extraction"
+        coro = extraction_stage(pdf_path, candidate_pages, llm.llm_client, config["extraction_options"])
+        raw_data, _, stage_records = llm.run(coro).result()
+        records.update(stage_records)
+
+        stage = "finalize"
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        # Prefixed with the job id, so resubmitting a document keeps the earlier audit trail
+        verification_json = os.path.join(config["verification_dir"], f"{job['id']}-{stem}.json")
+        row, stage_records = finalize_stage(pdf_path, candidate_pages, raw_data, verification_json,
+                                            config["store_path"], config["profile_dir"],
+                                            llm_method_options(config["extraction_options"], config["llm_options"]))
+        records.update(stage_records)
+    except Exception as e:
+        logger.error(f"[job {job['id']}] {stage} stage failed: {e}")
+        return "failed", {"stage": stage, "stages": records}, f"{type(e).__name__}: {e}"
+
+    return "done", {
+        "row": row,
+        "verification_json": verification_json,
+        "stages": records,
+        "wall_s": round(sum(r["wall_s"] for r in records.values()), 4),
+    }, None
+
+def warm_worker(llm: LLMEventLoop):
+    """
+    Pays the one-off costs the pipeline otherwise defers to the first document: the
+    OpenAI SDK import with client setup, and loading and compiling the output schema.
+    """
+    llm.llm_client.client
+    schema_validator()
+
+def worker_main(worker_id: int, config: Dict[str, Any], ready=None):
+    """
+    Worker process loop: claims jobs from the queue until it receives SIGTERM, which
+    lets the current job finish. The imports, the LLM client with its connection
+    pool and rate limiter, and the caches are set up before the first job (`ready`
+    is set then) and stay warm across jobs.
+    """
+    stopping = threading.Event()
+    # Ctrl-C reaches the whole process group; the service process decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    queue = JobQueue(config["queue_db"])
+    llm = LLMEventLoop(config["llm_concurrency"], config["requests_per_minute"], config["tokens_per_minute"],
+                       config["llm_options"])
+    warm_worker(llm)
+    if ready is not None:
+        ready.set()
+    logger.info(f"Worker {worker_id} ready (pid {os.getpid()})")
+    try:
+        while not stopping.is_set():
+            if os.getppid() != config["service_pid"]:
+                logger.warning(f"Worker {worker_id}: service process is gone, exiting")
+                break
+            job = queue.claim(worker_id)
+            if job is None:
+                time.sleep(config["poll_interval"])
+                continue
+            started = time.perf_counter()
+            status, result, error = run_job(job, llm, config)
+            queue.finish(job["id"], status, result, error)
+            logger.info(f"[job {job['id']}] {status} on worker {worker_id} in {time.perf_counter() - started:.2f}s")
+    finally:
+        llm.close()
+        queue.close()
+
+# --- Service ---
+
+class ExtractionService:
+    """
+    Resident extraction service: a SQLite job queue, a set of warm worker processes
+    and a small HTTP API to submit jobs and poll their status and results. Workers
+    that die are replaced; their running job is queued again, or failed once it
+    has taken down `max_attempts` workers.
+    """
+
+    def __init__(self, queue_db: str, verification_dir: str, workers: int = 2, llm_concurrency: int = 8,
+                 requests_per_minute: float = 500, tokens_per_minute: float = 30_000,
+                 layout_options: Optional[Dict[str, Any]] = None,
+                 extraction_options: Optional[Dict[str, Any]] = None,
+                 llm_options: Optional[Dict[str, Any]] = None,
+                 store_path: Optional[str] = None, profile_dir: Optional[str] = None,
+                 poll_interval: float = 0.2, max_attempts: int = 2):
+        os.makedirs(verification_dir, exist_ok=True)
+        self.queue = JobQueue(queue_db)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        # Every worker has its own client, so the account-wide limits are split between them
+        self.config = {
+            "queue_db": queue_db,
+            "verification_dir": verification_dir,
+            "llm_concurrency": llm_concurrency,
+            "requests_per_minute": requests_per_minute / workers if requests_per_minute else requests_per_minute,
+            "tokens_per_minute": tokens_per_minute / workers if tokens_per_minute else tokens_per_minute,
+            "layout_options": layout_options or {},
+            "extraction_options": extraction_options or {},
+            "llm_options": llm_options or {},
+            "store_path": store_path,
+            "profile_dir": profile_dir,
+            "poll_interval": poll_interval,
+            "service_pid": os.getpid(),
+        }
+        # Workers are stopped with SIGTERM rather than a shared multiprocessing.Event: a
+        # killed worker could leave the event's condition locked for everyone else
+        self._stopping = threading.Event()
+        # Workers are restarted by the supervisor thread while the HTTP server threads run;
+        # forking then could copy a lock another thread holds, so workers start fresh interpreters
+        self._mp = multiprocessing.get_context("spawn")
+        self.procs: Dict[int, multiprocessing.Process] = {}
+        self.ready: Dict[int, Any] = {}
+        self._supervisor: Optional[threading.Thread] = None
+
+    def _spawn(self, worker_id: int):
+        # Not a daemon: workers start their own parse / OCR process pools
+        # A fresh event per process, so a killed worker cannot leave its replacement's locked
+        ready = self._mp.Event()
+        proc = self._mp.Process(target=worker_main, args=(worker_id, self.config, ready), name=f"esg-worker-{worker_id}")
+        proc.start()
+        self.procs[worker_id] = proc
+        self.ready[worker_id] = ready
+
+    def start(self) -> "ExtractionService":
+        requeued, failed = self.queue.recover(max_attempts=self.max_attempts)
+        if requeued or failed:
+            logger.info(f"Recovered jobs left running by the previous service: {requeued} requeued, {failed} failed")
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+        self._supervisor.start()
+        return self
+
+    def _supervise(self):
+        while not self._stopping.wait(1.0):
+            for worker_id, proc in list(self.procs.items()):
+                if proc.is_alive():
+                    continue
+                requeued, failed = self.queue.recover(worker=worker_id, max_attempts=self.max_attempts)
+                logger.error(f"Worker {worker_id} exited with code {proc.exitcode} "
+                             f"({requeued} job(s) requeued, {failed} failed); restarting it")
+                self._spawn(worker_id)
+
+    def alive_workers(self) -> int:
+        return sum(proc.is_alive() for proc in self.procs.values())
+
+    def ready_workers(self) -> int:
+        """Live workers that have finished warming up and are taking jobs."""
+        return sum(proc.is_alive() and self.ready[worker_id].is_set() for worker_id, proc in self.procs.items())
+
+    def stop(self):
+        """Lets every worker finish its current job, then stops them."""
+        self._stopping.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+        for proc in self.procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        try:
+            for proc in self.procs.values():
+                proc.join()
+        except KeyboardInterrupt:
+            logger.warning("Killing workers; their running jobs are requeued on the next start")
+            for proc in self.procs.values():
+                proc.kill()
+        self.queue.close()
+
+# --- HTTP API ---
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "ESGExtract/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send(self, status: int, body: Dict[str, Any]):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, message: str):
+        self._send(status, {"error": message})
+
+    def do_GET(self):
+        service = self.server.service
+        path, _, query = self.path.partition("?")
+        parts = path.strip("/").split("/")
+        if parts == ["health"]:
+            # Cache hits are summed over the job results of all workers, not read from one process
+            self._send(200, {"workers": service.alive_workers(), "ready_workers": service.ready_workers(),
+                             "jobs": service.queue.counts(), "cache_hits": service.queue.cache_hits()})
+        elif parts == ["jobs"]:
+            params = {k: v[-1] for k, v in parse_qs(query).items()}
+            status = params.get("status")
+            if status and status not in JOB_STATUSES:
+                self._error(400, f"Unknown status {status!r}, expected one of {JOB_STATUSES}")
+                return
+            try:
+                limit = int(params.get("limit", 100))
+            except ValueError:
+                self._error(400, "limit must be an integer")
+                return
+            jobs = service.queue.jobs(status, limit)
+            for job in jobs:
+                # Listings stay small; results are fetched per job
+                job.pop("result")
+            self._send(200, {"jobs": jobs})
+        elif len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            job = service.queue.get(int(parts[1]))
+            if job is None:
+                self._error(404, f"Unknown job {parts[1]}")
+            else:
+                self._send(200, job)
+        else:
+            self._error(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._error(404, f"Unknown path {self.path}")
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            self._error(400, "Request body must be JSON")
+            return
+        pdf_path = body.get("pdf_path") if isinstance(body, dict) else None
+        if not isinstance(pdf_path, str) or not pdf_path:
+            self._error(400, 'Expected {"pdf_path": "<path readable by the service>"}')
+            return
+        pdf_path = os.path.abspath(pdf_path)
+        if not os.path.isfile(pdf_path):
+            self._error(400, f"File not found: {pdf_path}")
+            return
+        job_id = self.server.service.queue.submit(pdf_path)
+        logger.info(f"[job {job_id}] queued {pdf_path}")
+        self._send(202, {"id": job_id, "status": "queued", "url": f"/jobs/{job_id}"})
+
+def make_http_server(service: ExtractionService, host: str, port: int) -> ThreadingHTTPServer:
+    httpd = ThreadingHTTPServer((host, port), ServiceHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    return httpd
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident ESG Extraction service: HTTP job API over a SQLite queue with warm workers")
+    parser.add_argument("queue_db", type=str, help="SQLite job queue (created if missing; unfinished jobs are resumed)")
+    parser.add_argument("verification_dir", type=str, help="Directory for per-job verification JSON files")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Warm worker processes, one job each at a time")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="Maximum concurrent LLM calls per worker")
+    parser.add_argument("--rpm", type=float, default=500, help="LLM requests-per-minute limit, split evenly between workers")
+    parser.add_argument("--tpm", type=float, default=30_000, help="LLM tokens-per-minute limit, split evenly between workers")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="Seconds an idle worker waits before checking the queue again")
+    add_pipeline_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.llm_backend != "local" and not os.environ.get("OPENAI_API_KEY"):
+        logger.error("OPENAI_API_KEY environment variable is not set. The LLM extraction will fail unless using a local endpoint mapped to base_url.")
+
+    cache = cache_from_args(args)
+    service = ExtractionService(args.queue_db, args.verification_dir, workers=args.workers,
+                                llm_concurrency=args.llm_concurrency,
+                                requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                                layout_options=layout_options_from_args(args),
+                                extraction_options=extraction_options_from_args(args, cache),
+                                llm_options=llm_options_from_args(args),
+                                store_path=args.store,
+                                profile_dir=args.profile_dir if args.profile else None,
+                                poll_interval=args.poll_interval)
+    service.start()
+    httpd = None
+    try:
+        httpd = make_http_server(service, args.host, args.port)
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+        logger.info(f"Serving on http://{args.host}:{httpd.server_address[1]} with {args.workers} worker(s), queue {args.queue_db}")
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down: waiting for running jobs to finish")
+    finally:
+        if httpd is not None:
+            httpd.server_close()
+        service.stop()
+        evict_caches(args, cache)
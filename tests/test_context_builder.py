@@ -0,0 +1,56 @@
+"""
+ContextBuilder boilerplate filtering: running footers are dropped, metric tables that
+repeat across pages are kept.
+
+    python -m unittest tests.test_context_builder
+"""
+import unittest
+
+from agents.layout_agent import ESG_SCANNER
+from utils.context_builder import ContextBuilder
+
+def block(text: str, y0: float, x0: float = 50.0):
+    return {"bbox": [x0, y0, x0 + 80.0, y0 + 12.0], "text": text}
+
+def emissions_page(page_num: int, values):
+    """A page with a year header row, three metric rows and a running footer."""
+    blocks = [block("2023", 60.0, 300.0), block("2022", 60.0, 400.0)]
+    labels = ["Scope 1 emissions (tCO2e)", "Scope 2 emissions (tCO2e)", "Total energy consumption (MWh)"]
+    for row, (label, (current, prior)) in enumerate(zip(labels, values)):
+        y0 = 90.0 + 30.0 * row
+        blocks += [block(label, y0), block(current, y0, 300.0), block(prior, y0, 400.0)]
+    blocks.append(block(f"Acme Corp Sustainability Report | Page {page_num}", 780.0))
+    return {"page": page_num, "text": "\n".join(b["text"] for b in blocks), "blocks": blocks}
+
+class ContextBuilderTest(unittest.TestCase):
+
+    def test_repeated_metric_table_is_kept(self):
+        pages = [
+            emissions_page(4, [("12,345", "13,210"), ("8,765", "9,001"), ("45,000", "47,500")]),
+            emissions_page(9, [("1,234", "1,321"), ("876", "900"), ("4,500", "4,750")]),
+            emissions_page(15, [("12,345", "13,210"), ("8,765", "9,001"), ("45,000", "47,500")]),
+        ]
+        context, report = ContextBuilder(16000, ESG_SCANNER).build(pages)
+
+        self.assertEqual(report["boilerplate_blocks_removed"], 3)
+        self.assertEqual(report["blocks_selected"], 3 * 11)
+        self.assertGreater(report["tokens_packed"], 0)
+        self.assertEqual(context.count("Scope 1 emissions (tCO2e)"), 3)
+        self.assertEqual(context.count("2023"), 3)
+        self.assertIn("12,345", context)
+        self.assertIn("1,234", context)
+        self.assertNotIn("Acme Corp", context)
+
+    def test_repeated_block_mid_page_is_not_boilerplate(self):
+        pages = []
+        for page_num in (1, 2, 3):
+            blocks = [block("Introduction", 50.0), block("Figures are unaudited.", 400.0),
+                      block(f"Page {page_num}", 780.0)]
+            pages.append({"page": page_num, "text": "", "blocks": blocks})
+        context, report = ContextBuilder(16000, ESG_SCANNER).build(pages)
+
+        self.assertEqual(report["boilerplate_blocks_removed"], 6)
+        self.assertEqual(context.count("Figures are unaudited."), 3)
+
+if __name__ == "__main__":
+    unittest.main()
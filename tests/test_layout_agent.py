@@ -0,0 +1,74 @@
+"""
+LayoutAgent streaming mode selects the same pages as the eager path, including scanned
+pages whose OCR text replaces a text layer that already matched a keyword.
+
+    python -m unittest tests.test_layout_agent
+"""
+import os
+import tempfile
+import unittest
+
+import fitz  # PyMuPDF
+
+from agents.layout_agent import LayoutAgent
+from utils.cache import ExtractionCache
+from utils.ocr import page_hash
+
+OCR_TEXT = ("Scope 1 emissions 12,345 tCO2e\nScope 2 emissions 8,765 tCO2e\n"
+            "Scope 3 emissions 45,000 tCO2e\nTotal GHG emissions 66,110 tCO2e")
+
+def make_pdf(path: str):
+    """Page 1 is a scan with a stray text-layer label, pages 2-3 are ordinary text pages."""
+    doc = fitz.open()
+    page = doc.new_page()
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), False)
+    pixmap.set_rect(pixmap.irect, (240, 240, 240))
+    page.insert_image(page.rect, pixmap=pixmap)
+    page.insert_text((72, 72), "Scope 1")
+    doc.new_page().insert_text((72, 72), "Scope 1 emissions 900 tCO2e\nRevenue 120 millions")
+    doc.new_page().insert_text((72, 72), "Carbon emissions were reduced")
+    doc.save(path)
+    doc.close()
+
+def seed_ocr_cache(pdf_path: str, cache_dir: str):
+    """Stores page 1's OCR record under its page hash so no Tesseract run is needed."""
+    with fitz.open(pdf_path) as doc:
+        key = page_hash(doc[0], "eng", 300)
+    blocks = [{"bbox": [72.0, 60.0 + 14 * i, 400.0, 72.0 + 14 * i], "text": line}
+              for i, line in enumerate(OCR_TEXT.splitlines())]
+    record = {"page": 1, "text": OCR_TEXT, "blocks": blocks, "words": [], "ocr": True}
+    ExtractionCache(cache_dir).put(key, record)
+
+class LayoutAgentStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.tmp.name, "scan.pdf")
+        self.ocr_cache_dir = os.path.join(self.tmp.name, "ocr")
+        make_pdf(self.pdf_path)
+        seed_ocr_cache(self.pdf_path, self.ocr_cache_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_agent(self, stream: bool, max_pages: int = 2):
+        agent = LayoutAgent(self.pdf_path, max_pages=max_pages, ocr=True,
+                            ocr_cache_dir=self.ocr_cache_dir, stream=stream)
+        pages = agent.run()
+        return agent, pages
+
+    def test_stream_matches_eager_with_ocr(self):
+        eager, eager_pages = self.run_agent(stream=False)
+        stream, stream_pages = self.run_agent(stream=True)
+
+        self.assertEqual(eager.stats["ocr_cache_hits"], 1)
+        self.assertEqual([p["page"] for p in eager_pages], [1, 2])
+        self.assertEqual([p["page"] for p in stream_pages], [1, 2])
+        self.assertEqual([p["relevance_score"] for p in stream_pages],
+                         [p["relevance_score"] for p in eager_pages])
+        self.assertIn("Scope 3 emissions", stream_pages[0]["text"])
+        self.assertEqual(eager.candidates, 3)
+        self.assertEqual(stream.candidates, 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+AsyncLLMClient against the local mock LLM server: 429 retries honoring Retry-After,
+token bucket throttling and per-call metrics.
+
+    python -m unittest tests.test_llm_client
+"""
+import time
+import asyncio
+import unittest
+from typing import Optional
+
+from pydantic import BaseModel
+
+from benchmarks.mock_llm_server import MockLLMServer
+from utils.llm_client import AsyncLLMClient, RateLimiter, TokenBucket
+
+class Answer(BaseModel):
+    reporting_year: Optional[int]
+
+def make_client(server: MockLLMServer, limiter: Optional[RateLimiter] = None, **options) -> AsyncLLMClient:
+    client_options = {"api_key": "mock", "base_url": server.base_url, "max_retries": 0, "timeout": 10.0}
+    return AsyncLLMClient(limiter=limiter or RateLimiter(None, None), timeout=10.0,
+                          client_options=client_options, **options)
+
+def messages(i: int = 0):
+    return [{"role": "user", "content": f"Request {i}\nCONTEXT:\n--- PAGE 1 ---\nAnnual report 2023"}]
+
+class AsyncLLMClientTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_retries_429_after_retry_after(self):
+        # Every first attempt is rejected with retry-after-ms: 300; backoff alone would retry at once
+        with MockLLMServer(latency_ms=0, error_rate=1.0, retry_after_ms=300) as server:
+            client = make_client(server, backoff_base=0.0)
+            parsed, record = await client.parse("mock", messages(), Answer, label="retry")
+            self.assertIsInstance(parsed, Answer)
+            self.assertEqual(server.rate_limited, 1)
+            self.assertEqual(server.requests, 2)
+            self.assertEqual(record["attempts"], 2)
+            self.assertEqual(record["status"], "ok")
+            self.assertGreaterEqual(record["total_s"], 0.3)
+
+    async def test_gives_up_after_max_retries(self):
+        from openai import RateLimitError
+
+        with MockLLMServer(latency_ms=0, error_rate=1.0) as server:
+            client = make_client(server, max_retries=0)
+            with self.assertRaises(RateLimitError):
+                await client.parse("mock", messages(), Answer, label="no-retry")
+            record = client.metrics[-1]
+            self.assertEqual(record["status"], "error")
+            self.assertEqual(record["attempts"], 1)
+            self.assertIn("RateLimitError", record["error"])
+
+    async def test_token_bucket_throttles_requests(self):
+        # 4 requests per second without burst: the 5th call can start 1s after the 1st at the earliest
+        limiter = RateLimiter(None, None)
+        limiter.requests = TokenBucket(240, capacity=1)
+        with MockLLMServer(latency_ms=0) as server:
+            client = make_client(server, limiter=limiter)
+            started = time.monotonic()
+            results = await asyncio.gather(*(client.parse("mock", messages(i), Answer) for i in range(5)))
+            self.assertGreaterEqual(time.monotonic() - started, 0.9)
+            queued = sorted(record["queue_s"] for _, record in results)
+            self.assertLess(queued[0], 0.2)
+            self.assertGreaterEqual(queued[-1], 0.9)
+
+    async def test_token_budget_throttles_large_prompts(self):
+        # 600 tokens per second, capacity 600: a second ~600 token prompt waits about a second
+        limiter = RateLimiter(None, 36_000)
+        limiter.tokens = TokenBucket(36_000, capacity=600)
+        with MockLLMServer(latency_ms=0) as server:
+            client = make_client(server, limiter=limiter)
+            prompt = [{"role": "user", "content": "x " * 1200}]
+            _, first = await client.parse("mock", prompt, Answer)
+            _, second = await client.parse("mock", prompt, Answer)
+            self.assertLess(first["queue_s"], 0.2)
+            self.assertGreaterEqual(second["queue_s"], 0.5)
+
+    async def test_records_metrics_per_call(self):
+        with MockLLMServer(latency_ms=100) as server:
+            client = make_client(server)
+            sink = []
+            _, record = await client.parse("mock", messages(), Answer, label="doc.pdf:financial", metrics_sink=sink)
+            self.assertEqual(client.metrics, [record])
+            self.assertEqual(sink, [record])
+            self.assertEqual(record["label"], "doc.pdf:financial")
+            self.assertEqual(record["model"], "mock")
+            self.assertEqual(record["status"], "ok")
+            self.assertEqual(record["attempts"], 1)
+            self.assertGreater(record["estimated_tokens"], 0)
+            self.assertGreater(record["prompt_tokens"], 0)
+            self.assertGreater(record["completion_tokens"], 0)
+            self.assertGreaterEqual(record["latency_s"], 0.1)
+            self.assertGreaterEqual(record["total_s"], record["latency_s"])
+
+if __name__ == "__main__":
+    unittest.main()
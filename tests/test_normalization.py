@@ -0,0 +1,37 @@
+"""
+Unit multipliers of the NormalizationAgent lookup table.
+
+    python -m unittest tests.test_normalization
+"""
+import unittest
+
+from agents.normalization_agent import NormalizationAgent, unit_multiplier
+
+class UnitMultiplierTest(unittest.TestCase):
+
+    def test_kilotonnes_in_any_case(self):
+        for unit in ["ktCO2e", "KtCO2e", "ktco2e", "KTCO2E", "kt CO2e"]:
+            with self.subTest(unit=unit):
+                self.assertEqual(unit_multiplier(unit), 1_000)
+
+    def test_megatonnes_and_metric_tonnes(self):
+        self.assertEqual(unit_multiplier("MtCO2e"), 1_000_000)
+        self.assertEqual(unit_multiplier("Mt CO2e"), 1_000_000)
+        self.assertEqual(unit_multiplier("mtCO2e"), 1)
+        self.assertEqual(unit_multiplier("MTCO2e"), 1)
+
+    def test_tokens_inside_other_units_are_ignored(self):
+        self.assertEqual(unit_multiplier("tCO2e"), 1)
+        self.assertEqual(unit_multiplier("tCO2e/kWh"), 1)
+        self.assertEqual(unit_multiplier("SEK"), 1)
+        self.assertEqual(unit_multiplier("thousand tCO2e"), 1_000)
+        self.assertEqual(unit_multiplier("€m"), 1_000_000)
+        self.assertEqual(unit_multiplier("EURbn"), 1_000_000_000)
+
+    def test_agent_applies_multiplier(self):
+        data = {"co2_scope_1": {"y0": {"value": 12.5, "unit": "ktco2e"}, "y0_1": None, "y0_2": None}}
+        normalized = NormalizationAgent(data).run()
+        self.assertEqual(normalized["co2_scope_1"]["y0"]["normalized_value"], 12_500)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+from utils.number_utils import clean_number_string, parse_float
+
+TOKEN_STRIP = "()[]{}.,;:!?\"'*•"
+# Year column / row labels: "2023", "fy2023", "fy23"
+YEAR_TOKEN_PATTERN = re.compile(r"(?:fy)?((?:19|20)\d{2}|\d{2})")
+
+def normalize_token(token: str) -> str:
+    return token.lower().strip(TOKEN_STRIP)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in (normalize_token(w) for w in text.split()) if t]
+
+def number_key(token: str) -> Optional[float]:
+    """Numeric value of a token such as "12,345" or "(1.5)", so different spellings match."""
+    if not any(ch.isdigit() for ch in token):
+        return None
+    value = parse_float(clean_number_string(token))
+    return round(value, 6) if value is not None else None
+
+def union_bbox(bboxes: List[List[float]]) -> List[float]:
+    return [min(b[0] for b in bboxes), min(b[1] for b in bboxes),
+            max(b[2] for b in bboxes), max(b[3] for b in bboxes)]
+
+def year_of(token: str) -> Optional[int]:
+    """Year named by a label token; two-digit years only with an "fy" prefix."""
+    m = YEAR_TOKEN_PATTERN.fullmatch(token)
+    if not m or (len(m.group(1)) == 2 and not token.startswith("fy")):
+        return None
+    year = int(m.group(1))
+    return year + 2000 if year < 100 else year
+
+def same_row(a: List[float], b: List[float]) -> bool:
+    overlap = min(a[3], b[3]) - max(a[1], b[1])
+    return overlap >= 0.5 * min(a[3] - a[1], b[3] - b[1])
+
+def same_column(a: List[float], b: List[float]) -> bool:
+    return min(a[2], b[2]) > max(a[0], b[0])
+
+class PageIndex:
+    """
+    Token index of one page. Maps normalized tokens and numeric values to word
+    positions (word-level bboxes from PyMuPDF `get_text("words")`), so a snippet
+    resolves to the tightest run of words that spells it instead of a whole block.
+    Pages without word records are indexed at block level.
+    """
+
+    def __init__(self, page: Dict[str, Any]):
+        # (normalized token, bbox) in reading order
+        self.words: List[Tuple[str, List[float]]] = []
+        self.word_level = bool(page.get("words"))
+        if self.word_level:
+            for w in page["words"]:
+                token = normalize_token(w[4])
+                if token:
+                    self.words.append((token, list(w[:4])))
+        else:
+            for block in page.get("blocks", []):
+                for token in tokenize(block["text"]):
+                    self.words.append((token, list(block["bbox"])))
+
+        self.tokens: Dict[str, List[int]] = {}
+        self.numbers: Dict[float, List[int]] = {}
+        for i, (token, _) in enumerate(self.words):
+            self.tokens.setdefault(token, []).append(i)
+            key = number_key(token)
+            if key is not None:
+                self.numbers.setdefault(key, []).append(i)
+        # Line layout and year labels, built on the first year check
+        self._lines: Optional[List[int]] = None
+        self._line_words: List[List[int]] = []
+        self._years: Dict[int, List[int]] = {}
+
+    def _positions(self, token: str) -> List[int]:
+        positions = self.tokens.get(token)
+        if positions:
+            return positions
+        key = number_key(token)
+        return self.numbers.get(key, []) if key is not None else []
+
+    def _matches_at(self, start: int, tokens: List[str], offset: int) -> int:
+        """Length of the snippet run that lines up with the page words around `start`."""
+        first = start - offset
+        if first < 0 or first + len(tokens) > len(self.words):
+            return 0
+        matched = 0
+        for k, token in enumerate(tokens):
+            word = self.words[first + k][0]
+            if word == token or (number_key(token) is not None and number_key(token) == number_key(word)):
+                matched += 1
+        return matched
+
+    def find(self, snippet: Optional[str], value: Optional[float] = None) -> Optional[List[float]]:
+        """
+        Returns the bbox of the best match for `snippet` (falling back to the numeric
+        `value`), or None. Snippet tokens are anchored on their rarest token, numbers
+        first, and the candidate with the most surrounding tokens in place wins.
+        """
+        tokens = tokenize(snippet or "")
+        value_key = round(float(value), 6) if value is not None else None
+        value_positions = self.numbers.get(value_key, []) if value_key is not None else []
+        anchors = [(k, self._positions(t)) for k, t in enumerate(tokens)]
+        anchors = [(k, positions) for k, positions in anchors if positions]
+        if not anchors:
+            return self.words[value_positions[0]][1] if value_positions else None
+
+        anchor_k, positions = min(anchors, key=lambda a: (number_key(tokens[a[0]]) is None, len(a[1])))
+        best = max(positions, key=lambda i: self._matches_at(i, tokens, anchor_k))
+        if value_positions and all(number_key(t) != value_key for t in tokens):
+            # The snippet only names the row (e.g. "Scope 1"); the value itself is the provenance
+            return self.words[min(value_positions, key=lambda i: abs(i - best))][1]
+        first = best - anchor_k
+        if self._matches_at(best, tokens, anchor_k) == len(tokens):
+            return union_bbox([bbox for _, bbox in self.words[first:first + len(tokens)]])
+        return self.words[best][1]
+
+    def locate(self, value: float) -> List[int]:
+        """Word positions spelling the numeric `value` in any format."""
+        return self.numbers.get(round(float(value), 6), [])
+
+    def _layout(self):
+        """Line number of each word, words per line and positions of year labels."""
+        if self._lines is not None:
+            return
+        self._lines, self._line_words, self._years = [], [], {}
+        for i, (token, bbox) in enumerate(self.words):
+            if not i or not same_row(self.words[i - 1][1], bbox):
+                self._line_words.append([])
+            self._lines.append(len(self._line_words) - 1)
+            self._line_words[-1].append(i)
+            year = year_of(token)
+            if year is not None:
+                self._years.setdefault(year, []).append(i)
+
+    def _header_years(self, line: int) -> List[int]:
+        """Years of the nearest line above `line` that names at least two years."""
+        for above in range(line - 1, -1, -1):
+            years = [y for y in (year_of(self.words[i][0]) for i in self._line_words[above]) if y is not None]
+            if len(years) >= 2:
+                return years
+        return []
+
+    def line_text(self, position: int) -> str:
+        """Normalized tokens of the line the word at `position` is on."""
+        self._layout()
+        return " ".join(self.words[i][0] for i in self._line_words[self._lines[position]])
+
+    def year_tie(self, position: int) -> Tuple[Optional[int], Optional[str]]:
+        """
+        The year the page ties the word at `position` to, and how: "row" (nearest year
+        label on the same line), "column" (same place in the nearest year header line
+        above, or else the nearest label above it overlapping horizontally) or "block"
+        (the only year in its text block, for pages indexed at block level).
+        (None, None) when the page doesn't tie it to a year.
+        """
+        self._layout()
+        line = self._lines[position]
+        on_line = [i for i in self._line_words[line] if i != position and year_of(self.words[i][0]) is not None]
+        if not self.word_level:
+            years = {year_of(self.words[i][0]) for i in on_line}
+            return (years.pop(), "block") if len(years) == 1 else (None, None)
+        if on_line:
+            nearest = min(on_line, key=lambda i: abs(i - position))
+            return year_of(self.words[nearest][0]), "row"
+
+        # Text tables whose columns don't line up: the k-th number from the right of
+        # the row belongs to the k-th year from the right of the header
+        years = self._header_years(line)
+        row = [i for i in self._line_words[line] if number_key(self.words[i][0]) is not None]
+        rank = len(row) - 1 - row.index(position) if position in row else len(years)
+        if rank < len(years):
+            return years[len(years) - 1 - rank], "column"
+
+        bbox = self.words[position][1]
+        above = [(label[3], year) for year, positions in self._years.items() for label in (self.words[i][1] for i in positions)
+                 if same_column(label, bbox) and label[3] <= bbox[1]]
+        if above:
+            return max(above)[1], "column"
+        return None, None
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, Any, Optional, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+def content_hash(*parts: Any) -> str:
+    """Stable sha256 over JSON-serializable parts."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+class ExtractionCache:
+    """
+    On-disk, content-addressed cache of LLM extraction results.
+    One JSON file per key under a two-character shard directory. A file's mtime is
+    when the entry was written and its atime when it was last read: entries whose
+    mtime is older than `max_age_seconds` are ignored and evicted, and `evict()` also
+    trims the least recently read entries until the cache fits in `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None, max_age_seconds: Optional[float] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, messages: Any, model: str, prompt_version: str, schema: Dict[str, Any]) -> str:
+        return content_hash(messages, model, prompt_version, schema)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _expired(self, written: float, now: float) -> bool:
+        return self.max_age_seconds is not None and now - written > self.max_age_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            written = os.stat(path).st_mtime
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+
+        now = time.time()
+        if self._expired(written, now):
+            self.misses += 1
+            return None
+
+        # Record the read in atime for LRU eviction; mtime keeps the write time for expiry
+        os.utime(path, (now, written))
+        self.hits += 1
+        return entry["result"]
+
+    def put(self, key: str, result: Dict[str, Any], meta: Optional[Dict[str, Any]] = None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"created": time.time(), "meta": meta or {}, "result": result}
+        # Write atomically so concurrent readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def iter_entries(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yields (key, entry) for every readable entry without touching hit counters or LRU times."""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in sorted(files):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                    with open(path, 'r') as f:
+                        entry = json.load(f)
+                    os.utime(path, (st.st_atime, st.st_mtime))
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+                yield name[:-len(".json")], entry
+
+    def evict(self) -> int:
+        """Removes expired entries, then least recently used ones beyond max_bytes. Returns count removed."""
+        now = time.time()
+        entries = []
+        removed = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if self._expired(st.st_mtime, now):
+                    os.remove(path)
+                    removed += 1
+                else:
+                    entries.append((st.st_atime, st.st_size, path))
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+                removed += 1
+
+        if removed:
+            logger.info(f"Evicted {removed} cache entries from {self.cache_dir}")
+        return removed
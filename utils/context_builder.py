@@ -0,0 +1,148 @@
+import re
+import logging
+from collections import Counter
+from typing import List, Dict, Any, Tuple
+
+from utils.keyword_scanner import KeywordScanner, NUMBER_TOKEN_PATTERN
+from utils.token_utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+DIGITS_PATTERN = re.compile(r"\d+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+LETTER_PATTERN = re.compile(r"[^\W\d_]")
+
+def normalize_block(text: str) -> str:
+    """Block signature used to spot repeated headers/footers (page numbers differ)."""
+    return WHITESPACE_PATTERN.sub(" ", DIGITS_PATTERN.sub("#", text.lower())).strip()
+
+def edge_blocks(blocks: List[Dict[str, Any]], edge_share: float) -> List[bool]:
+    """
+    Flags blocks in the top or bottom `edge_share` of the page's text extent, where
+    running headers and footers sit. Without bboxes only the first and last block count.
+    """
+    boxes = [b.get("bbox") for b in blocks]
+    if not all(boxes):
+        return [i in (0, len(blocks) - 1) for i in range(len(blocks))]
+    top = min(box[1] for box in boxes)
+    bottom = max(box[3] for box in boxes)
+    margin = (bottom - top) * edge_share
+    return [box[3] <= top + margin or box[1] >= bottom - margin for box in boxes]
+
+def format_page_header(page_num: int) -> str:
+    return f"--- PAGE {page_num} ---"
+
+class ContextBuilder:
+    """
+    Packs the most relevant text blocks of the candidate pages into an LLM context
+    that fits a token budget.
+
+    1. Blocks near the top or bottom of a page that repeat on several pages (running
+       headers, footers) are dropped. Digits are masked in the signature so changing
+       page numbers still match, which is why blocks with ESG keywords and purely
+       numeric blocks (table cells, year headers) are never treated as boilerplate.
+    2. Every block is scored with the layout keyword scanner. Neighbouring blocks share
+       part of their score, because table cells often land in separate blocks from
+       their row/column labels, and numeric blocks get a bonus.
+    3. Blocks are added greedily by score until the budget is reached, then emitted
+       in reading order under the usual per-page headers.
+    """
+
+    def __init__(self, token_budget: int, scanner: KeywordScanner, model: str = "gpt-4o",
+                 min_repeats: int = 3, edge_share: float = 0.1, neighbour_weight: float = 0.5, number_weight: float = 2.0):
+        self.token_budget = token_budget
+        self.scanner = scanner
+        self.model = model
+        self.min_repeats = min_repeats
+        self.edge_share = edge_share
+        self.neighbour_weight = neighbour_weight
+        self.number_weight = number_weight
+
+    def _page_blocks(self, page: Dict[str, Any]) -> Tuple[List[str], List[bool]]:
+        """Block texts of a page and whether each one may be a running header/footer."""
+        blocks = [b for b in page.get("blocks", []) if b.get("text")]
+        if not blocks:
+            return ([page["text"]], [False]) if page.get("text") else ([], [])
+        texts = [b["text"] for b in blocks]
+        edges = edge_blocks(blocks, self.edge_share)
+        return texts, [edge and self._maybe_boilerplate(t) for t, edge in zip(texts, edges)]
+
+    def _maybe_boilerplate(self, text: str) -> bool:
+        if not LETTER_PATTERN.search(text):
+            return False
+        return not self.scanner.scan(text.lower())["counts"]
+
+    def _score_blocks(self, texts: List[str]) -> List[float]:
+        base = []
+        for text in texts:
+            lowered = text.lower()
+            score = self.scanner.relevance(lowered)["score"]
+            tokens = len(lowered.split())
+            if tokens:
+                score += self.number_weight * len(NUMBER_TOKEN_PATTERN.findall(lowered)) / tokens
+            base.append(score)
+
+        scores = []
+        for i, score in enumerate(base):
+            neighbours = base[max(0, i - 1):i] + base[i + 1:i + 2]
+            scores.append(score + self.neighbour_weight * max(neighbours, default=0.0))
+        return scores
+
+    def build(self, candidate_pages: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """Returns (context_string, report) where report includes the tokens saved."""
+        parsed = [(p["page"], *self._page_blocks(p)) for p in candidate_pages]
+        pages = [(n, blocks) for n, blocks, _ in parsed]
+        full_context = "\n".join(f"{format_page_header(n)}\n{chr(10).join(blocks)}\n" for n, blocks in pages)
+        tokens_full = count_tokens(full_context, self.model)
+
+        # Header/footer candidates whose signature is seen on many pages are boilerplate
+        page_signatures = Counter()
+        for _, blocks, edges in parsed:
+            page_signatures.update({normalize_block(b) for b, edge in zip(blocks, edges) if edge})
+        boilerplate = {sig for sig, n in page_signatures.items() if n >= self.min_repeats}
+
+        candidates = []  # (score, page_num, block_index, text, tokens)
+        removed = 0
+        for page_num, blocks, edges in parsed:
+            kept = [(i, b) for i, (b, edge) in enumerate(zip(blocks, edges))
+                    if not (edge and normalize_block(b) in boilerplate)]
+            removed += len(blocks) - len(kept)
+            scores = self._score_blocks([b for _, b in kept])
+            for (i, text), score in zip(kept, scores):
+                candidates.append((score, page_num, i, text, count_tokens(text, self.model)))
+
+        header_tokens = {n: count_tokens(format_page_header(n), self.model) + 2 for n, _ in pages}
+        selected = []
+        used = 0
+        pages_used = set()
+        # Highest score first; ties keep reading order
+        for score, page_num, i, text, tokens in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+            cost = tokens + 1 + (header_tokens[page_num] if page_num not in pages_used else 0)
+            if used + cost > self.token_budget:
+                continue
+            used += cost
+            pages_used.add(page_num)
+            selected.append((page_num, i, text))
+
+        by_page: Dict[int, List[Tuple[int, str]]] = {}
+        for page_num, i, text in sorted(selected):
+            by_page.setdefault(page_num, []).append((i, text))
+        context_parts = [
+            f"{format_page_header(n)}\n" + "\n".join(text for _, text in by_page[n]) + "\n"
+            for n in sorted(by_page)
+        ]
+        context = "\n".join(context_parts)
+        tokens_packed = count_tokens(context, self.model)
+
+        report = {
+            "token_budget": self.token_budget,
+            "tokens_full": tokens_full,
+            "tokens_packed": tokens_packed,
+            "tokens_saved": max(0, tokens_full - tokens_packed),
+            "blocks_total": sum(len(blocks) for _, blocks in pages),
+            "blocks_selected": len(selected),
+            "boilerplate_blocks_removed": removed,
+            "pages_in": len(pages),
+            "pages_used": len(by_page),
+        }
+        return context, report
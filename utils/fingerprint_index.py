@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    pdf_path TEXT,
+    pages_json TEXT NOT NULL,
+    result_json TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    fingerprint TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    PRIMARY KEY (fingerprint, doc_id, page)
+);
+CREATE INDEX IF NOT EXISTS pages_by_doc ON pages (doc_id);
+"""
+
+def normalize_page_text(text: str) -> str:
+    """Case and whitespace folded page text, so re-rendered but identical pages hash the same."""
+    return " ".join(text.lower().split())
+
+def page_fingerprint(text: str) -> str:
+    return hashlib.sha256(normalize_page_text(text).encode("utf-8")).hexdigest()[:32]
+
+class FingerprintIndex:
+    """
+    SQLite index of candidate-page fingerprints and extraction results of every
+    extracted document. A new document is matched against it by the number of
+    candidate pages it shares with earlier documents (same model and prompt version),
+    so re-issued reports (corrected versions, re-exports) can reuse earlier results
+    and only send their changed pages to the LLM.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.db_path))
+            os.makedirs(directory, exist_ok=True)
+            # Used from the (single) LLM event loop thread in batch mode
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def best_match(self, fingerprints: Dict[int, str], model: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        """
+        The earlier document sharing the most candidate-page fingerprints, as
+        {"doc_id", "pdf_path", "pages": {page: fingerprint}, "result", "shared"}, or None.
+        """
+        unique = sorted(set(fingerprints.values()))
+        if not unique:
+            return None
+        conn = self._connect()
+        placeholders = ",".join("?" * len(unique))
+        found = conn.execute(
+            "SELECT p.doc_id, COUNT(DISTINCT p.fingerprint) AS shared FROM pages p "
+            "JOIN documents d ON d.doc_id = p.doc_id "
+            f"WHERE p.fingerprint IN ({placeholders}) AND d.model = ? AND d.prompt_version = ? "
+            "GROUP BY p.doc_id ORDER BY shared DESC, d.updated DESC LIMIT 1",
+            unique + [model, prompt_version],
+        ).fetchone()
+        if not found:
+            return None
+        doc_id, shared = found
+        pdf_path, pages_json, result_json = conn.execute(
+            "SELECT pdf_path, pages_json, result_json FROM documents WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        return {
+            "doc_id": doc_id,
+            "pdf_path": pdf_path,
+            "pages": {int(page): fp for page, fp in json.loads(pages_json).items()},
+            "result": json.loads(result_json),
+            "shared": shared,
+        }
+
+    def record(self, doc_id: str, pdf_path: str, fingerprints: Dict[int, str], result: Dict[str, Any],
+               model: str, prompt_version: str):
+        """Stores (or replaces) a document's candidate-page fingerprints and extraction result."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO documents (doc_id, pdf_path, pages_json, result_json, model, prompt_version, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(doc_id) DO UPDATE SET pdf_path=excluded.pdf_path, "
+                "pages_json=excluded.pages_json, result_json=excluded.result_json, model=excluded.model, "
+                "prompt_version=excluded.prompt_version, updated=excluded.updated",
+                (doc_id, pdf_path, json.dumps(fingerprints), json.dumps(result, ensure_ascii=False), model,
+                 prompt_version, time.time()),
+            )
+            conn.execute("DELETE FROM pages WHERE doc_id = ?", (doc_id,))
+            conn.executemany("INSERT OR IGNORE INTO pages (fingerprint, doc_id, page) VALUES (?, ?, ?)",
+                             [(fp, doc_id, page) for page, fp in fingerprints.items()])
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
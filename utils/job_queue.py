@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pdf_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    worker INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result_json TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, id);
+"""
+
+# queued -> running -> done | skipped (no candidate pages) | failed
+JOB_STATUSES = ["queued", "running", "done", "skipped", "failed"]
+COLUMNS = ["id", "pdf_path", "status", "submitted", "started", "finished", "worker", "attempts", "result_json", "error"]
+
+def _job(row: tuple) -> Dict[str, Any]:
+    job = dict(zip(COLUMNS, row))
+    result_json = job.pop("result_json")
+    job["result"] = json.loads(result_json) if result_json else None
+    return job
+
+class JobQueue:
+    """
+    Persistent SQLite queue of extraction jobs for the resident service. The HTTP
+    front end and every worker process open their own connection; WAL mode lets
+    workers claim and finish jobs while status polls keep reading. A job is claimed
+    with a single UPDATE ... RETURNING, so two workers never get the same job.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._conn: Optional[sqlite3.Connection] = None
+        # The HTTP front end shares one connection between its request threads
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.db_path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def submit(self, pdf_path: str) -> int:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cur = conn.execute("INSERT INTO jobs (pdf_path, status, submitted) VALUES (?, 'queued', ?)",
+                                   (pdf_path, time.time()))
+            return cur.lastrowid
+
+    def claim(self, worker: int) -> Optional[Dict[str, Any]]:
+        """Marks the oldest queued job as running on `worker` and returns it, or None when the queue is empty."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, worker = ?, attempts = attempts + 1 "
+                    "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1) "
+                    f"RETURNING {', '.join(COLUMNS)}",
+                    (time.time(), worker),
+                ).fetchone()
+            return _job(row) if row else None
+
+    def finish(self, job_id: int, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished = ?, result_json = ?, error = ? WHERE id = ?",
+                    (status, time.time(), json.dumps(result, ensure_ascii=False) if result is not None else None,
+                     error, job_id),
+                )
+
+    def recover(self, worker: Optional[int] = None, max_attempts: int = 2) -> Tuple[int, int]:
+        """
+        Jobs left running by a dead worker (or, without `worker`, by a stopped or crashed
+        service) go back to the queue, or fail once they have been attempted
+        `max_attempts` times, so a PDF that kills its worker cannot loop forever.
+        Returns (requeued, failed).
+        """
+        where = "status = 'running'" + (" AND worker = ?" if worker is not None else "")
+        params = (worker,) if worker is not None else ()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                failed = conn.execute(
+                    f"UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE {where} AND attempts >= ?",
+                    (time.time(), f"Worker stopped while running the job ({max_attempts} attempt(s))") + params + (max_attempts,),
+                ).rowcount
+                requeued = conn.execute(
+                    f"UPDATE jobs SET status = 'queued', started = NULL, worker = NULL WHERE {where}", params
+                ).rowcount
+            return requeued, failed
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally of one status."""
+        query = f"SELECT {', '.join(COLUMNS)} FROM jobs"
+        params: list = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return [_job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update(dict(rows))
+        return counts
+
+    def cache_hits(self) -> int:
+        """Extraction cache hits summed over every finished job, whichever worker ran it."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT SUM(json_extract(result_json, '$.stages.extraction.cache_hits')) FROM jobs WHERE status = 'done'"
+            ).fetchone()
+        return int(row[0] or 0)
+
+    def __len__(self) -> int:
+        return sum(self.counts().values())
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
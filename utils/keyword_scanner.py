@@ -0,0 +1,137 @@
+import re
+import math
+from typing import List, Dict, Any, Optional, Tuple
+
+# Tokens that start with a digit, e.g. "2023", "12,345", "1.5bn"
+NUMBER_TOKEN_PATTERN = re.compile(r"(?<!\S)\d[\d,.]*")
+NUMBER_PATTERN = re.compile(r"\d[\d,.]*")
+# Lines carrying at least two separate numbers look like table rows
+NUMERIC_LINE_PATTERN = re.compile(r"^[^\n\d]*\d[\d,.]*[^\n\d]+\d", re.MULTILINE)
+
+REGEX_METACHARS = set(".^$*+?{}[]|()")
+QUANTIFIERS = set("*+?{")
+
+def required_literal(pattern: str) -> str:
+    """
+    Returns the literal prefix every match of `pattern` must contain (e.g. "scope"
+    for r"scope\\s*1", "$" for r"\\$"), or "" if the pattern starts with a class.
+    """
+    literal = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            if nxt.isalnum():  # \s, \d, \b, ... are classes or anchors
+                break
+            literal.append(nxt)
+            i += 2
+        elif ch in REGEX_METACHARS:
+            break
+        else:
+            literal.append(ch)
+            i += 1
+        # A quantified character is optional, so it cannot be part of the prefix
+        if i < len(pattern) and pattern[i] in QUANTIFIERS:
+            literal.pop()
+            break
+    return "".join(literal)
+
+class KeywordScanner:
+    """
+    Scans text for many keyword patterns, returning per-keyword counts and match
+    offsets from one pass of a single compiled alternation. Text is expected to be
+    lowercased (or the patterns to be case-insensitive).
+
+    CPython's regex engine tries every alternative at every position, so a wide
+    alternation is slower than a handful of substring searches. Each pattern's
+    required literal is therefore checked first with `in` (a C-level substring
+    search), and the alternation is built only from the keywords present on the
+    page (compiled once per distinct subset). Pages without any keyword never reach
+    the regex engine.
+    """
+
+    def __init__(self, patterns: List[str], weights: Optional[Dict[str, float]] = None):
+        self.patterns = list(patterns)
+        self.weights = weights or {}
+        self.literals = [(p, required_literal(p)) for p in self.patterns]
+        self.compiled = [(p, re.compile(p)) for p in self.patterns]
+        self.alternations: Dict[Tuple[str, ...], Any] = {}
+        self.match_to_pattern: Dict[str, str] = {}
+
+    def _alternation(self, present: Tuple[str, ...]):
+        regex = self.alternations.get(present)
+        if regex is None:
+            # No capture groups: they disable the engine's literal-prefix search
+            regex = self.alternations[present] = re.compile("|".join(f"(?:{p})" for p in present))
+        return regex
+
+    def _classify(self, matched: str) -> str:
+        kw = self.match_to_pattern.get(matched)
+        if kw is None:
+            # First alternative that matches wins, mirroring the alternation order
+            kw = next(p for p, rx in self.compiled if rx.match(matched))
+            self.match_to_pattern[matched] = kw
+        return kw
+
+    def scan(self, text: str) -> Dict[str, Any]:
+        """Returns per-keyword match counts and character offsets."""
+        counts: Dict[str, int] = {}
+        offsets: Dict[str, List[int]] = {}
+        present = tuple(p for p, lit in self.literals if lit in text)
+        if not present:
+            return {"counts": counts, "offsets": offsets}
+
+        for m in self._alternation(present).finditer(text):
+            kw = self._classify(m.group())
+            counts[kw] = counts.get(kw, 0) + 1
+            offsets.setdefault(kw, []).append(m.start())
+        return {"counts": counts, "offsets": offsets}
+
+    def relevance(self, text: str, scan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Combines keyword evidence with layout signals into one page relevance score:
+
+        - tf: sum over matched keywords of weight * (1 + log(effective count)), where
+          matches in the first fifth of the page (titles, table headers) count 1.5x
+          and matches on a table row (a line with two or more numbers) count 3x
+        - table_density: share of non-empty lines that look like table rows
+        - number_density: share of whitespace tokens that are numbers
+        """
+        scan = scan or self.scan(text)
+        if not scan["counts"]:
+            return {"score": 0.0, "tf": 0.0, "number_density": 0.0, "table_density": 0.0, "counts": {}}
+
+        length = max(len(text), 1)
+        row_cache: Dict[int, bool] = {}
+
+        def on_table_row(offset: int) -> bool:
+            start = text.rfind("\n", 0, offset) + 1
+            if start not in row_cache:
+                end = text.find("\n", offset)
+                line = text[start:end if end != -1 else len(text)]
+                row_cache[start] = len(NUMBER_PATTERN.findall(line)) >= 2
+            return row_cache[start]
+
+        tf = 0.0
+        for kw, count in scan["counts"].items():
+            kw_offsets = scan["offsets"][kw]
+            early = sum(1 for off in kw_offsets if off < length * 0.2)
+            in_rows = sum(1 for off in kw_offsets if on_table_row(off))
+            effective = count + 0.5 * early + 2.0 * in_rows
+            tf += self.weights.get(kw, 1.0) * (1.0 + math.log(effective))
+
+        tokens = len(text.split())
+        number_density = len(NUMBER_TOKEN_PATTERN.findall(text)) / tokens if tokens else 0.0
+
+        lines = sum(1 for line in text.splitlines() if line.strip())
+        table_density = len(NUMERIC_LINE_PATTERN.findall(text)) / lines if lines else 0.0
+
+        score = tf * (1.0 + 2.0 * table_density + 0.5 * number_density)
+        return {
+            "score": round(score, 4),
+            "tf": round(tf, 4),
+            "number_density": round(number_density, 4),
+            "table_density": round(table_density, 4),
+            "counts": scan["counts"],
+        }
@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import itertools
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Union
+
+from utils.token_utils import count_tokens
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+def openai_client(**options) -> "AsyncOpenAI":
+    # Importing the OpenAI SDK takes longer than a cached or table-first document takes
+    # end to end, so clients import it when they send their first request
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(**options)
+
+def _strict_schema(node: Any, defs: Dict[str, Any]) -> Any:
+    if isinstance(node, list):
+        return [_strict_schema(item, defs) for item in node]
+    if not isinstance(node, dict):
+        return node
+    if "$ref" in node and len(node) > 1:
+        # Strict mode rejects keywords next to $ref, so the definition is inlined
+        ref = node["$ref"].split("/")[-1]
+        node = {**defs[ref], **{k: v for k, v in node.items() if k != "$ref"}}
+    node = {key: _strict_schema(value, defs) for key, value in node.items() if key != "default"}
+    if node.get("type") == "object" and "properties" in node:
+        node["required"] = list(node["properties"])
+        node["additionalProperties"] = False
+    return node
+
+def response_format_param(model_class) -> Dict[str, Any]:
+    """
+    The json_schema response_format for a pydantic model in OpenAI strict mode: every
+    object closed and every property required (Optional fields stay nullable).
+    """
+    schema = model_class.model_json_schema()
+    schema = _strict_schema(schema, schema.get("$defs", {}))
+    return {"type": "json_schema", "json_schema": {"name": model_class.__name__, "schema": schema, "strict": True}}
+
+def estimate_tokens(text: str) -> int:
+    """Local prompt token count used for rate limiting before the call."""
+    return max(1, count_tokens(text))
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_minute`. Consumption may drive
+    the level negative (e.g. when actual usage exceeds the estimate), which delays
+    later acquirers until the debt is repaid.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        # Never wait for more than the bucket can ever hold
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+class RateLimiter:
+    """Shared requests-per-minute and tokens-per-minute limits for one API key. A falsy limit disables it."""
+
+    def __init__(self, requests_per_minute: Optional[float] = 500, tokens_per_minute: Optional[float] = 30_000):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    async def acquire(self, estimated_tokens: int):
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            await self.tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        # Charge the difference between the real usage and the up-front estimate
+        if self.tokens is not None and actual_tokens > estimated_tokens:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+
+class AsyncLLMClient:
+    """
+    Wraps AsyncOpenAI structured-output calls with a shared rate limiter, bounded
+    concurrency, per-call timeouts and jittered exponential backoff that honors
+    Retry-After headers. Every call appends a metrics record to `self.metrics`.
+    """
+
+    RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+    def __init__(self, client: Optional["AsyncOpenAI"] = None, limiter: Optional[RateLimiter] = None,
+                 max_concurrency: int = 8, max_retries: int = 5, timeout: float = 120.0,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 client_options: Optional[Dict[str, Any]] = None):
+        # Without a client, one is built from `client_options` on the first call.
+        # Retries are handled here so that they go through the shared limiter
+        self._client = client
+        self.client_options = client_options or {"api_key": os.environ.get("OPENAI_API_KEY", ""),
+                                                 "max_retries": 0, "timeout": timeout}
+        self.limiter = limiter or RateLimiter()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics: List[Dict[str, Any]] = []
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        if self._client is None:
+            self._client = openai_client(**self.client_options)
+        return self._client
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        headers = response.headers
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000.0
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except ValueError:
+            pass
+        return None
+
+    def _is_retryable(self, error: Exception) -> bool:
+        from openai import RateLimitError, APITimeoutError, APIConnectionError, APIStatusError
+
+        if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError, asyncio.TimeoutError)):
+            return True
+        if isinstance(error, APIStatusError):
+            return error.status_code in self.RETRYABLE_STATUS
+        return False
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter, but never earlier than the server asked for
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def parse(self, model: str, messages: List[Dict[str, str]], response_format, temperature: float = 0.0, label: str = "",
+                    metrics_sink: Optional[List[Dict[str, Any]]] = None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Runs one structured-output call. Returns (parsed_model_or_None, metrics_record).
+        Raises the last error once retries are exhausted or the error is not retryable.
+        The metrics record is also appended to `metrics_sink` when given, even on failure.
+        """
+        estimated = sum(estimate_tokens(m["content"]) for m in messages)
+        record = {"label": label, "model": model, "attempts": 0, "estimated_tokens": estimated,
+                  "prompt_tokens": None, "completion_tokens": None, "latency_s": None,
+                  "queue_s": None, "status": "error"}
+        started = time.monotonic()
+
+        try:
+            async with self.semaphore:
+                for attempt in range(self.max_retries + 1):
+                    await self.limiter.acquire(estimated)
+                    if record["queue_s"] is None:
+                        record["queue_s"] = round(time.monotonic() - started, 4)
+                    record["attempts"] = attempt + 1
+                    call_started = time.monotonic()
+                    try:
+                        response = await asyncio.wait_for(
+                            self.client.beta.chat.completions.parse(
+                                model=model,
+                                messages=messages,
+                                response_format=response_format,
+                                temperature=temperature,
+                            ),
+                            timeout=self.timeout,
+                        )
+                    except Exception as e:
+                        if attempt >= self.max_retries or not self._is_retryable(e):
+                            record["error"] = f"{type(e).__name__}: {e}"
+                            raise
+                        delay = self._backoff(attempt, self._retry_after(e))
+                        logger.warning(f"LLM call {label or model} failed ({type(e).__name__}), retrying in {delay:.2f}s "
+                                       f"(attempt {attempt + 1}/{self.max_retries})")
+                        await asyncio.sleep(delay)
+                        continue
+
+                    record["latency_s"] = round(time.monotonic() - call_started, 4)
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        record["prompt_tokens"] = usage.prompt_tokens
+                        record["completion_tokens"] = usage.completion_tokens
+                        self.limiter.settle(estimated, usage.total_tokens)
+                    record["status"] = "ok"
+                    return response.choices[0].message.parsed, record
+        finally:
+            record["total_s"] = round(time.monotonic() - started, 4)
+            self.metrics.append(record)
+            if metrics_sink is not None:
+                metrics_sink.append(record)
+
+class OpenAIBatchClient:
+    """
+    Same `parse` interface as AsyncLLMClient, backed by the OpenAI Batch API. Calls are
+    queued for `window_s` seconds (or until `max_batch_size` requests are waiting),
+    submitted together as one JSONL batch job, and resolved when the job's output file
+    is downloaded. Several jobs can be in flight at once. Meant for backfills where
+    batch pricing and throughput matter more than per-document latency.
+    """
+
+    ENDPOINT = "/v1/chat/completions"
+    COMPLETION_WINDOW = "24h"
+    TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+    def __init__(self, client: Optional["AsyncOpenAI"] = None, window_s: float = 5.0, max_batch_size: int = 50_000,
+                 poll_interval_s: float = 30.0, client_options: Optional[Dict[str, Any]] = None):
+        self._client = client
+        self.client_options = client_options or {"api_key": os.environ.get("OPENAI_API_KEY", "")}
+        self.window_s = window_s
+        self.max_batch_size = max_batch_size
+        self.poll_interval_s = poll_interval_s
+        self.metrics: List[Dict[str, Any]] = []
+        self.jobs: List[Dict[str, Any]] = []
+        self.pending: List[Dict[str, Any]] = []
+        self.flush_handle = None
+        self.tasks = set()
+        self.ids = itertools.count()
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        if self._client is None:
+            self._client = openai_client(**self.client_options)
+        return self._client
+
+    async def parse(self, model: str, messages: List[Dict[str, str]], response_format, temperature: float = 0.0, label: str = "",
+                    metrics_sink: Optional[List[Dict[str, Any]]] = None) -> Tuple[Any, Dict[str, Any]]:
+        """Queues one structured-output request and waits for its batch job. Raises if the request failed."""
+        loop = asyncio.get_running_loop()
+        estimated = sum(estimate_tokens(m["content"]) for m in messages)
+        record = {"label": label, "model": model, "attempts": 1, "estimated_tokens": estimated,
+                  "prompt_tokens": None, "completion_tokens": None, "latency_s": None,
+                  "queue_s": None, "status": "error"}
+        request = {
+            "custom_id": f"request-{next(self.ids)}",
+            "body": {"model": model, "messages": messages, "temperature": temperature,
+                     "response_format": response_format_param(response_format)},
+            "response_format": response_format,
+            "future": loop.create_future(),
+            "record": record,
+            "queued": time.monotonic(),
+        }
+        self.pending.append(request)
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.window_s, self.flush)
+
+        try:
+            return await request["future"]
+        finally:
+            record["total_s"] = round(time.monotonic() - request["queued"], 4)
+            self.metrics.append(record)
+            if metrics_sink is not None:
+                metrics_sink.append(record)
+
+    def flush(self):
+        """Submits all queued requests as one batch job now."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        requests, self.pending = self.pending, []
+        if requests:
+            task = asyncio.get_running_loop().create_task(self._run_job(requests))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _download(self, file_id: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        if not file_id:
+            return {}
+        content = await self.client.files.content(file_id)
+        items = (json.loads(line) for line in content.text.splitlines() if line.strip())
+        return {item["custom_id"]: item for item in items}
+
+    def _resolve(self, request: Dict[str, Any], item: Optional[Dict[str, Any]], job: Dict[str, Any]):
+        record = request["record"]
+        record["latency_s"] = round(time.monotonic() - job["submitted"], 4)
+        response = (item or {}).get("response") or {}
+        if response.get("status_code") != 200:
+            error = (item or {}).get("error") or response.get("body", {}).get("error") or f"batch {job['status']} without a result"
+            record["error"] = f"BatchRequestError: {error}"
+            request["future"].set_exception(RuntimeError(f"Batch request {request['custom_id']} failed: {error}"))
+            return
+        body = response["body"]
+        usage = body.get("usage") or {}
+        record["prompt_tokens"] = usage.get("prompt_tokens")
+        record["completion_tokens"] = usage.get("completion_tokens")
+        record["status"] = "ok"
+        content = body["choices"][0]["message"].get("content")
+        parsed = request["response_format"].model_validate_json(content) if content else None
+        request["future"].set_result((parsed, record))
+
+    async def _run_job(self, requests: List[Dict[str, Any]]):
+        job = {"id": None, "requests": len(requests), "status": "submitting", "submitted": time.monotonic()}
+        self.jobs.append(job)
+        try:
+            lines = "\n".join(json.dumps({"custom_id": r["custom_id"], "method": "POST", "url": self.ENDPOINT, "body": r["body"]})
+                              for r in requests)
+            input_file = await self.client.files.create(file=("requests.jsonl", lines.encode("utf-8")), purpose="batch")
+            for r in requests:
+                r["record"]["queue_s"] = round(time.monotonic() - r["queued"], 4)
+            job["submitted"] = time.monotonic()
+            batch = await self.client.batches.create(input_file_id=input_file.id, endpoint=self.ENDPOINT,
+                                                     completion_window=self.COMPLETION_WINDOW)
+            job["id"] = batch.id
+            logger.info(f"Submitted batch job {batch.id} with {len(requests)} request(s)")
+            while batch.status not in self.TERMINAL_STATUSES:
+                await asyncio.sleep(self.poll_interval_s)
+                batch = await self.client.batches.retrieve(batch.id)
+            job["status"] = batch.status
+            logger.info(f"Batch job {batch.id} finished with status {batch.status}")
+
+            results = await self._download(batch.error_file_id)
+            results.update(await self._download(batch.output_file_id))
+            for r in requests:
+                if not r["future"].done():
+                    try:
+                        self._resolve(r, results.get(r["custom_id"]), job)
+                    except Exception as e:
+                        r["record"]["error"] = f"{type(e).__name__}: {e}"
+                        r["future"].set_exception(e)
+        except Exception as e:
+            job["status"] = "error"
+            logger.error(f"Batch job {job['id'] or '(not submitted)'} failed: {e}")
+            for r in requests:
+                if not r["future"].done():
+                    r["record"]["error"] = f"{type(e).__name__}: {e}"
+                    r["future"].set_exception(e)
+
+LLM_BACKENDS = ["openai", "local", "batch"]
+
+def make_llm_client(backend: str = "openai", base_url: Optional[str] = None, max_concurrency: int = 8,
+                    requests_per_minute: Optional[float] = 500, tokens_per_minute: Optional[float] = 30_000,
+                    timeout: float = 120.0, batch_window_s: float = 5.0,
+                    batch_poll_interval_s: float = 30.0) -> Union[AsyncLLMClient, OpenAIBatchClient]:
+    """
+    Builds the LLM backend:
+    - "openai": interactive calls, rate limited and retried by AsyncLLMClient
+    - "local": an OpenAI-compatible server at `base_url` (vLLM, llama.cpp, Ollama, ...);
+      no API key is required and no rate limits are applied
+    - "batch": OpenAI Batch API jobs via OpenAIBatchClient
+    `base_url` defaults to OPENAI_BASE_URL for every backend.
+    """
+    base_url = base_url or os.environ.get("OPENAI_BASE_URL") or None
+    api_key = os.environ.get("OPENAI_API_KEY", "")
+    if backend == "batch":
+        return OpenAIBatchClient(window_s=batch_window_s, poll_interval_s=batch_poll_interval_s,
+                                 client_options={"api_key": api_key, "base_url": base_url})
+    if backend == "local":
+        if not base_url:
+            raise ValueError("The local LLM backend needs a base_url (--base-url or OPENAI_BASE_URL)")
+        options = {"api_key": api_key or "local", "base_url": base_url, "max_retries": 0, "timeout": timeout}
+        return AsyncLLMClient(limiter=RateLimiter(None, None), max_concurrency=max_concurrency, timeout=timeout,
+                              client_options=options)
+    if backend != "openai":
+        raise ValueError(f"Unknown LLM backend {backend!r}, expected one of {LLM_BACKENDS}")
+    options = {"api_key": api_key, "base_url": base_url, "max_retries": 0, "timeout": timeout}
+    return AsyncLLMClient(limiter=RateLimiter(requests_per_minute, tokens_per_minute),
+                          max_concurrency=max_concurrency, timeout=timeout, client_options=options)
@@ -24,11 +24,19 @@ def parse_float(text: str) -> float:
         # e.g. 1,234,567.89 or 1234.56
         if last_comma != -1: # has comma
             text = text.replace(',', '')
+        elif text.count('.') > 1:
+            # e.g. 1.234.567 (thousands separators only)
+            text = text.replace('.', '')
     elif last_comma > last_dot:
         # e.g. 1.234.567,89 or 1234,56
         if last_dot != -1: # has dot
             text = text.replace('.', '')
-        text = text.replace(',', '.')
+            text = text.replace(',', '.')
+        elif re.fullmatch(r'-?\d{1,3}(,\d{3})+', text):
+            # e.g. 12,345 or 1,234,567 (thousands separators only)
+            text = text.replace(',', '')
+        else:
+            text = text.replace(',', '.')
     else:
         # Neither comma nor dot
         pass
@@ -45,11 +53,11 @@ def normalize_multiplier(value: float, context: str) -> float:
         
     context_lower = context.lower()
     
-    if re.search(r'\b(billion|bn|b)\b', context_lower):
+    if re.search(r'\b(billions?|bn|b)\b', context_lower):
         return value * 1_000_000_000
-    elif re.search(r'\b(million|m)\b', context_lower):
+    elif re.search(r'\b(millions?|mn|m)\b', context_lower):
         return value * 1_000_000
-    elif re.search(r'\b(thousand|k)\b', context_lower):
+    elif re.search(r'\b(thousands?|k)\b', context_lower):
         return value * 1_000
     
     return value
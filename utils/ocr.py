@@ -0,0 +1,129 @@
+import time
+import hashlib
+import logging
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple
+
+from utils.cache import ExtractionCache
+from utils.pdf_utils import _parse_page
+
+logger = logging.getLogger(__name__)
+
+# Bump when the OCR record layout or settings change so cached pages are redone
+OCR_VERSION = "1"
+# A page is a scan when it has almost no text layer but is mostly covered by images
+MIN_TEXT_CHARS = 50
+MIN_IMAGE_COVERAGE = 0.5
+
+def ocr_available() -> bool:
+    """True when PyMuPDF can find Tesseract language data."""
+    try:
+        fitz.get_tessdata()
+        return True
+    except (RuntimeError, AttributeError):
+        return False
+
+def image_coverage(page) -> float:
+    """Share of the page area covered by images (overlaps are not deduplicated, capped at 1)."""
+    page_area = abs(page.rect)
+    if not page_area:
+        return 0.0
+    covered = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+    return min(1.0, covered / page_area)
+
+def needs_ocr(page, text: str) -> bool:
+    return len(text.strip()) < MIN_TEXT_CHARS and image_coverage(page) >= MIN_IMAGE_COVERAGE
+
+def page_hash(page, language: str, dpi: int) -> str:
+    """
+    Content hash of what OCR would see: the page's content stream, its raw (still
+    encoded) image streams, geometry and OCR settings. Identical scanned pages in
+    different PDFs share it.
+    """
+    h = hashlib.sha256()
+    h.update(page.read_contents())
+    for image in page.get_images(full=True):
+        h.update(page.parent.xref_stream_raw(image[0]) or b"")
+    h.update(f"{tuple(page.rect)}|{page.rotation}|{language}|{dpi}|{fitz.VersionBind}|v{OCR_VERSION}".encode())
+    return h.hexdigest()
+
+def _ocr_page_range(pdf_path: str, page_nums: List[int], language: str, dpi: int) -> List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Worker entry point: OCRs the given 1-indexed pages. Returns (page, record, error) per page."""
+    results = []
+    doc = fitz.open(pdf_path)
+    try:
+        for page_num in page_nums:
+            page = doc[page_num - 1]
+            try:
+                textpage = page.get_textpage_ocr(language=language, dpi=dpi, full=True)
+                record = _parse_page(page, page_num - 1, with_words=True, textpage=textpage)
+                record["ocr"] = True
+                results.append((page_num, record, None))
+            except Exception as e:
+                results.append((page_num, None, f"{type(e).__name__}: {e}"))
+    finally:
+        doc.close()
+    return results
+
+def find_scanned_pages(pdf_path: str, page_texts: Dict[int, str]) -> List[int]:
+    """Of the given low-text pages (1-indexed page -> text layer), returns those that look like scans."""
+    if not page_texts:
+        return []
+    with fitz.open(pdf_path) as doc:
+        return [n for n, text in sorted(page_texts.items()) if needs_ocr(doc[n - 1], text)]
+
+def ocr_pages(pdf_path: str, page_nums: List[int], workers: int = 1, cache: Optional[ExtractionCache] = None,
+              language: str = "eng", dpi: int = 300) -> Tuple[Dict[int, Dict[str, Any]], Dict[str, Any]]:
+    """
+    OCRs the given 1-indexed pages and returns ({page: record}, stats). Records have the
+    same text / blocks / words shape as the text-layer parse, with `"ocr": True`.
+    Cached pages (keyed by page_hash) are reused; the rest are OCR'd in a process pool
+    of `workers`, one page per task so slow pages don't hold up the others. Pages that
+    fail are logged and left out.
+    """
+    started = time.perf_counter()
+    records: Dict[int, Dict[str, Any]] = {}
+    stats = {"ocr_pages": len(page_nums), "ocr_cache_hits": 0, "ocr_failed": 0}
+    if not page_nums:
+        stats["ocr_s"] = 0.0
+        return records, stats
+
+    keys = {}
+    if cache is not None:
+        with fitz.open(pdf_path) as doc:
+            keys = {n: page_hash(doc[n - 1], language, dpi) for n in page_nums}
+        for n, key in keys.items():
+            cached = cache.get(key)
+            if cached is not None:
+                records[n] = dict(cached, page=n)
+        stats["ocr_cache_hits"] = len(records)
+
+    misses = [n for n in page_nums if n not in records]
+    if misses and not ocr_available():
+        logger.warning(f"Tesseract is not available, skipping OCR of {len(misses)} scanned page(s) in {pdf_path}")
+        stats["ocr_failed"] = len(misses)
+        misses = []
+
+    def collect(results):
+        for n, record, error in results:
+            if record is None:
+                logger.warning(f"OCR failed for page {n} of {pdf_path}: {error}")
+                stats["ocr_failed"] += 1
+                continue
+            records[n] = record
+            if cache is not None:
+                cache.put(keys[n], record, meta={"pdf": pdf_path, "page": n})
+
+    if len(misses) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(misses))) as executor:
+            futures = [executor.submit(_ocr_page_range, pdf_path, [n], language, dpi) for n in misses]
+            for fut in as_completed(futures):
+                collect(fut.result())
+    elif misses:
+        collect(_ocr_page_range(pdf_path, misses, language, dpi))
+
+    stats["ocr_s"] = round(time.perf_counter() - started, 4)
+    logger.info(f"OCR: {len(records)}/{len(page_nums)} scanned page(s) recovered "
+                f"({stats['ocr_cache_hits']} from cache) in {stats['ocr_s']}s")
+    return records, stats
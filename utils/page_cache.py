@@ -0,0 +1,132 @@
+import os
+import mmap
+import shutil
+import hashlib
+import logging
+from array import array
+from typing import List, Dict, Any, Iterable
+
+import fitz  # PyMuPDF
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes
+CACHE_FORMAT_VERSION = "1"
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def page_cache_path(cache_dir: str, pdf_path: str) -> str:
+    """Cache entry directory keyed by the PDF content hash and the PyMuPDF version."""
+    key = f"{file_sha256(pdf_path)[:32]}-pymupdf{fitz.VersionBind}-v{CACHE_FORMAT_VERSION}"
+    return os.path.join(cache_dir, key)
+
+class CachedPages:
+    """
+    Read-only, memory-mapped view over a cached document. Behaves like the list
+    returned by extract_text_and_bboxes_pymupdf, but page dicts are only
+    materialized when indexed or iterated.
+
+    Layout on disk:
+        bboxes.npy        float32 (n_blocks, 4)
+        text_offsets.npy  int64   (n_blocks + 1,) byte offsets into text.bin
+        page_offsets.npy  int64   (n_pages + 1,) block index ranges per page
+        text.bin          utf-8 block texts, concatenated
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.bboxes = np.load(os.path.join(path, "bboxes.npy"), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        self.page_offsets = np.load(os.path.join(path, "page_offsets.npy"), mmap_mode="r")
+        self._text_file = open(os.path.join(path, "text.bin"), 'rb')
+        size = os.fstat(self._text_file.fileno()).st_size
+        # mmap cannot map an empty file
+        self.text_blob = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.page_offsets) - 1
+
+    def _block_text(self, i: int) -> str:
+        return self.text_blob[self.text_offsets[i]:self.text_offsets[i + 1]].decode("utf-8")
+
+    def page_text(self, index: int) -> str:
+        start, stop = int(self.page_offsets[index]), int(self.page_offsets[index + 1])
+        return "\n".join(self._block_text(i) for i in range(start, stop))
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start, stop = int(self.page_offsets[index]), int(self.page_offsets[index + 1])
+        blocks = [{"bbox": self.bboxes[i].tolist(), "text": self._block_text(i)} for i in range(start, stop)]
+        return {
+            "page": index + 1,
+            "text": "\n".join(b["text"] for b in blocks),
+            "blocks": blocks
+        }
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+class PageCacheWriter:
+    """
+    Streams page records into a cache entry one page at a time: block texts go straight
+    to text.bin and only compact bbox/offset arrays are kept, so a document never has
+    to be held in memory to be cached. `commit()` publishes the entry atomically.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self._text_file = open(os.path.join(self.tmp_path, "text.bin"), 'wb')
+        self.bboxes = array("f")
+        self.text_offsets = array("q", [0])
+        self.page_offsets = array("q", [0])
+        self.size = 0
+
+    def add(self, page: Dict[str, Any]):
+        for block in page["blocks"]:
+            data = block["text"].encode("utf-8")
+            self._text_file.write(data)
+            self.size += len(data)
+            self.bboxes.extend(block["bbox"])
+            self.text_offsets.append(self.size)
+        self.page_offsets.append(len(self.text_offsets) - 1)
+
+    def commit(self):
+        self._text_file.close()
+        np.save(os.path.join(self.tmp_path, "bboxes.npy"), np.frombuffer(self.bboxes, dtype=np.float32).reshape(-1, 4))
+        np.save(os.path.join(self.tmp_path, "text_offsets.npy"), np.frombuffer(self.text_offsets, dtype=np.int64))
+        np.save(os.path.join(self.tmp_path, "page_offsets.npy"), np.frombuffer(self.page_offsets, dtype=np.int64))
+        try:
+            os.rename(self.tmp_path, self.path)
+        except OSError:
+            # Another process populated the same entry first
+            shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def abort(self):
+        self._text_file.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+def save_pages(path: str, pages_data: Iterable[Dict[str, Any]]):
+    """Writes parsed pages to a cache entry directory (atomically via a temp directory)."""
+    writer = PageCacheWriter(path)
+    try:
+        for page in pages_data:
+            writer.add(page)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
+def load_pages(path: str) -> CachedPages:
+    return CachedPages(path) if os.path.isdir(path) else None
@@ -1,47 +1,176 @@
+import os
+import logging
 import fitz  # PyMuPDF
-import pdfplumber
-from typing import List, Dict, Any, Tuple
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Tuple, Sequence, Iterator
+from utils.page_cache import page_cache_path, load_pages, save_pages
 
-def extract_text_and_bboxes_pymupdf(pdf_path: str) -> List[Dict[str, Any]]:
+logger = logging.getLogger(__name__)
+
+# Upper bound on pages per parse shard, which bounds the records in flight
+MAX_SHARD_PAGES = 16
+
+def _page_words(page, textpage=None) -> List[List[Any]]:
+    # w = (x0, y0, x1, y1, "word", block_no, line_no, word_no)
+    return [[w[0], w[1], w[2], w[3], w[4]] for w in page.get_text("words", textpage=textpage)]
+
+def _parse_page(page, page_num: int, with_words: bool = False, textpage=None) -> Dict[str, Any]:
+    """Page record from the PDF text layer, or from `textpage` (e.g. an OCR text page) when given."""
+    # Get structured blocks (text, bbox)
+    blocks = page.get_text("blocks", textpage=textpage)
+    text_blocks = []
+    full_text = []
+    for b in blocks:
+        # b = (x0, y0, x1, y1, "text", block_no, block_type)
+        if b[6] == 0:  # 0 indicates text
+            text_content = b[4].strip()
+            if text_content:
+                text_blocks.append({
+                    "bbox": [b[0], b[1], b[2], b[3]],
+                    "text": text_content
+                })
+                full_text.append(text_content)
+    
+    record = {
+        "page": page_num + 1,
+        "text": "\n".join(full_text),
+        "blocks": text_blocks
+    }
+    if with_words:
+        record["words"] = _page_words(page, textpage)
+    return record
+
+def _parse_page_range(pdf_path: str, start: int, stop: int) -> List[Dict[str, Any]]:
+    """Worker entry point: each process opens its own fitz document."""
+    doc = fitz.open(pdf_path)
+    try:
+        return [_parse_page(doc[page_num], page_num) for page_num in range(start, stop)]
+    finally:
+        doc.close()
+
+def _page_text(page) -> str:
+    # Image blocks and ligature/whitespace preservation are skipped: the text is only scored
+    return page.get_text("text", flags=fitz.TEXT_MEDIABOX_CLIP)
+
+def _page_text_range(pdf_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Worker entry point for the text pass."""
+    doc = fitz.open(pdf_path)
+    try:
+        return [(page_num + 1, _page_text(doc[page_num])) for page_num in range(start, stop)]
+    finally:
+        doc.close()
+
+def _iter_shards(pdf_path: str, workers: int, parse_range, shard_size: int = None) -> Iterator[Any]:
+    """
+    Runs `parse_range(pdf_path, start, stop)` over page shards in a process pool and
+    yields the results in page order as soon as each shard (and all shards before it)
+    has finished. At most two shards per worker are in flight, so memory does not
+    grow with the page count.
+    """
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    # Several shards per worker keeps the pool busy when page costs are uneven
+    shard_size = shard_size or min(MAX_SHARD_PAGES, max(1, -(-page_count // (workers * 4))))
+    shards = ((start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque(executor.submit(parse_range, pdf_path, start, stop)
+                          for start, stop in islice(shards, workers * 2))
+        while in_flight:
+            shard = in_flight.popleft().result()
+            for start, stop in islice(shards, 1):
+                in_flight.append(executor.submit(parse_range, pdf_path, start, stop))
+            yield from shard
+
+def iter_pages_parallel(pdf_path: str, workers: int, shard_size: int = None) -> Iterator[Dict[str, Any]]:
+    """Parses page shards in a process pool and yields page records in page order (see _iter_shards)."""
+    yield from _iter_shards(pdf_path, workers, _parse_page_range, shard_size)
+
+def iter_pages(pdf_path: str, workers: int = 1) -> Iterator[Dict[str, Any]]:
+    """Yields full page records (text and blocks) one at a time, in page order."""
+    if workers > 1:
+        yield from iter_pages_parallel(pdf_path, workers)
+        return
+    doc = fitz.open(pdf_path)
+    try:
+        for page_num in range(len(doc)):
+            yield _parse_page(doc[page_num], page_num)
+    finally:
+        doc.close()
+
+def extract_text_and_bboxes_pymupdf(pdf_path: str, cache_dir: str = None, workers: int = 1) -> Sequence[Dict[str, Any]]:
     """
     Extract text and bounding boxes using PyMuPDF.
     Returns a list of dicts, one per page.
+    With cache_dir set, parsed pages are stored in a per-PDF sidecar cache and later
+    calls return a memory-mapped CachedPages view instead of re-parsing.
+    With workers > 1, page ranges are parsed in parallel worker processes.
     """
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        entry_path = page_cache_path(cache_dir, pdf_path)
+        cached = load_pages(entry_path)
+        if cached is not None:
+            logger.info(f"Page cache hit for {pdf_path} ({len(cached)} pages)")
+            return cached
+        pages_data = extract_text_and_bboxes_pymupdf(pdf_path, workers=workers)
+        save_pages(entry_path, pages_data)
+        return pages_data
+
+    if workers > 1:
+        return list(iter_pages_parallel(pdf_path, workers))
+
     doc = fitz.open(pdf_path)
     pages_data = []
     
     for page_num in range(len(doc)):
-        page = doc[page_num]
-        
-        # Get structured blocks (text, bbox)
-        blocks = page.get_text("blocks")
-        text_blocks = []
-        full_text = []
-        for b in blocks:
-            # b = (x0, y0, x1, y1, "text", block_no, block_type)
-            if b[6] == 0:  # 0 indicates text
-                text_content = b[4].strip()
-                if text_content:
-                    text_blocks.append({
-                        "bbox": [b[0], b[1], b[2], b[3]],
-                        "text": text_content
-                    })
-                    full_text.append(text_content)
-        
-        pages_data.append({
-            "page": page_num + 1,
-            "text": "\n".join(full_text),
-            "blocks": text_blocks
-        })
+        pages_data.append(_parse_page(doc[page_num], page_num))
     
     doc.close()
     return pages_data
 
+def iter_page_texts(pdf_path: str, workers: int = 1) -> Iterator[Tuple[int, str]]:
+    """
+    Cheap first pass: yields (1-indexed page number, plain text) one page at a time
+    without building block records. With workers > 1, page shards are read in
+    parallel worker processes and still yielded in page order.
+    """
+    if workers > 1:
+        yield from _iter_shards(pdf_path, workers, _page_text_range)
+        return
+    doc = fitz.open(pdf_path)
+    try:
+        for page_num in range(len(doc)):
+            yield page_num + 1, _page_text(doc[page_num])
+    finally:
+        doc.close()
+
+def extract_blocks_for_pages(pdf_path: str, pages: List[int], with_words: bool = False) -> List[Dict[str, Any]]:
+    """Second pass: full text and block records (optionally word bboxes) for the given 1-indexed pages only."""
+    doc = fitz.open(pdf_path)
+    try:
+        return [_parse_page(doc[p - 1], p - 1, with_words) for p in pages]
+    finally:
+        doc.close()
+
+def extract_words_for_pages(pdf_path: str, pages: List[int]) -> Dict[int, List[List[Any]]]:
+    """Word-level bboxes [x0, y0, x1, y1, word] for the given 1-indexed pages."""
+    doc = fitz.open(pdf_path)
+    try:
+        return {p: _page_words(doc[p - 1]) for p in pages}
+    finally:
+        doc.close()
+
 def extract_tables_pdfplumber(pdf_path: str, pages: List[int] = None) -> Dict[int, List[List[List[str]]]]:
     """
     Extract tabular data using pdfplumber to provide additional structure.
     pages parameter is 1-indexed. Returns dict mapped by 1-indexed page.
     """
+    # Only the table-first path uses pdfplumber; don't make every run pay for importing it
+    import pdfplumber
+
     results = {}
     with pdfplumber.open(pdf_path) as pdf:
         num_pages = len(pdf.pages)
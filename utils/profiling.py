@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import cProfile
+import logging
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["layout", "extraction", "normalization", "verification", "output"]
+# Counters stages may report; summed in the batch summary
+COUNTERS = ["pages_in", "pages_out", "llm_calls", "prompt_tokens", "completion_tokens", "cache_hits",
+            "parse_s", "score_s", "prompt_build_s", "llm_latency_s", "bbox_lookups", "bbox_lookup_s",
+            "ocr_pages", "ocr_cache_hits", "ocr_failed", "ocr_s"]
+
+def peak_rss_mb() -> Optional[float]:
+    """High-water resident set size of this process in MiB (None where unsupported)."""
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+class StageProfiler:
+    """
+    Records wall time, CPU time and peak memory for each pipeline stage of one document,
+    plus whatever counters the stage writes into its record (pages, tokens, cache hits).
+    With `profile_dir`, each stage also runs under cProfile and its stats are dumped to
+    `<profile_dir>/<label>.<stage>.prof`.
+
+    Peak memory is the process high-water mark, so in a reused worker process it covers
+    earlier documents too; `rss_growth_mb` is how much this stage raised it.
+    """
+
+    def __init__(self, label: str = "", profile_dir: Optional[str] = None):
+        self.label = label
+        self.profile_dir = profile_dir
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._profiles: Dict[str, cProfile.Profile] = {}
+
+    @contextmanager
+    def stage(self, name: str, exclusive: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Times the enclosed block and yields its record for counters. Pass
+        exclusive=False when other documents run concurrently on the same thread
+        (the shared LLM event loop): CPU, memory and cProfile are then not attributable.
+        """
+        record: Dict[str, Any] = {}
+        profiler = None
+        if self.profile_dir and exclusive:
+            # One profile per stage, so a re-entered stage keeps accumulating into it
+            profiler = self._profiles.setdefault(name, cProfile.Profile())
+        rss_before = peak_rss_mb()
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record["wall_s"] = round(time.perf_counter() - started, 4)
+            if exclusive:
+                record["cpu_s"] = round(time.process_time() - cpu_started, 4)
+                rss_after = peak_rss_mb()
+                if rss_after is not None:
+                    record["peak_rss_mb"] = round(rss_after, 1)
+                    record["rss_growth_mb"] = round(rss_after - rss_before, 1)
+            if profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                path = os.path.join(self.profile_dir, f"{self.label}.{name}.prof")
+                profiler.dump_stats(path)
+                record["profile"] = path
+            previous = self.records.get(name)
+            if previous is not None:
+                # Re-entered stage (e.g. output written in two places): accumulate
+                for key, value in record.items():
+                    if key == "peak_rss_mb":
+                        previous[key] = max(previous.get(key, value), value)
+                    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                        previous[key] = round(previous.get(key, 0) + value, 4)
+                    else:
+                        previous[key] = value
+            else:
+                self.records[name] = record
+
+    def document_record(self, pdf_path: str) -> Dict[str, Any]:
+        return {
+            "pdf": os.path.abspath(pdf_path),
+            "stages": self.records,
+            "wall_s": round(sum(r["wall_s"] for r in self.records.values()), 4),
+        }
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def summarize_stages(documents: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Aggregates per-document stage records into per-stage totals and wall time percentiles."""
+    summary = {}
+    for name in STAGES:
+        records = [d["stages"][name] for d in documents if name in d.get("stages", {})]
+        if not records:
+            continue
+        walls = [r["wall_s"] for r in records]
+        stage = {
+            "documents": len(records),
+            "wall_s_total": round(sum(walls), 4),
+            "wall_s_mean": round(sum(walls) / len(walls), 4),
+            "wall_s_p50": _percentile(walls, 0.5),
+            "wall_s_p95": _percentile(walls, 0.95),
+        }
+        cpu = [r["cpu_s"] for r in records if "cpu_s" in r]
+        if cpu:
+            stage["cpu_s_total"] = round(sum(cpu), 4)
+        peaks = [r["peak_rss_mb"] for r in records if "peak_rss_mb" in r]
+        if peaks:
+            stage["peak_rss_mb_max"] = max(peaks)
+        for counter in COUNTERS:
+            values = [r[counter] for r in records if r.get(counter) is not None]
+            if values:
+                stage[counter] = round(sum(values), 4)
+        summary[name] = stage
+    return summary
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    company TEXT PRIMARY KEY,
+    row_json TEXT NOT NULL,
+    pdf_path TEXT,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imported_csvs (
+    csv_path TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    imported REAL NOT NULL
+)
+"""
+
+# Column order of output_expected.csv
+CSV_COLUMNS = [
+    "Company name", "Most recent reporting year", "Financial year end",
+    "Y0-Revenue / Turnover (million)", "Y0-Currency",
+    " Y0-CO2 Scope 1 \n(tCO2e)  ", " Y0-CO2 Scope 2 - market based\n(tCO2e)  ", " Y0-CO2 Scope 3\n(tCO2e) ",
+    " Y0-Scope 3 reporting categories - (0-15) ",
+    "Y0-1-Revenue / Turnover (million)",
+    " Y0-1-CO2 Scope 1 \n(tCO2e)  ", " Y0-1-CO2 Scope 2 - market based\n(tCO2e)  ", " Y0-1-CO2 Scope 3\n(tCO2e) ",
+    "Y0-2-Revenue / Turnover (million)",
+    " Y0-2-CO2 Scope 1 \n(tCO2e)  ", " Y0-2-CO2 Scope 2 - market based\n(tCO2e)  ", " Y0-2-CO2 Scope 3\n(tCO2e) ",
+]
+
+class ResultStore:
+    """
+    SQLite store of per-document CSV rows keyed by company name.
+    WAL mode lets a pool of writer processes upsert concurrently (each process
+    opens its own connection) while readers keep working; the CSV is rendered
+    separately with `export_csv`. The first export to a CSV that already exists
+    imports its rows, so rows never upserted into the store are kept.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.db_path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def upsert(self, row: Dict[str, Any], pdf_path: Optional[str] = None):
+        self.upsert_many([row], [pdf_path])
+
+    def upsert_many(self, rows: List[Dict[str, Any]], pdf_paths: Optional[List[Optional[str]]] = None):
+        """Inserts or replaces rows by company name in one transaction."""
+        if not rows:
+            return
+        pdf_paths = pdf_paths or [None] * len(rows)
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO results (company, row_json, pdf_path, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(company) DO UPDATE SET row_json=excluded.row_json, "
+                "pdf_path=excluded.pdf_path, updated=excluded.updated",
+                [(row["Company name"], json.dumps(row, ensure_ascii=False), path, now) for row, path in zip(rows, pdf_paths)],
+            )
+
+    def get(self, company: str) -> Optional[Dict[str, Any]]:
+        cur = self._connect().execute("SELECT row_json FROM results WHERE company = ?", (company,))
+        found = cur.fetchone()
+        return json.loads(found[0]) if found else None
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """All rows in insertion order (an upsert keeps the original position)."""
+        cur = self._connect().execute("SELECT row_json FROM results ORDER BY rowid")
+        return [json.loads(r[0]) for r in cur]
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _import_csv(self, output_csv: str):
+        """Adopts the rows of an existing CSV the store has not seen yet; stored rows win."""
+        import pandas as pd
+
+        csv_path = os.path.abspath(output_csv)
+        conn = self._connect()
+        if not os.path.exists(csv_path) or conn.execute(
+                "SELECT 1 FROM imported_csvs WHERE csv_path = ?", (csv_path,)).fetchone():
+            return
+        # Read as string to preserve exact blanks
+        existing = pd.read_csv(csv_path, dtype=str, keep_default_na=False).to_dict("records")
+        now = time.time()
+        with conn:
+            cur = conn.executemany(
+                "INSERT INTO results (company, row_json, pdf_path, updated) VALUES (?, ?, NULL, ?) "
+                "ON CONFLICT(company) DO NOTHING",
+                [(row["Company name"], json.dumps(row, ensure_ascii=False), now) for row in existing if row.get("Company name")],
+            )
+            conn.execute("INSERT INTO imported_csvs (csv_path, rows, imported) VALUES (?, ?, ?)",
+                         (csv_path, cur.rowcount, now))
+        logger.info(f"Imported {cur.rowcount} row(s) of {output_csv} not yet in {self.db_path}")
+
+    def export_csv(self, output_csv: str) -> int:
+        """Renders all rows in the output CSV layout, replacing the file atomically."""
+        import pandas as pd
+
+        self._import_csv(output_csv)
+        rows = self.rows()
+        columns = CSV_COLUMNS + [c for c in dict.fromkeys(k for row in rows for k in row) if c not in CSV_COLUMNS]
+        tmp_path = f"{output_csv}.tmp.{os.getpid()}"
+        pd.DataFrame(rows, columns=columns).fillna("").to_csv(tmp_path, index=False)
+        os.replace(tmp_path, output_csv)
+        logger.info(f"Exported {len(rows)} row(s) from {self.db_path} to {output_csv}")
+        return len(rows)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
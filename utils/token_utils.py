@@ -0,0 +1,30 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed; falling back to a ~4 characters per token estimate")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # The BPE file is downloaded on first use, which fails on offline hosts
+        logger.warning(f"Could not load tiktoken encoding for {model} ({e}); falling back to a ~4 characters per token estimate")
+        return None
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Counts tokens locally with tiktoken when available, otherwise estimates them."""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))